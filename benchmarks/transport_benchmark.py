@@ -0,0 +1,224 @@
+'''
+Compare the report request transports against a local mock Reports API server.
+
+The mock servers answer every POST with a report page after a fixed delay and count the connections
+they accept. For every transport, a number of report requests are sent concurrently and the number of
+connections (sockets), the negotiated protocol and the throughput are printed.
+
+Two built-in servers are started: an HTTP/1.1 server, used by the requests transports and by http2_transport
+(which falls back to HTTP/1.1 over http://), and an HTTP/2 server over cleartext (h2c), used by
+http2_transport with prior knowledge. The HTTP/2 server requires the h2 package (installed with httpx[http2]).
+With --url, every transport is run against an external server instead.
+
+Usage:
+    python benchmarks/transport_benchmark.py --requests 500 --concurrency 64
+'''
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler
+from http.server import HTTPServer
+from socketserver import ThreadingMixIn
+from socketserver import TCPServer
+from socketserver import BaseRequestHandler
+
+import requests
+
+try:
+    import h2.config
+    import h2.events
+    import h2.exceptions
+    import h2.connection
+except ImportError:
+    h2 = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from analytics.mayhem.adobe_transport import requests_transport
+from analytics.mayhem.adobe_transport import http2_transport
+
+REPORT_PAGE = json.dumps({
+    'totalPages': 1, 'firstPage': True, 'lastPage': True, 'numberOfElements': 2, 'number': 0, 'totalElements': 2,
+    'columns': {'dimension': {'id': 'variables/page', 'type': 'string'}, 'columnIds': ['0']},
+    'rows': [{'itemId': '1', 'value': 'Home', 'data': [10.0]}, {'itemId': '2', 'value': 'Cart', 'data': [5.0]}],
+    'summaryData': {'totals': [15.0]}
+}).encode('utf-8')
+
+
+class mock_report_server(ThreadingMixIn, HTTPServer):
+    # http.server.ThreadingHTTPServer requires Python 3.7
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.connections = 0
+        self.lock = threading.Lock()
+        super().__init__(('127.0.0.1', 0), mock_report_handler)
+
+
+class mock_report_handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections = self.server.connections + 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(self.server.delay)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(REPORT_PAGE)))
+        self.end_headers()
+        self.wfile.write(REPORT_PAGE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class mock_h2_report_server(ThreadingMixIn, TCPServer):
+    '''
+    HTTP/2 over cleartext (h2c with prior knowledge). The streams of a connection are answered concurrently.
+    '''
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 256
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.connections = 0
+        self.lock = threading.Lock()
+        super().__init__(('127.0.0.1', 0), mock_h2_report_handler)
+
+
+class mock_h2_report_handler(BaseRequestHandler):
+
+    def handle(self):
+        with self.server.lock:
+            self.server.connections = self.server.connections + 1
+        self.connection = h2.connection.H2Connection(config = h2.config.H2Configuration(client_side = False))
+        self.connection_lock = threading.Lock()
+        with self.connection_lock:
+            self.connection.initiate_connection()
+            self.request.sendall(self.connection.data_to_send())
+        while True:
+            data = self.request.recv(65536)
+            if (not data):
+                break
+            with self.connection_lock:
+                events = self.connection.receive_data(data)
+                for event in events:
+                    if (isinstance(event, h2.events.DataReceived)):
+                        self.connection.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+                self.request.sendall(self.connection.data_to_send())
+            for event in events:
+                if (isinstance(event, h2.events.StreamEnded)):
+                    threading.Timer(self.server.delay, self.respond, args = (event.stream_id,)).start()
+                elif (isinstance(event, h2.events.ConnectionTerminated)):
+                    return
+
+    def respond(self, stream_id):
+        headers = [(':status', '200'), ('content-type', 'application/json'), ('content-length', str(len(REPORT_PAGE)))]
+        with self.connection_lock:
+            try:
+                self.connection.send_headers(stream_id, headers)
+                self.connection.send_data(stream_id, REPORT_PAGE, end_stream = True)
+                self.request.sendall(self.connection.data_to_send())
+            except (OSError, h2.exceptions.ProtocolError):
+                # The client closed the connection
+                pass
+
+
+def start_server(server):
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+    return 'http://127.0.0.1:{}/api/benchmark/reports'.format(server.server_address[1])
+
+
+def get_protocols(transport, responses):
+    if (isinstance(transport, http2_transport)):
+        versions = transport.http_versions
+    else:
+        versions = {}
+        for response in responses:
+            version = 'HTTP/{:.1f}'.format(response.raw.version / 10) if response.raw is not None else 'unknown'
+            versions[version] = versions.get(version, 0) + 1
+    return ', '.join(sorted(versions))
+
+
+def run(transport, url, number_of_requests, concurrency):
+    headers = {
+        'Authorization': 'Bearer {}'.format('x' * 1000),
+        'x-api-key': 'benchmark',
+        'x-proxy-global-company-id': 'benchmark',
+        'Accept': 'application/json',
+        'Content-Type': 'application/json'
+    }
+    data = json.dumps({'rsid': 'benchmark', 'dimension': 'variables/page'})
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers = concurrency) as executor:
+        responses = list(executor.map(lambda i: transport.post(url, headers, data, 60), range(number_of_requests)))
+    elapsed = time.time() - start_time
+    assert all(response.status_code == 200 for response in responses)
+    return elapsed, get_protocols(transport, responses)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type = int, default = 500)
+    parser.add_argument('--concurrency', type = int, default = 64)
+    parser.add_argument('--delay', type = float, default = 0.05, help = 'Response delay of the built-in servers (seconds)')
+    parser.add_argument('--url', help = 'URL of an external mock server instead of the built-in servers')
+    args = parser.parse_args()
+
+    servers = {}
+    if (args.url is None):
+        servers['HTTP/1.1'] = mock_report_server(args.delay)
+        if (h2 is not None):
+            servers['HTTP/2'] = mock_h2_report_server(args.delay)
+    urls = dict((version, start_server(server)) for version, server in servers.items())
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections = 1, pool_maxsize = args.concurrency)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    # Transport, version of the built-in server
+    transports = [
+        ('requests', lambda: requests_transport(), 'HTTP/1.1'),
+        ('requests (pooled session)', lambda: requests_transport(session), 'HTTP/1.1'),
+        ('http2', lambda: http2_transport(max_connections = 4), 'HTTP/1.1'),
+        ('http2 (h2c)', lambda: http2_transport(max_connections = 4, http1 = False), 'HTTP/2')
+    ]
+
+    print('{:<28} {:>10} {:>10} {:>12} {:>12}'.format('transport', 'protocol', 'sockets', 'seconds', 'requests/s'))
+    for name, create_transport, server_version in transports:
+        server = servers.get(server_version)
+        url = args.url or urls.get(server_version)
+        if (url is None):
+            print('{:<28} skipped: the {} server requires the h2 package'.format(name, server_version))
+            continue
+        try:
+            transport = create_transport()
+        except ImportError as error:
+            print('{:<28} skipped: {}'.format(name, error))
+            continue
+        connections_before = server.connections if server is not None else 0
+        with transport:
+            try:
+                elapsed, protocols = run(transport, url, args.requests, args.concurrency)
+            except requests.exceptions.RequestException as error:
+                print('{:<28} failed: {}'.format(name, error))
+                continue
+        sockets = server.connections - connections_before if server is not None else float('nan')
+        print('{:<28} {:>10} {:>10} {:>12.2f} {:>12.1f}'.format(name, protocols, sockets, elapsed, args.requests / elapsed))
+
+    for server in servers.values():
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -22,6 +22,7 @@ setuptools.setup(
     ],
     install_requires=[
         "pandas",
+        "numpy",
         "requests",
         "PyJWT"
     ],
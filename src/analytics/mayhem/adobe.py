@@ -4,7 +4,19 @@ import time
 import json
 import jwt
 import os
+import sys
+import copy
+import shutil
+import tempfile
 import requests
+import threading
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import Future
+import numpy as np
 import pandas as pd
 
 import webbrowser
@@ -12,9 +24,31 @@ from urllib.parse import urlparse
 from urllib.parse import parse_qs
 from urllib.parse import urlencode
 
+from .adobe_cache import request_coalescer
+from .adobe_cache import result_store
+from .adobe_tuning import adaptive_limit_policy
+from .adobe_pipeline import report_pipeline
+from .adobe_tokens import is_token_record_valid
+from .adobe_profiling import report_profiler
+from .adobe_profiling import profile_phase
+from .adobe_prefetch import parent_history
+from .adobe_prefetch import speculative_prefetch
+from .adobe_scheduling import subtree_scheduler
+from .adobe_transport import requests_transport
+from .adobe_streaming import read_report_stream
+from .adobe_refresh import breakdown_store
+from .adobe_refresh import breakdown_refresh
+from .adobe_refresh import get_date_range
+from .adobe_partitioning import get_prefix_partitions
+from .adobe_partitioning import get_partition_report_object
+from .adobe_partitioning import merge_partitions
+from .adobe_partitioning import check_partition_coverage
+from .adobe_ordering import breakdown_order_optimizer
+from .adobe_stats import stats_catalog
+
 class analytics_client:
 
-    def __init__(self, adobe_org_id = None, subject_account = None, client_id = None, auth_client_id = None, client_secret = None, account_id = None, private_key_location='.ssh/private.key', debugging = False):
+    def __init__(self, adobe_org_id = None, subject_account = None, client_id = None, auth_client_id = None, client_secret = None, account_id = None, private_key_location='.ssh/private.key', debugging = False, token_store = None):
         '''
         Adobe Analytics Reports API client.
 
@@ -45,6 +79,9 @@ class analytics_client:
         private_key_location : string - default: '.ssh/private.key'
             Private Key location
 
+        token_store : file_token_store, sqlite_token_store or memory_token_store - optional
+            Store used to share access tokens (and OAuth refresh tokens) between processes
+
         Returns
         -------
         Instance of analytics_client
@@ -72,6 +109,30 @@ class analytics_client:
         self.report_object = self._generate_empty_report_object()
         self.dimensions = []
         self.debugging = debugging
+        self.request_coalescer = None
+        self.limit_policy = None
+        self.timeout = 360
+        self.pipeline = None
+        self.memory_budget = None
+        self.spill_directory = None
+        self.profiler = None
+        self.prefetch_history = None
+        self.scheduler = None
+        self.transport = requests_transport()
+        self.streaming = False
+        self.refresh_store = None
+        self.order_optimizer = None
+        self.result_store = None
+        self.stats_catalog = None
+
+        self.access_token = None
+        self.access_token_expires_at = None
+        self.refresh_token = None
+        self.token_store = token_store
+        self._token_lock = threading.Lock()
+        self.rate_limiter = None
+        self.retry_policy = None
+        self.circuit_breaker = None
 
     def _read_private_key(self):
         # Request Access Key
@@ -114,6 +175,7 @@ class analytics_client:
         if (result.status_code != 200):
             raise ValueError('Response code error', result.status_code)
 
+        self._set_access_token_expiration(resultjson)
         return resultjson['access_token']
 
     def _request_oauth_authorisation_code(self):
@@ -142,15 +204,179 @@ class analytics_client:
         if (res.status_code != 200):
             raise ValueError('Response code error', res.status_code)
 
+        self._set_access_token_expiration(res.json())
+        self.refresh_token = res.json().get('refresh_token', self.refresh_token)
         return res.json()['access_token']
 
-    def _get_request_headers(self):
+    def _refresh_oauth_access_token(self, refresh_token):
+        '''
+        Obtain a new OAuth access token using a refresh token, without an interactive login.
+        '''
+        payload_data = {
+            'grant_type' : 'refresh_token',
+            'client_id' : self.auth_client_id,
+            'client_secret' : self.client_secret,
+            'refresh_token' : refresh_token
+        }
+        res = requests.request("POST", url = self.adobe_auth_login_url , data = payload_data)
+
+        if (res.status_code != 200):
+            raise ValueError('Response code error', res.status_code)
+
+        self._set_access_token_expiration(res.json())
+        self.refresh_token = res.json().get('refresh_token', refresh_token)
+        return res.json()['access_token']
+
+    def _set_access_token_expiration(self, token_response):
+        # IMS returns the lifetime of the token in milliseconds
+        if ('expires_in' in token_response):
+            self.access_token_expires_at = time.time() + token_response['expires_in'] / 1000
+        else:
+            self.access_token_expires_at = None
+
+    def _get_token_record(self):
+        return {
+            'access_token': self.access_token,
+            'expires_at': self.access_token_expires_at,
+            'refresh_token': self.refresh_token
+        }
+
+    def _get_token_store_key(self):
+        if (self.auth_client_id):
+            return 'oauth:{}:{}'.format(self.auth_client_id, self.account_id)
+        return 'jwt:{}:{}'.format(self.adobe_org_id, self.client_id)
 
-        if (self.auth_client_id and not self.access_token):
+    def _request_access_token(self, refresh_token = None):
+        '''
+        Obtain a new access token. For OAuth, the refresh token is used if available and an
+        interactive login is only performed if the refresh fails.
+        '''
+        if (self.auth_client_id):
+            if (refresh_token):
+                try:
+                    self.access_token = self._refresh_oauth_access_token(refresh_token)
+                    return
+                except ValueError:
+                    self.logger('Refresh token rejected; performing interactive login')
             self.access_token = self._obtain_oauth_access_token()
-        elif self.client_id:
+        elif (self.client_id):
             self.access_token = self._renew_access_token()
 
+    def _get_access_token(self):
+        '''
+        Return a valid access token.
+
+        The token held by the client is reused until it expires. Threads of the client refresh it once,
+        while holding the lock of the client. If a token store is configured, a valid token of another process
+        is reused; otherwise the token is refreshed while holding the store lock, so processes sharing the
+        store perform a single IMS exchange.
+        '''
+        if (is_token_record_valid(self._get_token_record())):
+            return self.access_token
+
+        with self._token_lock:
+            # Another thread may have refreshed the token while waiting for the lock
+            if (is_token_record_valid(self._get_token_record())):
+                return self.access_token
+
+            if (self.token_store is None):
+                with profile_phase(self.profiler, 'authentication'):
+                    self._request_access_token(self.refresh_token)
+                return self.access_token
+
+            return self._get_stored_access_token()
+
+    def _get_stored_access_token(self):
+        '''
+        Return a valid access token from the token store, refreshing it while holding the store lock.
+        '''
+        key = self._get_token_store_key()
+        record = self.token_store.get(key)
+        if (not is_token_record_valid(record)):
+            with self.token_store.lock(key):
+                # Another process may have refreshed the token while waiting for the lock
+                record = self.token_store.get(key)
+                if (not is_token_record_valid(record)):
+                    refresh_token = record.get('refresh_token') if record else None
+                    with profile_phase(self.profiler, 'authentication'):
+                        self._request_access_token(refresh_token or self.refresh_token)
+                    record = self._get_token_record()
+                    self.token_store.put(key, record)
+
+        self.access_token = record['access_token']
+        self.access_token_expires_at = record.get('expires_at')
+        self.refresh_token = record.get('refresh_token')
+        return self.access_token
+
+    def set_streaming(self, streaming = True):
+        '''
+        Decode report pages while they are downloaded.
+
+        The rows of every page are written directly into column buffers instead of being decoded into
+        a list of dicts, which lowers the peak memory of large pages. Metrics are returned as floats.
+        Streamed responses are not shared through the request coalescer.
+
+        Parameters
+        ----------
+        streaming : bool - default: True
+            Enable or disable streaming
+        '''
+        self.streaming = streaming
+
+    def set_transport(self, transport = None):
+        '''
+        Set the transport of the report requests.
+
+        Parameters
+        ----------
+        transport : requests_transport or http2_transport - optional
+            Transport to use. If not provided, the default requests_transport is restored.
+
+        Returns
+        -------
+        object
+            The transport in use.
+        '''
+        if (transport is None):
+            transport = requests_transport()
+        self.transport = transport
+        return transport
+
+    def set_retry_policy(self, policy):
+        '''
+        Retry server errors and timeouts, and hedge slow requests, based on a retry_policy. Pass None to disable.
+        '''
+        self.retry_policy = policy
+
+    def set_circuit_breaker(self, breaker):
+        '''
+        Pause requests while the recent error rate is high, based on a circuit_breaker. 
+        The same breaker can be shared by several clients. Pass None to disable.
+        '''
+        self.circuit_breaker = breaker
+
+    def set_rate_limiter(self, rate_limiter):
+        '''
+        Consult a rate limiter before every request.
+
+        With a shared_rate_limiter, all the clients of all the processes on the host that use the same database
+        share one request budget per global company ID. The local back-off between requests is then
+        replaced by the limiter. Pass None to disable.
+        '''
+        self.rate_limiter = rate_limiter
+
+    def set_token_store(self, token_store):
+        '''
+        Share access tokens through a token store (file_token_store, sqlite_token_store or memory_token_store).
+        Pass None to keep tokens in the client only.
+        '''
+        self.token_store = token_store
+
+    def _get_request_headers(self):
+
+        if (self.auth_client_id or self.client_id):
+            self._get_access_token()
+
         analytics_header = {
             "X-Api-Key": (self.client_id or self.auth_client_id),
             "x-proxy-global-company-id": self.account_id,
@@ -163,6 +389,10 @@ class analytics_client:
 
     def _authenticate(self):
         self.access_token = self._obtain_oauth_access_token()
+        if (self.token_store is not None):
+            key = self._get_token_store_key()
+            with self.token_store.lock(key):
+                self.token_store.put(key, self._get_token_record())
 
     @staticmethod
     def _generate_empty_report_object():
@@ -268,126 +498,775 @@ class analytics_client:
         if report_object is None:
             report_object = self.report_object
 
+        # Streamed responses can only be read once, so they are not shared
+        if (self.request_coalescer is not None and not self.streaming):
+            request_key = self.request_coalescer.get_request_key(self.analytics_url, report_object)
+            requests_sent = []
+            def post_report():
+                requests_sent.append(request_key)
+                return self._post_report(report_object)
+            response = self.request_coalescer.execute(request_key, post_report)
+            if (len(requests_sent) == 0):
+                # Shared or reused response: its latency was recorded by the request that received it
+                response = copy.copy(response)
+                response.reused = True
+            return response
+
+        return self._post_report(report_object)
+
+    def _post_report(self, report_object):
+        '''
+        Perform the POST request of a report object, retrying while the API responds with 429.
+
+        If a retry policy is configured, server errors and timeouts are retried with jittered back-off and slow
+        requests are hedged. If a circuit breaker is configured, requests wait while it is open.
+        '''
         analytics_header = self._get_request_headers()
+        request_data = json.dumps(report_object)
         
         status_code = None
         time_delay = 1
+        attempt = 0
         while status_code != 200:
-            
-            page = requests.post(
-                self.analytics_url,
-                headers=analytics_header,
-                data=json.dumps(report_object),
-                timeout = 360
-            )
+
+            if (self.circuit_breaker is not None):
+                self.circuit_breaker.wait()
+
+            try:
+                page = self._send_request(analytics_header, request_data)
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+                self._record_request_outcome(False)
+                if (self.retry_policy is None or not self.retry_policy.should_retry(attempt)):
+                    raise
+                attempt = attempt + 1
+                self._wait_before_retry(attempt)
+                continue
+
             if (self.debugging):
-                self.write_log('request_object', json.dumps(report_object))
+                self.write_log('request_object', request_data)
                 self.write_log('response', page.text)
+
+            if (self.rate_limiter is not None):
+                self.rate_limiter.record_response(self.account_id, page.status_code)
                 
             if (page.status_code == 429):
                 # Response code 429
                 # {"error_code":"429050","message":"Too many requests"}
                 print('Response code error: {}'.format(page.status_code))
+                if (self.stats_catalog is not None):
+                    self.stats_catalog.record_throttled(report_object, self._get_breakdown_level(report_object))
+
+            elif (self.retry_policy is not None and page.status_code in self.retry_policy.retry_statuses):
+                self._record_request_outcome(False)
+                if (not self.retry_policy.should_retry(attempt)):
+                    page.raise_for_status()
+                self.logger('Response code error: {}. Retrying'.format(page.status_code))
+                attempt = attempt + 1
+                self._wait_before_retry(attempt)
+                continue
                 
             elif (page.status_code != 200):
+                self._record_request_outcome(False)
                 page.raise_for_status()
                 # raise ValueError('Response code error', page.status_code)
 
+            else:
+                self._record_request_outcome(True)
+
             status_code = page.status_code  
-            time.sleep(time_delay)
-            time_delay = time_delay * 2
+            if (self.rate_limiter is None):
+                # Without a shared rate limiter, requests are paced locally
+                time.sleep(time_delay)
+                time_delay = time_delay * 2
 
         return page
 
+    def _send_request(self, analytics_header, request_data):
+        '''
+        Send a single request. If the retry policy hedges requests and the request takes longer than the hedge delay,
+        a duplicate request is sent and the first successful response is returned.
+        '''
+        hedge_delay = self.retry_policy.get_hedge_delay() if self.retry_policy is not None else None
+        if (hedge_delay is None):
+            return self._timed_post(analytics_header, request_data)
+
+        # The threads end with their request, so the slower copy does not hold the client
+        hedge_executor = ThreadPoolExecutor(max_workers = 2)
+        try:
+            requests_sent = [hedge_executor.submit(self._timed_post, analytics_header, request_data)]
+            done, pending = wait(requests_sent, timeout = hedge_delay)
+            if (len(done) == 0):
+                self.retry_policy.record_hedge()
+                self.logger('Request slower than {:.2f} seconds. Sending hedged request'.format(hedge_delay))
+                requests_sent.append(hedge_executor.submit(self._timed_post, analytics_header, request_data))
+
+            pending = set(requests_sent)
+            while True:
+                done, pending = wait(pending, return_when = FIRST_COMPLETED)
+                successful = [request_sent for request_sent in done if request_sent.exception() is None]
+                if (len(successful) > 0):
+                    # Release the connections of the other copies
+                    for request_sent in requests_sent:
+                        if (request_sent is not successful[0]):
+                            request_sent.add_done_callback(_close_response)
+                    return successful[0].result()
+                if (len(pending) == 0):
+                    # All copies failed
+                    return done.pop().result()
+        finally:
+            hedge_executor.shutdown(wait = False)
+
+    def _timed_post(self, analytics_header, request_data):
+        if (self.rate_limiter is not None):
+            with profile_phase(self.profiler, 'rate_limit_wait'):
+                self.rate_limiter.acquire(self.account_id)
+
+        start_time = time.time()
+        with profile_phase(self.profiler, 'network'):
+            if (self.streaming):
+                page = self.transport.post(self.analytics_url, headers=analytics_header, data=request_data, timeout = self._get_timeout(), stream = True)
+            else:
+                page = self.transport.post(
+                    self.analytics_url,
+                    headers=analytics_header,
+                    data=request_data,
+                    timeout = self._get_timeout()
+                )
+        if (self.retry_policy is not None):
+            self.retry_policy.record_latency(time.time() - start_time)
+        return page
+
+    def _wait_before_retry(self, attempt):
+        self.retry_policy.record_retry()
+        time.sleep(self.retry_policy.get_delay(attempt))
+
+    def _record_request_outcome(self, success):
+        if (self.circuit_breaker is not None):
+            self.circuit_breaker.record(success)
+
     def get_report(self, custom_report_object = None):
-        self._set_page_number(0)
+        if (self.result_store is not None):
+            return self.result_store.get_report(self, custom_report_object or self.report_object)
+        return self._download_report(custom_report_object)
+
+    def _download_report(self, custom_report_object = None):
+        '''
+        Download all the pages of a report.
+
+        The pages are requested with a copy of the report object of the client, so that concurrent downloads
+        (i.e. prefetched breakdowns) never change the page of a report that is being downloaded.
+        '''
+        if (custom_report_object is None):
+            custom_report_object = json.loads(json.dumps(self.report_object))
+        custom_report_object = self._add_key_to_dict(custom_report_object, 'settings')
+        custom_report_object['settings']['page'] = '0'
+        level = self._get_breakdown_level(custom_report_object)
+        self._apply_limit_policy(custom_report_object, level)
+
         # Get initial page
-        data = self._get_page(custom_report_object)
-        self.logger(data.text)
-        json_obj = json.loads(data.text)
+        data, json_obj, page_df = self._download_page(custom_report_object, level)
+        if (self.pipeline is not None):
+            return self._get_remaining_pages_pipelined(custom_report_object, level, data, json_obj, page_df)
+
         total_pages = json_obj['totalPages']
         current_page = 1
         is_last_page = False
-        df_data = self.format_output(data)
+        with profile_phase(self.profiler, 'format_output'):
+            pages = [page_df if page_df is not None else self.format_output(data)]
 
         # Download additional data if more than 1 pages are available
         while (total_pages > 1 and not is_last_page):
 
-            if (custom_report_object is not None):
-                # Workaround - This is done because in multiple breakdowns, pagination does not work in sub-breakdowns.
-                custom_report_object['settings']['page'] = '{}'.format(current_page)
+            custom_report_object['settings']['page'] = '{}'.format(current_page)
 
             self.logger('Parsing page {}'.format(current_page)) 
-            self._set_page_number(current_page)
-            data = self._get_page(custom_report_object)
-            self.logger(data.text)
-            json_obj = json.loads(data.text)
+            data, json_obj, page_df = self._download_page(custom_report_object, level)
             is_last_page = json_obj['lastPage']
             current_page = current_page + 1
-            df_current_page = self.format_output(data)
+            with profile_phase(self.profiler, 'format_output'):
+                pages.append(page_df if page_df is not None else self.format_output(data))
+
+        with profile_phase(self.profiler, 'concat'):
+            return pd.concat(pages, ignore_index=True)
+
+    def _get_remaining_pages_pipelined(self, custom_report_object, level, data, json_obj, page_df = None):
+        '''
+        Download the pages after the first one with the fetch workers of the pipeline, while
+        parsing the downloaded pages with its parse workers.
+
+        At most pipeline.queue_size pages are downloaded but not parsed at any time.
+        With streaming, the fetch workers decode the pages while downloading them.
+        '''
+        base_report_object = json.loads(json.dumps(custom_report_object or self.report_object))
+        metricNames = self._get_metrics()
+        total_pages = json_obj['totalPages']
+        total_elements = json_obj.get('totalElements', 0)
+        limit = int(base_report_object['settings'].get('limit', 0) or 0)
+
+        if (page_df is not None):
+            parsed_pages = [_completed_future(page_df)]
+        else:
+            parsed_pages = [self.pipeline.parse_executor.submit(_parse_page_text, data.text, metricNames)]
+        fetch_page = self._fetch_page_frame if self.streaming else self._fetch_page_text
+        pending_pages = deque()
+        next_page = 1
+        while (next_page < total_pages or len(pending_pages) > 0):
+            while (next_page < total_pages and len(pending_pages) < self.pipeline.queue_size):
+                page_report_object = json.loads(json.dumps(base_report_object))
+                page_report_object['settings']['page'] = '{}'.format(next_page)
+                rows = min(limit, total_elements - next_page * limit) if limit > 0 else 0
+                pending_pages.append(self.pipeline.fetch_executor.submit(fetch_page, page_report_object, level, rows, total_elements))
+                next_page = next_page + 1
+
+            if (self.streaming):
+                parsed_pages.append(pending_pages.popleft())
+                continue
+
+            page_text = pending_pages.popleft().result()
+            # Bound the number of downloaded pages waiting to be parsed
+            unparsed_pages = [page for page in parsed_pages if not page.done()]
+            if (len(unparsed_pages) >= self.pipeline.queue_size):
+                unparsed_pages[0].result()
+            parsed_pages.append(self.pipeline.parse_executor.submit(_parse_page_text, page_text, metricNames))
+
+        with profile_phase(self.profiler, 'parse_wait'):
+            pages = [page.result() for page in parsed_pages]
+        with profile_phase(self.profiler, 'concat'):
+            return pd.concat(pages, ignore_index=True)
+
+    def _fetch_page_text(self, report_object, level, rows, total_elements):
+        '''
+        Download a page without decoding it. The page is recorded in the limit policy with the
+        number of rows expected from the first page of the report.
+        '''
+        data = self._get_page(report_object)
+        self.logger(data.text)
+        if (_is_reused_response(data)):
+            return data.text
+        if (self.limit_policy is not None):
+            self.limit_policy.record(
+                level = level,
+                limit = int(report_object['settings']['limit']),
+                rows = rows,
+                total_elements = total_elements,
+                latency = data.elapsed.total_seconds(),
+                response_bytes = len(data.content)
+            )
+        if (self.stats_catalog is not None):
+            page = {'number': int(report_object['settings']['page']), 'numberOfElements': rows}
+            self.stats_catalog.record_page(report_object, level, page, len(data.content), data.elapsed.total_seconds())
+        return data.text
+
+    def _fetch_page_frame(self, report_object, level, rows, total_elements):
+        '''
+        Download and decode a streamed page. Used instead of _fetch_page_text when streaming.
+        '''
+        return self._download_page(report_object, level)[2]
+
+    def _download_page(self, report_object, level):
+        '''
+        Download a single page and record it in the limit policy (if configured).
+
+        With streaming, the page is decoded while it is downloaded (see set_streaming()).
 
-            df_data = df_data.append(df_current_page, ignore_index=True)
+        Returns
+        -------
+        tuple
+            Response object, the decoded JSON response (without the rows when streaming) and
+            the formatted page when streaming (None otherwise).
+        '''
+        data = self._get_page(report_object)
+        page_df = None
+        if (self.streaming):
+            with profile_phase(self.profiler, 'json_decode'):
+                page_df, json_obj, response_bytes = _format_page_stream(data.iter_content(chunk_size = 65536), self._get_metrics(report_object))
+        else:
+            self.logger(data.text)
+            with profile_phase(self.profiler, 'json_decode'):
+                json_obj = json.loads(data.text)
+            response_bytes = len(data.content)
+
+        if (_is_reused_response(data)):
+            return data, json_obj, page_df
+        if (self.limit_policy is not None):
+            settings = (report_object or self.report_object)['settings']
+            self.limit_policy.record(
+                level = level,
+                limit = int(settings['limit']),
+                rows = json_obj.get('numberOfElements', len(json_obj.get('rows', []))),
+                total_elements = json_obj.get('totalElements', 0),
+                latency = data.elapsed.total_seconds(),
+                response_bytes = response_bytes
+            )
+        if (self.stats_catalog is not None):
+            self.stats_catalog.record_page(report_object or self.report_object, level, json_obj, response_bytes, data.elapsed.total_seconds())
+        return data, json_obj, page_df
 
-        return df_data
+    def _apply_limit_policy(self, report_object, level):
+        '''
+        Set the limit of the next paginated request based on the limit policy (if configured).
+        '''
+        if (self.limit_policy is None):
+            return
+        limit = self.limit_policy.get_limit(level)
+        if (report_object is None):
+            self._set_report_setting('limit', limit)
+        else:
+            report_object['settings']['limit'] = '{}'.format(limit)
 
-    def get_report_multiple_breakdowns(self):
+    @staticmethod
+    def _get_breakdown_level(report_object):
+        '''
+        Return the breakdown level of a report object, based on the breakdown metric filters per metric.
+        '''
+        number_of_metrics = len(report_object['metricContainer']['metrics'])
+        if (number_of_metrics == 0):
+            return 1
+        breakdown_filters = [metric_filter for metric_filter in report_object['metricContainer'].get('metricFilters', []) 
+            if metric_filter.get('type') == 'breakdown']
+        return 1 + len(breakdown_filters) // number_of_metrics
+
+    def _get_timeout(self):
+        if (self.limit_policy is not None):
+            return self.limit_policy.get_timeout()
+        return self.timeout
+
+    def get_report_multiple_breakdowns(self, totals_only = False):
         '''
         Download report that contains multiple dimensions.
 
         Initial report (top-level dimension) is downloaded using get_report() method. Subsequent dimensions
-        are downloaded using get_report_breakdown(). This is because sub-breakdowns rely on itemId.
+        are downloaded per parent node using the item IDs of the previous levels. This is because sub-breakdowns rely on itemId.
+
+        The results are kept in a breakdown_tree: one node table per level with integer codes and a pointer
+        to the parent node. The flat report is assembled once after the last level has been downloaded.
 
-        Per remaining (non-top) dimensions, get_report_breakdown() is invoked.
+        Parameters
+        ----------
+        totals_only : bool - default: False
+            Return only the report totals of the last dimension per parent path, instead of its rows.
+            Each parent requires a single request with the minimum page size. With a single dimension,
+            the totals of the report are returned (see get_report_totals()).
 
         Returns
         -------
         Pandas data frame object
             Data frame with columns:
-            - itemId_lvl_*      : ID of the value per breakdown level
-            - value_lvl_*       : The row value for the particular breakdown combination
+            - itemId_lvl_*      : ID of the value per breakdown level (categorical)
+            - value_lvl_*       : The row value for the particular breakdown combination (categorical)
             - metrics/{metric}  : Metric name is added in the API request i.e. metrics/visits
         '''
-        
-        current_dimensions = []
-        # Download 1st level data
-        df_page = self.get_report()
-        level = 1
-
-        dim_index = 1
-        remaining_dimensions = list(self.dimensions)
-        remaining_dimensions.pop(0)
-
-        # Re-format column names
-        if (len(remaining_dimensions) > 0):
-            df_page = df_page.filter(regex='^itemId|^value', axis = 'columns')
-        
-        df_page = df_page.rename(
-                columns = {
-                    'itemId' : 'itemId_lvl_{}'.format(level),
-                    'value' : 'value_lvl_{}'.format(level)}
-                )    
-        
-        for breakdown in remaining_dimensions:
-            level = level + 1
-            dim_index = dim_index + 1
-            current_dimensions.append(breakdown)
-            
-            results_broken_down = df_page.apply(self.get_report_breakdown, axis = 1 , dimensions = current_dimensions, current_level = level)
-            dl = []
-            for i in results_broken_down:
-                dl.append(i)
-            
-            results_broken_down = pd.concat(dl, ignore_index=True)
+        if (self.order_optimizer is not None and len(self.dimensions) > 1):
+            return self.order_optimizer.get_report(self, totals_only)
+
+        if (self.stats_catalog is not None):
+            self.stats_catalog.configure(self, totals_only)
+
+        number_of_levels = len(self.dimensions)
+        if (totals_only):
+            # The last dimension is only used for its totals
+            number_of_levels = number_of_levels - 1
+            if (number_of_levels == 0):
+                return self.get_report_totals()
+
+        tree = breakdown_tree(self.memory_budget, self.spill_directory)
+        prefetch = None
+        prefetch_executor = None
+        node_function = self._get_breakdown_node
+        if (self.prefetch_history is not None and number_of_levels > 1):
+            history_key = self.prefetch_history.get_report_key(self.report_object, self.dimensions)
+            if (self.pipeline is not None):
+                executor = self.pipeline.breakdown_executor
+            else:
+                executor = prefetch_executor = ThreadPoolExecutor(max_workers = 4)
+            prefetch = speculative_prefetch(self._get_breakdown_path, executor, self.prefetch_history.get(history_key),
+                cancel_queued = self.pipeline is not None)
+            # Children of the previously seen parents are downloaded while the parent levels are downloading
+            prefetch.start(number_of_levels - 1)
+            node_function = lambda tree, parent_level, parent: prefetch.get(tree.get_item_path(parent_level, parent))
+
+        refresh = None
+        if (self.refresh_store is not None and number_of_levels > 1):
+            refresh_key = parent_history.get_report_key(self.report_object, self.dimensions)
+            refresh_date_range = get_date_range(self.report_object)
+            refresh = breakdown_refresh(self.refresh_store.get(refresh_key, refresh_date_range))
+            # Children of unchanged parents are taken from the previous result
+            download_function = node_function
+            node_function = lambda tree, parent_level, parent: refresh.get_node(tree, parent_level, parent, download_function)
+
+        if (self.scheduler is not None):
+            self.scheduler.start_run()
+
+        try:
+            # Download 1st level data
+            with profile_phase(self.profiler, 'level_1'):
+                tree.add_level(self.get_report())
+
+            for level in range(2, number_of_levels + 1):
+                # Children are added to the level as they are downloaded
+                tree.start_level()
+                parent = 0
+                for df in self._iter_breakdown_parents(node_function, tree, level - 1, schedule = True):
+                    df['parent'] = parent
+                    with profile_phase(self.profiler, 'append_to_level'):
+                        tree.append_to_level(df)
+                    parent = parent + 1
+                tree.finish_level()
+
+            if (refresh is not None):
+                self.refresh_store.record(refresh.reused, refresh.downloaded)
+                self.refresh_store.put(refresh_key, tree.get_level_frames(), refresh_date_range)
+
+            if (totals_only):
+                totals = self._map_breakdown_parents(self._get_breakdown_totals, tree, number_of_levels)
+                tree.set_level_metrics(number_of_levels, pd.concat(totals, ignore_index=True))
+
+            if (prefetch is not None):
+                self.prefetch_history.record(prefetch.hits, prefetch.misses, prefetch.finish())
+                parent_paths = {}
+                for parent_level in range(1, number_of_levels):
+                    parent_paths[parent_level] = [tree.get_item_path(parent_level, row) for row in range(tree.get_level_size(parent_level))]
+                self.prefetch_history.put(history_key, parent_paths)
+
+            with profile_phase(self.profiler, 'assemble'):
+                return tree.assemble()
+        finally:
+            if (prefetch is not None):
+                prefetch.finish()
+            if (prefetch_executor is not None):
+                prefetch_executor.shutdown(wait = False)
+            tree.close()
+
+    def _map_breakdown_parents(self, function, tree, parent_level):
+        '''
+        Apply function(tree, parent_level, parent) to every node of the parent level, concurrently if a pipeline is set.
+        '''
+        return list(self._iter_breakdown_parents(function, tree, parent_level))
 
-            df_page = df_page.filter(regex='^itemId|^value', axis = 'columns')
-            df_page = pd.merge(df_page, results_broken_down, how = 'right')
-            
-        return df_page
+    def _iter_breakdown_parents(self, function, tree, parent_level, schedule = False):
+        '''
+        Yield function(tree, parent_level, parent) for every node of the parent level, in node order.
+
+        With a pipeline, up to breakdown_workers + queue_size nodes are processed ahead of the node being
+        consumed, so that only a bounded number of results is held in memory. With schedule and a scheduler,
+        the nodes are submitted in the order of the scheduler within the same bound.
+        '''
+        parents = range(tree.get_level_size(parent_level))
+        if (self.pipeline is None):
+            for parent in parents:
+                yield function(tree, parent_level, parent)
+            return
+
+        if (schedule and self.scheduler is not None):
+            for result in self._iter_scheduled_parents(function, tree, parent_level):
+                yield result
+            return
+
+        futures = deque()
+        for parent in parents:
+            futures.append(self.pipeline.breakdown_executor.submit(function, tree, parent_level, parent))
+            if (len(futures) >= self.pipeline.breakdown_workers + self.pipeline.queue_size):
+                yield futures.popleft().result()
+        while (len(futures) > 0):
+            yield futures.popleft().result()
+
+    def _iter_scheduled_parents(self, function, tree, parent_level):
+        '''
+        Submit the nodes of the parent level largest-expected-first and yield their results in node order.
+
+        At most breakdown_workers + queue_size nodes are in flight or completed but not consumed. The node
+        to consume next is submitted ahead of the order of the scheduler if it is not in the window yet.
+        '''
+        level = parent_level + 1
+        cost_values = self.scheduler.get_cost_values(tree.levels[parent_level - 1])
+        order = self.scheduler.get_order(level, cost_values)
+        started = np.zeros(len(order))
+        finished = np.zeros(len(order))
+        level_start = time.time()
+
+        def run(parent):
+            started[parent] = time.time() - level_start
+            result = function(tree, parent_level, parent)
+            finished[parent] = time.time() - level_start
+            return result
+
+        window = self.pipeline.breakdown_workers + self.pipeline.queue_size
+        scheduled = deque(order)
+        submitted = set()
+        futures = {}
+        actual_rows = np.zeros(len(order))
+        for parent in range(len(order)):
+            while (len(futures) < window and len(scheduled) > 0):
+                next_parent = scheduled.popleft()
+                if (next_parent not in submitted):
+                    submitted.add(next_parent)
+                    futures[next_parent] = self.pipeline.breakdown_executor.submit(run, next_parent)
+            if (parent not in submitted):
+                submitted.add(parent)
+                futures[parent] = self.pipeline.breakdown_executor.submit(run, parent)
+            result = futures.pop(parent).result()
+            actual_rows[parent] = len(result)
+            yield result
+
+        if (self.limit_policy is not None):
+            limit = self.limit_policy.get_limit(level)
+        else:
+            limit = int(self.report_object['settings'].get('limit', 50000))
+        self.scheduler.record(level, cost_values, order, actual_rows, limit, started, finished)
+
+    def get_report_totals(self, custom_report_object = None):
+        '''
+        Download only the totals of a report.
+
+        A single page with the minimum page size is requested and the summaryData totals of the response
+        are returned, without paging through the rows.
+
+        Parameters
+        ----------
+        custom_report_object : object - optional
+            Report object to use instead of the main report object
+
+        Returns
+        -------
+        Pandas data frame
+            A single row with one column per metric.
+        '''
+        report_object = custom_report_object or self.report_object
+        json_obj = self._get_summary_page(report_object)
+        with profile_phase(self.profiler, 'format_output'):
+            return _format_totals(json_obj, self._get_metrics(report_object))
+
+    def _get_summary_page(self, report_object):
+        '''
+        Download the first page of a report with the minimum page size, for its totals and totalElements.
+        '''
+        report_object = json.loads(json.dumps(report_object))
+        report_object = self._add_key_to_dict(report_object, 'settings')
+        report_object['settings']['limit'] = '1'
+        report_object['settings']['page'] = '0'
+
+        data = self._get_page(report_object)
+        self.logger(data.text)
+        with profile_phase(self.profiler, 'json_decode'):
+            return json.loads(data.text)
+
+    def get_report_partitioned(self, partitions = 8, verify = True):
+        '''
+        Download a single dimension report as concurrent partitions of the dimension values.
+
+        The values of the dimension are split into disjoint partitions with search clauses, and every partition
+        is downloaded as an independent paginated report. The partitions are downloaded concurrently, in
+        addition to the fetch workers of a pipeline, so large reports are parallel even for a single date range.
+
+        Parameters
+        ----------
+        partitions : int or list - default: 8
+            Number of partitions by first character of the values (see get_prefix_partitions()),
+            or a list of search clauses that select disjoint sets of values covering the dimension.
+
+        verify : bool - default: True
+            Compare the merged partitions with the totalElements and totals of the unpartitioned report
+            (one additional request). Raises ValueError if items are missing or returned more than once.
+
+        Returns
+        -------
+        Pandas data frame
+            Same output as get_report().
+        '''
+        if (isinstance(partitions, int)):
+            partitions = get_prefix_partitions(partitions)
+        report_objects = [get_partition_report_object(self.report_object, clause) for clause in partitions]
+
+        with ThreadPoolExecutor(max_workers = len(report_objects) + 1) as executor:
+            summary = executor.submit(self._get_summary_page, self.report_object) if verify else None
+            futures = [executor.submit(self.get_report, report_object) for report_object in report_objects]
+            frames = [future.result() for future in futures]
+
+            with profile_phase(self.profiler, 'merge'):
+                df = merge_partitions(frames, self.report_object)
+            if (verify):
+                check_partition_coverage(df, summary.result())
+        return df
+
+    def _get_breakdown_totals(self, tree, parent_level, parent):
+        item_ids = tree.get_item_path(parent_level, parent)
+        report_object = self._get_breakdown_report_object(self.report_object, self.dimensions, item_ids)
+        with profile_phase(self.profiler, 'level_{}'.format(parent_level + 1)):
+            return self.get_report_totals(report_object)
+
+    def _get_breakdown_node(self, tree, parent_level, parent):
+        '''
+        Download the breakdown of a single parent node.
+
+        The item IDs of the parent path are obtained from the tree and applied as breakdown metric filters.
+
+        Parameters
+        ----------
+        tree : breakdown_tree
+            Tree containing the already downloaded levels
+
+        parent_level : int
+            Level of the parent node (1 for the top-level dimension)
+
+        parent : int
+            Row position of the parent node within its level
+
+        Returns
+        -------
+        Pandas data frame
+            The child rows as returned from get_report().
+        '''
+        return self._get_breakdown_path(tree.get_item_path(parent_level, parent))
+
+    def _get_breakdown_path(self, item_ids):
+        '''
+        Download the breakdown of the parent path item_ids by the next dimension.
+        '''
+        tmp_report_object = self._get_breakdown_report_object(self.report_object, self.dimensions, item_ids)
+
+        with profile_phase(self.profiler, 'level_{}'.format(len(item_ids) + 1)):
+            return self.get_report(custom_report_object=tmp_report_object)
+
+    def enqueue_breakdown_job(self, queue):
+        '''
+        Add the configured report to a work queue as a breakdown job.
+
+        The report is downloaded by run_breakdown_worker() calls, which can run in other processes or
+        machines sharing the queue, and is assembled with assemble_breakdown_job().
+
+        Parameters
+        ----------
+        queue : work_queue
+            Queue backend, i.e. sqlite_work_queue
+
+        Returns
+        -------
+        string
+            Job ID
+        '''
+        spec = {
+            'report_object': self.report_object,
+            'dimensions': list(self.dimensions) or [self.report_object['dimension']]
+        }
+        return queue.add_job(spec)
+
+    def run_breakdown_worker(self, queue, job_id = None, lease_seconds = 600, max_units = None):
+        '''
+        Claim and download work units from a queue until no unit is available.
+
+        Each unit is one page of one breakdown node. The page is downloaded and parsed, and the result is
+        written to the queue together with the units it discovered: the remaining pages of the node and the
+        children of its rows. Units of a failed request are released and the error is raised.
+
+        Note: The limit of the job specification is used for all the units, as the page numbers depend on it.
+
+        Parameters
+        ----------
+        queue : work_queue
+            Queue backend, i.e. sqlite_work_queue
+
+        job_id : string - optional
+            Only process units of this job
+
+        lease_seconds : int - default: 600
+            Time after which an unfinished unit is handed out to another worker
+
+        max_units : int - optional
+            Maximum number of units to process
+
+        Returns
+        -------
+        int
+            Number of units processed
+        '''
+        processed = 0
+        while (max_units is None or processed < max_units):
+            unit = queue.claim(job_id, lease_seconds)
+            if (unit is None):
+                break
+            try:
+                result, new_units = self._process_work_unit(queue.get_job(unit.job_id), unit)
+            except Exception:
+                queue.fail(unit)
+                raise
+            queue.complete(unit, result, new_units)
+            processed = processed + 1
+        return processed
+
+    def _process_work_unit(self, spec, unit):
+        dimensions = spec['dimensions']
+        report_object = self._get_breakdown_report_object(spec['report_object'], dimensions, unit.path)
+        report_object = self._add_key_to_dict(report_object, 'settings')
+        report_object['settings']['page'] = '{}'.format(unit.page)
+
+        data = self._get_page(report_object)
+        self.logger(data.text)
+        with profile_phase(self.profiler, 'json_decode'):
+            json_obj = json.loads(data.text)
+        with profile_phase(self.profiler, 'format_output'):
+            result = _format_page(json_obj, self._get_metrics(report_object))
+
+        new_units = []
+        if (unit.page == 0):
+            new_units.extend((unit.path, page) for page in range(1, json_obj['totalPages']))
+        if (len(unit.path) + 1 < len(dimensions)):
+            new_units.extend((unit.path + [item_id], 0) for item_id in result['itemId'])
+        return result, new_units
+
+    def assemble_breakdown_job(self, queue, job_id):
+        '''
+        Assemble the results of a completed breakdown job.
+
+        Returns
+        -------
+        Pandas data frame object
+            Same output as get_report_multiple_breakdowns()
+        '''
+        status = queue.get_job_status(job_id)
+        if (not queue.is_job_done(job_id) or status.get('failed', 0) > 0):
+            raise ValueError('Breakdown job is not complete', job_id, status)
+
+        pages = {}
+        for path, page, df in queue.get_results(job_id):
+            pages.setdefault(tuple(path), []).append((page, df))
+
+        tree = breakdown_tree(self.memory_budget, self.spill_directory)
+        try:
+            parent_paths = [()]
+            for level in range(1, len(queue.get_job(job_id)['dimensions']) + 1):
+                tree.start_level()
+                child_paths = []
+                for parent in range(len(parent_paths)):
+                    parent_path = parent_paths[parent]
+                    df = pd.concat([df for page, df in sorted(pages.pop(parent_path), key = lambda page: page[0])], ignore_index=True)
+                    if (level > 1):
+                        df['parent'] = parent
+                    tree.append_to_level(df)
+                    child_paths.extend(parent_path + (item_id,) for item_id in df['itemId'])
+                tree.finish_level()
+                parent_paths = child_paths
+
+            return tree.assemble()
+        finally:
+            tree.close()
+
+    def _get_breakdown_report_object(self, report_object, dimensions, item_ids):
+        '''
+        Return a copy of the report object that breaks down the parent path item_ids by the next dimension.
+        '''
+        report_object = json.loads(json.dumps(report_object))
+        for idx in range(len(item_ids)):
+            dimension = dimensions[idx + 1]
+            self.logger('Dimension {}, Item ID: {}'.format(dimension, item_ids[idx]))
+            report_object = self._add_breakdown_report_object(report_object, dimension, item_ids[idx])
+        return report_object
 
     def get_report_breakdown(self, df_page, dimensions, current_level = None):
         '''
         Download broken-down dimensions of a single report.
 
+        Note: get_report_multiple_breakdowns() does not use this method; it downloads breakdowns through the breakdown_tree.
+
         For the existing dimensions in a data frame, iterate through all entries, generate a new report JSON object and
         download the new row values and metrics. 
         
@@ -437,15 +1316,17 @@ class analytics_client:
         })
         return results
 
-    def _get_metrics(self):
+    def _get_metrics(self, report_object = None):
         '''
         Return Metric names as Data frame. The index is the same as 
         the id used during the add_metric function.
         '''
+        if report_object is None:
+            report_object = self.report_object
         # Obtain Metrics Name - start
         index = []
         metricName = []
-        for metric in self.report_object['metricContainer']['metrics']:
+        for metric in report_object['metricContainer']['metrics']:
             index.append(metric['columnId'])
             metricName.append(metric['id'])
         metricNames = pd.DataFrame(index=index, data=metricName)
@@ -471,30 +1352,7 @@ class analytics_client:
             A data frame that contains returned data including the itemId.
         '''
 
-        metricNames = self._get_metrics()
-        data_json = data.json()
-        # Convert to DF to easily obtain the data column
-        df_response_data = pd.DataFrame(data_json['rows'])
-        # Convert metrics to DF into dedicated columns. Column header is the metric ID
-        if (data_json['totalPages'] > 0) and (df_response_data.shape != (0,0)):
-            metrics_column = df_response_data.data.tolist()
-            df_metrics_data = pd.DataFrame(metrics_column, index=df_response_data.index)
-        else:
-            
-            metrics_column = []
-            
-            idx = data_json['columns']['columnIds']
-            for i in idx:
-                metrics_column.append(0)
-            df_response_data = pd.DataFrame({'itemId': '0', 'value': 'Unspecified', 'data': metrics_column })
-            
-            metrics_column = [metrics_column]
-            df_metrics_data = pd.DataFrame(metrics_column)
-            
-        # Rename metrics' column headers into the metric name, based on the metric ID
-        df_metrics_data.rename(columns=lambda x: metricNames[metricNames.index == '{}'.format(x)].iloc[0][0], inplace=True)
-
-        return pd.merge(df_response_data, df_metrics_data, left_index=True, right_index=True).drop(columns=['data'])
+        return _format_page(data.json(), self._get_metrics())
 
     def add_metric(self, metric_name):
         metric = self._generate_metric_structure()
@@ -594,8 +1452,281 @@ class analytics_client:
         self.report_object['globalFilters'].append(date_range_globabl_filter)
         # self.report_object['globalFilters'][0]['dateRange'] = formated_date_range
 
+    def set_pipeline(self, pipeline = None):
+        '''
+        Overlap downloading and parsing of report pages.
+
+        Pages after the first page of a report are downloaded concurrently and parsed while the next pages
+        are downloading. Breakdown children are downloaded concurrently.
+
+        Parameters
+        ----------
+        pipeline : report_pipeline - optional
+            Pipeline executors to use. If not provided, a report_pipeline with the default settings is created.
+            Pass False to download sequentially.
+
+        Returns
+        -------
+        report_pipeline
+            The pipeline in use (None if disabled).
+        '''
+        if (pipeline is None):
+            pipeline = report_pipeline()
+        elif (pipeline is False):
+            pipeline = None
+        self.pipeline = pipeline
+        return pipeline
+
+    @contextmanager
+    def profile(self, trace_allocations = True):
+        '''
+        Profile the reports downloaded within the context.
+
+        Wall time, CPU time and allocations are recorded per internal phase (authentication, network,
+        json_decode, format_output, concat, assemble) and per breakdown level.
+
+        Parameters
+        ----------
+        trace_allocations : bool - default: True
+            Trace allocations with tracemalloc
+
+        Returns
+        -------
+        report_profiler
+            Profiler with the statistics, i.e. profiler.get_summary() or profiler.write_collapsed_stacks(path).
+        '''
+        previous_profiler = self.profiler
+        profiler = report_profiler(trace_allocations)
+        self.profiler = profiler
+        try:
+            with profiler:
+                yield profiler
+        finally:
+            self.profiler = previous_profiler
+
+    def set_scheduler(self, scheduler = None):
+        '''
+        Submit breakdown children largest-expected-first when a pipeline is set.
+
+        The size of every subtree is estimated from a metric of its parent and the rows per metric observed
+        in previous levels and runs. The predicted and actual sizes and timings of the last report are
+        available in scheduler.last_schedule.
+
+        Parameters
+        ----------
+        scheduler : subtree_scheduler - optional
+            Scheduler to use. If not provided, a subtree_scheduler with the default settings is created.
+            Pass False to submit the children in node order.
+
+        Returns
+        -------
+        subtree_scheduler
+            The scheduler in use (None if disabled).
+        '''
+        if (scheduler is None):
+            scheduler = subtree_scheduler()
+        elif (scheduler is False):
+            scheduler = None
+        self.scheduler = scheduler
+        return scheduler
+
+    def set_speculative_prefetch(self, history = None):
+        '''
+        Prefetch breakdown children from the parent item IDs of previous runs.
+
+        The parent paths of every breakdown level are stored per report specification. On the next run of
+        get_report_multiple_breakdowns(), the children of the stored parents are requested immediately, in
+        parallel with the top-level download. The prefetched children are used for the parents that are
+        still present; missing parents are downloaded as usual and the prefetches of parents that are no
+        longer present are discarded (their requests still count towards the API quota).
+
+        Parameters
+        ----------
+        history : parent_history - optional
+            Store of the parent paths. If not provided, a parent_history in the default location is created.
+            Pass False to disable prefetching.
+
+        Returns
+        -------
+        parent_history
+            The history in use (None if disabled).
+        '''
+        if (history is None):
+            history = parent_history()
+        elif (history is False):
+            history = None
+        self.prefetch_history = history
+        return history
+
+    def set_order_optimizer(self, optimizer = None):
+        '''
+        Download breakdown reports in the order of dimensions with the fewest requests.
+
+        The number of items of every dimension is obtained with one small request per dimension (or from
+        the known cardinalities of the optimizer). get_report_multiple_breakdowns() then downloads the
+        dimensions in the cheapest order and returns the columns in the order they were added.
+
+        Parameters
+        ----------
+        optimizer : breakdown_order_optimizer - optional
+            If not provided, a breakdown_order_optimizer is created. Pass False to keep the order of the dimensions.
+
+        Returns
+        -------
+        breakdown_order_optimizer
+            The optimizer in use (None if disabled).
+        '''
+        if (optimizer is None):
+            optimizer = breakdown_order_optimizer()
+        elif (optimizer is False):
+            optimizer = None
+        self.order_optimizer = optimizer
+        return optimizer
+
+    def set_stats_catalog(self, catalog = None):
+        '''
+        Record the statistics of every request per report suite, dimension, segments and breakdown level.
+
+        The statistics are kept across runs and processes (see stats_catalog). They initialise the page size
+        of the limit policy and the scheduler, provide the number of items of the dimensions to the order
+        optimizer, and get_report_multiple_breakdowns() warns when a report is estimated to be expensive.
+
+        Parameters
+        ----------
+        catalog : stats_catalog - optional
+            If not provided, a stats_catalog with the default location is created. Pass False to disable.
+
+        Returns
+        -------
+        stats_catalog
+            The catalog in use (None if disabled).
+        '''
+        if (catalog is None):
+            catalog = stats_catalog()
+        elif (catalog is False):
+            catalog = None
+        self.stats_catalog = catalog
+        return catalog
+
+    def set_refresh_store(self, store = None):
+        '''
+        Refresh breakdown reports incrementally from their previous result.
+
+        Every level of get_report_multiple_breakdowns() is stored per report specification, with its date range.
+        On the next run, the top level is downloaded and the children of a parent are requested only if the
+        parent is new or its metrics differ from the stored ones; the children of unchanged parents, and so
+        their whole subtrees, are taken from the store. The store is then replaced with the new result.
+
+        Reused subtrees are only correct if unchanged parent metrics imply unchanged children, as for a closed
+        period that was partially reprocessed, or a date range that is extended (parents without activity in the
+        added days). The store is therefore only used when the date range starts where the stored one starts and
+        contains it; reports over other periods are downloaded entirely.
+
+        Parameters
+        ----------
+        store : breakdown_store - optional
+            Store of the previous results. If not provided, a breakdown_store in the default location is created.
+            Pass False to disable the incremental refresh.
+
+        Returns
+        -------
+        breakdown_store
+            The store in use (None if disabled).
+        '''
+        if (store is None):
+            store = breakdown_store()
+        elif (store is False):
+            store = None
+        self.refresh_store = store
+        return store
+
+    def set_memory_budget(self, memory_budget, spill_directory = None):
+        '''
+        Limit the memory used by the intermediate results of breakdown reports.
+
+        The node tables and item dictionaries of the breakdown levels are accounted while downloading. When they
+        exceed the budget, the node tables are written to files and read back as memory-mapped arrays during the
+        assembly of the report; the item dictionaries stay in memory. The files are deleted once the report is assembled.
+
+        Parameters
+        ----------
+        memory_budget : int
+            Number of bytes to keep in memory. Pass None to disable spilling.
+
+        spill_directory : string - optional
+            Directory of the spill files. The system temporary directory is used if not provided.
+        '''
+        self.memory_budget = memory_budget
+        self.spill_directory = spill_directory
+
+    def set_request_coalescer(self, coalescer = None):
+        '''
+        Share identical report requests through a request_coalescer.
+
+        Concurrent identical requests perform a single HTTP call and completed responses are reused.
+        The same coalescer can be passed to several clients to reuse responses across reports within a run.
+
+        Parameters
+        ----------
+        coalescer : request_coalescer - optional
+            Coalescer to use. If not provided, a new one is created. Pass False to disable coalescing.
+
+        Returns
+        -------
+        request_coalescer
+            The coalescer in use (None if disabled).
+        '''
+        if (coalescer is None):
+            coalescer = request_coalescer()
+        elif (coalescer is False):
+            coalescer = None
+        self.request_coalescer = coalescer
+        return coalescer
+
+    def set_result_store(self, store = None):
+        '''
+        Answer reports from completed reports of the same dimension, segments and date range.
+
+        Reports with a subset of the metrics of a stored report, or a sub-range of the days of a stored daily
+        report, are answered without requests. Daily reports that partially overlap a stored one only request
+        the missing days. The same store can be shared by several clients.
+
+        Parameters
+        ----------
+        store : result_store - optional
+            If not provided, a new result_store is created. Pass False to disable.
+
+        Returns
+        -------
+        result_store
+            The store in use (None if disabled).
+        '''
+        if (store is None):
+            store = result_store()
+        elif (store is False):
+            store = None
+        self.result_store = store
+        return store
+
     def set_limit(self, rows_limit):
-        self._set_report_setting('limit', rows_limit)
+        '''
+        Set the number of rows per page.
+
+        Parameters
+        ----------
+        rows_limit : int, 'auto' or adaptive_limit_policy
+            Fixed number of rows per page. With 'auto' (or a configured adaptive_limit_policy) the limit and the
+            request timeout are tuned from the observed latency and payload size of the downloaded pages.
+        '''
+        if (isinstance(rows_limit, adaptive_limit_policy)):
+            self.limit_policy = rows_limit
+        elif (rows_limit == 'auto'):
+            self.limit_policy = adaptive_limit_policy()
+        else:
+            self.limit_policy = None
+            self._set_report_setting('limit', rows_limit)
+            return
+        self._set_report_setting('limit', self.limit_policy.get_limit())
 
     def _set_page_number(self, page_no):
         self._set_report_setting('page', page_no)
@@ -661,4 +1792,363 @@ class analytics_client:
 
         fil = open("logs/{}-{}.json".format(filename,datetime.now().isoformat()), "a")  # append mode 
         fil.write(message) 
-        fil.close() 
\ No newline at end of file
+        fil.close()
+
+
+class breakdown_tree:
+    '''
+    Breakdown report results stored as one node table per level.
+
+    Each node table holds the integer code of the item (code), the row position of the parent node
+    in the previous level (parent, -1 for the top level) and the metrics, as one array per column.
+    The itemId and value strings are stored once per level in a dictionary, where the position of an
+    item is its code. The flat report is assembled once by following the parent pointers from the last level.
+
+    A level is built from batches of rows (start_level(), append_to_level(), finish_level()). With a memory
+    budget, the bytes of the node tables and of the item dictionaries held in memory are accounted; when they
+    exceed the budget, the batches of the level being built and the completed levels are written to files in
+    the spill directory (with the dtype of every column) and read back as memory-mapped arrays. The item
+    dictionaries are always kept in memory.
+
+    Parameters
+    ----------
+    memory_budget : int - optional
+        Number of bytes of node tables and item dictionaries to keep in memory. No limit if not provided.
+
+    spill_directory : string - optional
+        Directory of the spill files. The system temporary directory is used if not provided.
+    '''
+
+    def __init__(self, memory_budget = None, spill_directory = None):
+        self.levels = []
+        self.level_dictionaries = []
+        self.memory_budget = memory_budget
+        self.spill_directory = spill_directory
+        self.memory_used = 0
+        self.dictionary_bytes = 0
+        self.spilled_bytes = 0
+        self._level = None
+        self._spill_path = None
+        self._spill_files = 0
+
+    def add_level(self, df):
+        '''
+        Add the next level of the tree.
+
+        Parameters
+        ----------
+        df : Pandas data frame
+            Rows as returned from get_report() with an additional parent column.
+            The parent column is optional for the top level.
+        '''
+        self.start_level()
+        self.append_to_level(df)
+        self.finish_level()
+
+    def start_level(self):
+        self._level = {'item_codes': {}, 'item_ids': [], 'values': [], 'batches': [], 'rows': 0, 'files': None}
+
+    def append_to_level(self, df):
+        '''
+        Add a batch of rows to the level being built. See add_level().
+        '''
+        level = self._level
+        dictionary_bytes = self.dictionary_bytes
+        codes, item_ids = pd.factorize(df['itemId'])
+        # Codes are assigned in order of first appearance
+        first_positions = np.unique(codes, return_index = True)[1]
+        values = df['value'].to_numpy()[first_positions]
+
+        # Map the codes of the batch to the codes of the level
+        batch_codes = np.empty(len(item_ids), dtype = np.int64)
+        for idx in range(len(item_ids)):
+            code = level['item_codes'].get(item_ids[idx])
+            if (code is None):
+                code = len(level['item_ids'])
+                level['item_codes'][item_ids[idx]] = code
+                level['item_ids'].append(item_ids[idx])
+                level['values'].append(values[idx])
+                self.dictionary_bytes = self.dictionary_bytes + sys.getsizeof(item_ids[idx]) + sys.getsizeof(values[idx])
+            batch_codes[idx] = code
+
+        batch = {'code': batch_codes[codes]}
+        if ('parent' in df.columns):
+            batch['parent'] = df['parent'].to_numpy().astype(np.int64)
+        else:
+            batch['parent'] = np.full(len(df), -1, dtype = np.int64)
+        for column in df.columns:
+            if (column not in ['itemId', 'value', 'parent']):
+                batch[column] = df[column].to_numpy()
+
+        level['batches'].append(batch)
+        level['rows'] = level['rows'] + len(df)
+        self.memory_used = self.memory_used + self._get_table_bytes(batch) + self.dictionary_bytes - dictionary_bytes
+        if (self.memory_budget is not None and self.memory_used > self.memory_budget):
+            self._spill()
+
+    def finish_level(self):
+        '''
+        Complete the level being built and add it to the tree.
+        '''
+        level = self._level
+        if (level['files'] is not None):
+            self._spill_batches(level)
+            level_table = {}
+            for column, (path, dtype) in level['files'].items():
+                if (level['rows'] > 0):
+                    level_table[column] = np.memmap(path, dtype = dtype, mode = 'r', shape = (level['rows'],))
+                else:
+                    level_table[column] = np.empty(0, dtype = dtype)
+        elif (len(level['batches']) > 0):
+            batches = level['batches']
+            level_table = {column: np.concatenate([batch[column] for batch in batches]) for column in batches[0]}
+        else:
+            level_table = {'code': np.empty(0, dtype = np.int64), 'parent': np.empty(0, dtype = np.int64)}
+
+        self.level_dictionaries.append(pd.DataFrame({'itemId': level['item_ids'], 'value': level['values']}))
+        self.levels.append(level_table)
+        self._level = None
+        self._update_memory_used()
+
+    def set_level_metrics(self, level, df_metrics):
+        '''
+        Replace the metrics of a level with df_metrics (one row per node, in node order).
+        '''
+        level_table = self.levels[level - 1]
+        new_table = {'code': level_table['code'], 'parent': level_table['parent']}
+        for column in df_metrics.columns:
+            new_table[column] = df_metrics[column].to_numpy()
+        self.levels[level - 1] = new_table
+        self._update_memory_used()
+
+    def get_level_size(self, level):
+        return len(self.levels[level - 1]['code'])
+
+    def get_item_path(self, level, row):
+        '''
+        Return the item IDs from the top level down to the node at the given level and row position.
+        '''
+        item_ids = []
+        for idx in reversed(range(level)):
+            level_table = self.levels[idx]
+            item_ids.append(self.level_dictionaries[idx]['itemId'].iat[int(level_table['code'][row])])
+            row = int(level_table['parent'][row])
+        item_ids.reverse()
+        return item_ids
+
+    def get_node_metrics(self, level, row):
+        '''
+        Return the metric values of the node at the given level and row position.
+        '''
+        level_table = self.levels[level - 1]
+        return np.array([level_table[column][row] for column in level_table if column not in ['code', 'parent']], dtype = np.float64)
+
+    def get_level_frames(self):
+        '''
+        Return every level as a data frame with the item ID path of the nodes (path, a tuple), itemId,
+        value and the metrics.
+        '''
+        frames = []
+        paths = None
+        for idx in range(len(self.levels)):
+            level_table = self.levels[idx]
+            codes = np.asarray(level_table['code'])
+            item_ids = self.level_dictionaries[idx]['itemId'].to_numpy()[codes]
+            if (paths is None):
+                level_paths = [(item_id,) for item_id in item_ids]
+            else:
+                level_paths = [paths[parent] + (item_id,) for parent, item_id in zip(np.asarray(level_table['parent']), item_ids)]
+
+            df = pd.DataFrame({'path': level_paths, 'itemId': item_ids, 'value': self.level_dictionaries[idx]['value'].to_numpy()[codes]})
+            for column in level_table:
+                if (column not in ['code', 'parent']):
+                    df[column] = np.array(level_table[column])
+            frames.append(df)
+            paths = level_paths
+        return frames
+
+    def assemble(self):
+        '''
+        Assemble the flat report from the leaf level.
+
+        The codes of every level are gathered through the parent pointers and decoded into
+        categorical itemId_lvl_* and value_lvl_* columns, followed by the leaf metrics.
+        Spilled levels are read from their files while gathering.
+        '''
+        leaf = self.levels[-1]
+        rows = np.arange(len(leaf['code']))
+        level_codes = [None] * len(self.levels)
+        for idx in reversed(range(len(self.levels))):
+            level_table = self.levels[idx]
+            level_codes[idx] = np.asarray(level_table['code'][rows])
+            rows = np.asarray(level_table['parent'][rows])
+
+        output = {}
+        for idx in range(len(self.levels)):
+            dictionary = self.level_dictionaries[idx]
+            codes = level_codes[idx]
+            value_codes, value_categories = pd.factorize(dictionary['value'])
+
+            output['itemId_lvl_{}'.format(idx + 1)] = pd.Categorical.from_codes(codes, categories = dictionary['itemId'])
+            output['value_lvl_{}'.format(idx + 1)] = pd.Categorical.from_codes(value_codes[codes], categories = value_categories)
+
+        for column in leaf:
+            if (column not in ['code', 'parent']):
+                output[column] = np.array(leaf[column])
+        return pd.DataFrame(output)
+
+    def close(self):
+        '''
+        Release the levels and delete the spill files.
+        '''
+        self.levels = []
+        self.level_dictionaries = []
+        self._level = None
+        self.memory_used = 0
+        self.dictionary_bytes = 0
+        if (self._spill_path is not None):
+            shutil.rmtree(self._spill_path, ignore_errors = True)
+            self._spill_path = None
+
+    @staticmethod
+    def _get_table_bytes(table):
+        return sum(array.nbytes for array in table.values() if not isinstance(array, np.memmap))
+
+    def _update_memory_used(self):
+        self.memory_used = self.dictionary_bytes + sum(self._get_table_bytes(level_table) for level_table in self.levels)
+        if (self._level is not None):
+            self.memory_used = self.memory_used + sum(self._get_table_bytes(batch) for batch in self._level['batches'])
+
+    def _spill(self):
+        '''
+        Write the batches of the level being built and the completed levels held in memory to spill files.
+        '''
+        self._spill_batches(self._level)
+        for idx in range(len(self.levels)):
+            if (self._get_table_bytes(self.levels[idx]) > 0):
+                level = {'batches': [self.levels[idx]], 'rows': len(self.levels[idx]['code']), 'files': None}
+                self._spill_batches(level)
+                self.levels[idx] = {column: np.memmap(path, dtype = dtype, mode = 'r', shape = (level['rows'],))
+                    for column, (path, dtype) in level['files'].items()}
+        self._update_memory_used()
+
+    def _spill_batches(self, level):
+        if (len(level['batches']) == 0):
+            return
+        if (level['files'] is None):
+            if (self._spill_path is None):
+                if (self.spill_directory is not None and not os.path.exists(self.spill_directory)):
+                    os.makedirs(self.spill_directory, exist_ok = True)
+                self._spill_path = tempfile.mkdtemp(prefix = 'breakdown_', dir = self.spill_directory)
+            level['files'] = {}
+            for column, array in level['batches'][0].items():
+                # Columns keep their dtype; other arrays (i.e. objects) are stored as floats
+                dtype = np.asarray(array).dtype
+                if (dtype.kind not in 'biuf'):
+                    dtype = np.dtype(np.float64)
+                path = os.path.join(self._spill_path, 'column_{}.bin'.format(self._spill_files))
+                self._spill_files = self._spill_files + 1
+                level['files'][column] = (path, dtype)
+
+        for batch in level['batches']:
+            for column, (path, dtype) in level['files'].items():
+                batch_dtype = np.asarray(batch[column]).dtype
+                if (batch_dtype.kind in 'biuf' and not np.can_cast(batch_dtype, dtype, casting = 'safe')):
+                    # Promote the column written so far, as np.concatenate does for the levels held in memory
+                    promoted_dtype = np.result_type(dtype, batch_dtype)
+                    np.fromfile(path, dtype = dtype).astype(promoted_dtype).tofile(path)
+                    dtype = promoted_dtype
+                    level['files'][column] = (path, dtype)
+                with open(path, 'ab') as fil:
+                    np.asarray(batch[column], dtype = dtype).tofile(fil)
+                self.spilled_bytes = self.spilled_bytes + batch[column].nbytes
+        level['batches'] = []
+
+
+def _format_page(data_json, metricNames):
+    '''
+    Convert a decoded report page into a data frame. See analytics_client.format_output().
+    '''
+    # Convert to DF to easily obtain the data column
+    df_response_data = pd.DataFrame(data_json['rows'])
+    # Convert metrics to DF into dedicated columns. Column header is the metric ID
+    if (data_json['totalPages'] > 0) and (df_response_data.shape != (0,0)):
+        metrics_column = df_response_data.data.tolist()
+        df_metrics_data = pd.DataFrame(metrics_column, index=df_response_data.index)
+    else:
+        
+        metrics_column = []
+        
+        idx = data_json['columns']['columnIds']
+        for i in idx:
+            metrics_column.append(0)
+        df_response_data = pd.DataFrame({'itemId': '0', 'value': 'Unspecified', 'data': metrics_column })
+        
+        metrics_column = [metrics_column]
+        df_metrics_data = pd.DataFrame(metrics_column)
+        
+    # Rename metrics' column headers into the metric name, based on the column ID of their position
+    columnIds = data_json['columns']['columnIds']
+    df_metrics_data.rename(columns=lambda x: metricNames[metricNames.index == '{}'.format(columnIds[x])].iloc[0][0], inplace=True)
+
+    return pd.merge(df_response_data, df_metrics_data, left_index=True, right_index=True).drop(columns=['data'])
+
+
+def _format_totals(data_json, metricNames):
+    '''
+    Convert the summaryData totals of a decoded report page into a single row data frame, with the metric names as columns.
+    Reports without results have no totals; their metrics are set to 0.
+    '''
+    totals = data_json.get('summaryData', {}).get('totals', [])
+    columnIds = data_json['columns']['columnIds']
+    if (len(totals) != len(columnIds)):
+        totals = [0] * len(columnIds)
+    names = [metricNames[metricNames.index == '{}'.format(columnId)].iloc[0][0] for columnId in columnIds]
+    return pd.DataFrame([totals], columns = names)
+
+
+def _format_page_stream(chunks, metricNames):
+    '''
+    Decode and format a report page from the chunks of a streamed response.
+
+    Returns
+    -------
+    tuple
+        The formatted page, the decoded response without the rows and the size of the response in bytes.
+    '''
+    json_obj, item_ids, values, data, response_bytes = read_report_stream(chunks)
+    if (json_obj['totalPages'] == 0 or len(item_ids) == 0):
+        return _format_page(dict(json_obj, rows = []), metricNames), json_obj, response_bytes
+
+    df = pd.DataFrame({'itemId': item_ids, 'value': values})
+    columnIds = json_obj['columns']['columnIds']
+    for idx in range(data.shape[1]):
+        df[metricNames[metricNames.index == '{}'.format(columnIds[idx])].iloc[0][0]] = data[:, idx]
+    return df, json_obj, response_bytes
+
+
+def _is_reused_response(response):
+    '''
+    Return whether a response was shared or reused by the request coalescer instead of being received
+    by the request. The latency of such responses is not recorded again.
+    '''
+    return getattr(response, 'reused', False)
+
+def _close_response(future):
+    '''
+    Close the response of a request that is no longer needed (i.e. the slower copy of a hedged request).
+    '''
+    if (not future.cancelled() and future.exception() is None):
+        future.result().close()
+
+def _completed_future(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def _parse_page_text(page_text, metricNames):
+    '''
+    Decode and format a raw report page. Used as the parse stage of the report_pipeline.
+    '''
+    return _format_page(json.loads(page_text), metricNames)
@@ -0,0 +1,337 @@
+import json
+import threading
+from datetime import datetime
+from collections import OrderedDict
+
+import pandas as pd
+
+from .adobe_rollup import get_item_dates
+
+
+class request_coalescer:
+    '''
+    Single-flight layer for Reports API requests.
+
+    Requests are identified by the endpoint and the canonical JSON of the report object. While a request
+    is in flight, identical requests wait for it and share its response instead of performing their own
+    HTTP call. Completed responses are kept and reused (up to max_entries and max_bytes), so a single
+    instance can be shared by several analytics_client objects for the duration of a run.
+
+    Parameters
+    ----------
+    reuse_results : bool - default: True
+        Keep completed responses and serve repeated requests from them. If False, only concurrent
+        (in-flight) requests are coalesced.
+
+    max_entries : int - default: 100
+        Maximum number of completed responses to keep. The least recently used entries are dropped first.
+        Pass None to remove the limit.
+
+    max_bytes : int - default: 256 MiB
+        Maximum size of the bodies of the completed responses kept (a page of 50000 rows is tens of MB).
+        The least recently used entries are dropped first; larger responses are not kept.
+        Pass None to remove the limit.
+    '''
+
+    def __init__(self, reuse_results = True, max_entries = 100, max_bytes = 256 * 1024 ** 2):
+        self.reuse_results = reuse_results
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stored_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._results = OrderedDict()
+
+    @staticmethod
+    def get_request_key(url, report_object):
+        '''
+        Canonical key of a request: the endpoint followed by the report object serialised with sorted keys.
+        '''
+        return '{}\n{}'.format(url, json.dumps(report_object, sort_keys = True, separators = (',', ':')))
+
+    def execute(self, key, request_function):
+        '''
+        Return the response for the key, performing request_function only if no identical
+        request is in flight or has already completed.
+        '''
+        with self._lock:
+            if (key in self._results):
+                self.hits = self.hits + 1
+                self._results.move_to_end(key)
+                return self._results[key][0]
+
+            flight = self._in_flight.get(key)
+            is_leader = flight is None
+            if (is_leader):
+                self.misses = self.misses + 1
+                flight = _flight()
+                self._in_flight[key] = flight
+            else:
+                self.shared = self.shared + 1
+
+        if (not is_leader):
+            flight.done.wait()
+            if (flight.error is not None):
+                raise flight.error
+            return flight.response
+
+        try:
+            flight.response = request_function()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+                if (flight.error is None and self.reuse_results):
+                    self._store(key, flight.response)
+            flight.done.set()
+
+        return flight.response
+
+    def _store(self, key, response):
+        # Reading the content also keeps the body of a streamed response for the next readers
+        size = len(response.content) if hasattr(response, 'content') else 0
+        if (self.max_bytes is not None and size > self.max_bytes):
+            return
+        self._results[key] = (response, size)
+        self.stored_bytes = self.stored_bytes + size
+        while ((self.max_entries is not None and len(self._results) > self.max_entries)
+                or (self.max_bytes is not None and self.stored_bytes > self.max_bytes)):
+            self.stored_bytes = self.stored_bytes - self._results.popitem(last = False)[1][1]
+
+    def clear(self):
+        '''
+        Drop all completed responses.
+        '''
+        with self._lock:
+            self._results.clear()
+            self.stored_bytes = 0
+
+
+class _flight:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class result_store:
+    '''
+    Completed reports, used to answer narrower reports without requests.
+
+    Reports are indexed by their shape (report suite, dimension, breakdown path, segments, search and settings),
+    date range and metrics. A report is answered from a stored report of the same shape when:
+    - its metrics are a subset of the stored metrics (column selection), and
+    - its date range is the stored date range, or, for the variables/daterangeday dimension, a sub-range
+      of whole days (rows filtered by date).
+    The page size does not change the result, so reports with a smaller limit are answered as well.
+    For variables/daterangeday, a date range that partially overlaps a stored one is answered from the
+    overlap, and only the days outside the stored range are requested.
+
+    Rows whose requested metrics are all zero are dropped after a column selection. Without dimensionSort,
+    rows are sorted by the first requested metric in descending order, as the API does.
+    Report objects with metric filters other than breakdowns, or metric settings such as a sort, are
+    always requested. The breakdown children of get_report_multiple_breakdowns() are requested and not
+    stored unless store_breakdowns is set, since they are rarely requested again and a large breakdown
+    would otherwise keep every child report in memory.
+
+    Parameters
+    ----------
+    max_entries : int - default: 100
+        Maximum number of stored reports. The least recently used reports are dropped first.
+        Pass None to remove the limit.
+
+    max_bytes : int - default: 256 MiB
+        Maximum memory used by the stored reports (data frame memory usage, including the item strings).
+        The least recently used reports are dropped first. Pass None to remove the limit.
+
+    store_breakdowns : bool - default: False
+        Also answer and store reports with breakdown metric filters.
+    '''
+
+    def __init__(self, max_entries = 100, max_bytes = 256 * 1024 ** 2, store_breakdowns = False):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.store_breakdowns = store_breakdowns
+        self.stored_bytes = 0
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def get_query(report_object):
+        '''
+        Return the shape key, date range (start and exclusive end) and metric IDs of a report object,
+        or None if the report object can not be answered from other reports.
+        '''
+        report_object = json.loads(json.dumps(report_object))
+        metric_container = report_object.pop('metricContainer', {})
+        breakdowns = []
+        for metric_filter in metric_container.get('metricFilters', []):
+            if (metric_filter.get('type') != 'breakdown'):
+                return None
+            breakdown = [metric_filter['dimension'], metric_filter['itemId']]
+            if (breakdown not in breakdowns):
+                breakdowns.append(breakdown)
+        metric_ids = []
+        for metric in metric_container.get('metrics', []):
+            if (len(set(metric.keys()) - set(['id', 'columnId', 'filters'])) > 0):
+                return None
+            metric_ids.append(metric['id'])
+
+        date_ranges = [report_filter['dateRange'] for report_filter in report_object.get('globalFilters', [])
+            if report_filter.get('type') == 'dateRange']
+        if (len(date_ranges) != 1 or len(metric_ids) == 0):
+            return None
+        report_object['globalFilters'] = [report_filter for report_filter in report_object['globalFilters']
+            if report_filter.get('type') != 'dateRange']
+        report_object.get('settings', {}).pop('page', None)
+        report_object.get('settings', {}).pop('limit', None)
+        report_object['breakdowns'] = breakdowns
+
+        start, end = [_parse_date(value) for value in date_ranges[0].split('/')]
+        return json.dumps(report_object, sort_keys = True), start, end, metric_ids
+
+    def get_report(self, client, report_object):
+        '''
+        Return the report of a report object, from the stored reports if possible.
+
+        Parameters
+        ----------
+        client : analytics_client
+            Client used to download the report or the missing days (client._download_report())
+
+        report_object : dict
+            Report object of the request
+        '''
+        query = self.get_query(report_object)
+        if (query is None or (not self.store_breakdowns and _is_breakdown(report_object))):
+            return client._download_report(json.loads(json.dumps(report_object)))
+        key, start, end, metric_ids = query
+        daily = report_object.get('dimension') == 'variables/daterangeday' and _is_whole_days(start, end)
+
+        with self._lock:
+            entries = list(self._entries.get(key, []))
+        entry = _find_entry(entries, start, end, metric_ids, daily)
+
+        if (entry is not None and entry['start'] <= start and end <= entry['end']):
+            with self._lock:
+                self.hits = self.hits + 1
+                self._entries.move_to_end(key)
+            return _select(entry, start, end, metric_ids, report_object, daily)
+
+        if (entry is None):
+            with self._lock:
+                self.misses = self.misses + 1
+            df = client._download_report(json.loads(json.dumps(report_object)))
+        else:
+            with self._lock:
+                self.partial_hits = self.partial_hits + 1
+            frames = [_select(entry, max(start, entry['start']), min(end, entry['end']), metric_ids, report_object, daily)]
+            for span_start, span_end in [(start, entry['start']), (entry['end'], end)]:
+                if (span_start < span_end):
+                    frames.append(client._download_report(_set_date_range(report_object, span_start, span_end)))
+            df = _sort_rows(_drop_empty(pd.concat(frames, ignore_index = True), metric_ids), report_object, metric_ids)
+
+        self._store(key, {'start': start, 'end': end, 'metrics': metric_ids, 'df': df})
+        return df.copy()
+
+    def _store(self, key, entry):
+        entry['bytes'] = int(entry['df'].memory_usage(deep = True).sum())
+        with self._lock:
+            self._entries.setdefault(key, []).append(entry)
+            self._entries.move_to_end(key)
+            self.stored_bytes = self.stored_bytes + entry['bytes']
+            while (len(self._entries) > 0 and self._is_full()):
+                oldest_key = next(iter(self._entries))
+                self.stored_bytes = self.stored_bytes - self._entries[oldest_key].pop(0)['bytes']
+                if (len(self._entries[oldest_key]) == 0):
+                    del self._entries[oldest_key]
+
+    def _is_full(self):
+        if (self.max_entries is not None and sum(len(entries) for entries in self._entries.values()) > self.max_entries):
+            return True
+        return self.max_bytes is not None and self.stored_bytes > self.max_bytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.stored_bytes = 0
+
+
+def _is_breakdown(report_object):
+    return any(metric_filter.get('type') == 'breakdown' for metric_filter in report_object.get('metricContainer', {}).get('metricFilters', []))
+
+
+def _parse_date(value):
+    return datetime.strptime(value[:19], '%Y-%m-%dT%H:%M:%S')
+
+
+def _is_whole_days(start, end):
+    return start.time() == datetime.min.time() and end.time() == datetime.min.time()
+
+
+def _find_entry(entries, start, end, metric_ids, daily):
+    '''
+    Return the stored report with the requested metrics that covers the date range, or for daily reports
+    the one that overlaps it most.
+    '''
+    best_entry = None
+    best_overlap = None
+    for entry in entries:
+        if (not set(metric_ids) <= set(entry['metrics'])):
+            continue
+        if (entry['start'] == start and entry['end'] == end):
+            return entry
+        if (not daily or not _is_whole_days(entry['start'], entry['end'])):
+            continue
+        overlap = min(end, entry['end']) - max(start, entry['start'])
+        if (overlap.total_seconds() > 0 and (best_overlap is None or overlap > best_overlap)):
+            best_entry, best_overlap = entry, overlap
+    return best_entry
+
+
+def _select(entry, start, end, metric_ids, report_object, daily):
+    df = entry['df']
+    if (daily and (start, end) != (entry['start'], entry['end'])):
+        df = df[df['itemId'] != '0']
+        dates = get_item_dates(df['itemId'])
+        df = df[((dates >= start) & (dates < end)).to_numpy()]
+    df = df[['itemId', 'value'] + metric_ids]
+    if (metric_ids != entry['metrics']):
+        df = _sort_rows(_drop_empty(df, metric_ids), report_object, metric_ids)
+    return df.reset_index(drop = True).copy()
+
+
+def _drop_empty(df, metric_ids):
+    df = df[(df[metric_ids] != 0).any(axis = 1)]
+    if (len(df) == 0):
+        # As returned by get_report() for reports without rows
+        return pd.DataFrame(dict([('itemId', ['0']), ('value', ['Unspecified'])] + [(metric_id, [0]) for metric_id in metric_ids]))
+    return df
+
+
+def _sort_rows(df, report_object, metric_ids):
+    dimension_sort = report_object.get('settings', {}).get('dimensionSort')
+    if (dimension_sort is not None and report_object.get('dimension') == 'variables/daterangeday' and not (df['itemId'] == '0').any()):
+        df = df.iloc[get_item_dates(df['itemId']).argsort(kind = 'mergesort').to_numpy()]
+        if (dimension_sort == 'desc'):
+            df = df.iloc[::-1]
+    elif (dimension_sort is None):
+        df = df.sort_values(metric_ids[0], ascending = False, kind = 'mergesort')
+    return df.reset_index(drop = True)
+
+
+def _set_date_range(report_object, start, end):
+    report_object = json.loads(json.dumps(report_object))
+    for report_filter in report_object['globalFilters']:
+        if (report_filter.get('type') == 'dateRange'):
+            report_filter['dateRange'] = '{}/{}'.format(start.strftime('%Y-%m-%dT%H:%M:%S'), end.strftime('%Y-%m-%dT%H:%M:%S'))
+    return report_object
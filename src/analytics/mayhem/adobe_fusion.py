@@ -0,0 +1,202 @@
+import copy
+import json
+import pandas as pd
+
+
+def plan_report_fusion(clients):
+    '''
+    Group compatible report specifications into fused requests.
+
+    Clients are compatible when they request the same endpoint, report suite, dimensions, date ranges,
+    search and settings; they may differ in their metrics and global segments. Segments shared by all clients of a
+    group stay global, while the remaining segments are applied per metric through metricContainer.metricFilters.
+    Identical (metric, segments) combinations are requested once.
+
+    Clients whose metrics already carry metric filters are planned on their own.
+
+    Parameters
+    ----------
+    clients : list of analytics_client
+        Configured clients. They are not modified.
+
+    Returns
+    -------
+    list of fused_report
+        One entry per request group, covering every client exactly once.
+    '''
+    groups = []
+    group_keys = {}
+    for idx in range(len(clients)):
+        fusion_key = _get_fusion_key(clients[idx])
+        if (fusion_key is None or fusion_key not in group_keys):
+            groups.append([idx])
+            if (fusion_key is not None):
+                group_keys[fusion_key] = len(groups) - 1
+        else:
+            groups[group_keys[fusion_key]].append(idx)
+
+    return [fused_report(clients, members) for members in groups]
+
+
+def get_fused_reports(clients):
+    '''
+    Download the reports of several clients with as few requests as possible.
+
+    The clients are fused using plan_report_fusion(). Each fused request is downloaded once with the
+    first client of its group (get_report() for single dimension reports, otherwise
+    get_report_multiple_breakdowns()) and the metric columns are split back per client.
+
+    Note: Rows where all the metrics of a client are zero are dropped, as the individual report would not
+    return them. Rows keep the order of the fused report.
+
+    Parameters
+    ----------
+    clients : list of analytics_client
+        Configured clients.
+
+    Returns
+    -------
+    list of Pandas data frames
+        The report of every client, in the same order as the clients.
+    '''
+    results = [None] * len(clients)
+    for plan in plan_report_fusion(clients):
+        for idx, df in plan.get_reports():
+            results[idx] = df
+    return results
+
+
+def _get_segments(report_object):
+    return [global_filter['segmentId'] for global_filter in report_object['globalFilters'] if global_filter.get('type') == 'segment']
+
+
+def _get_fusion_key(client):
+    report_object = client.report_object
+    for metric in report_object['metricContainer']['metrics']:
+        if ('filters' in metric):
+            return None
+
+    # Every report key except the metrics and the global segments must match (rsid, search, statistics, ...)
+    report_key = json.loads(json.dumps(report_object))
+    report_key.pop('metricContainer')
+    report_key['globalFilters'] = sorted(json.dumps(global_filter, sort_keys = True) for global_filter in report_object['globalFilters'] if global_filter.get('type') != 'segment')
+    report_key['settings'] = dict((key, value) for key, value in report_object.get('settings', {}).items() if key != 'page')
+    dimensions = list(client.dimensions) or [report_object['dimension']]
+    return json.dumps([client.analytics_url, dimensions, report_key], sort_keys = True)
+
+
+class fused_report:
+    '''
+    A fused request that serves the reports of several clients.
+
+    Attributes
+    ----------
+    members : list of int
+        Position of the served clients in the planned list.
+
+    client : analytics_client
+        Copy of the first member client, configured with the fused report object.
+
+    member_columns : dict
+        Per member, the positions of its metrics within the fused metric columns.
+    '''
+
+    def __init__(self, clients, members):
+        self.members = members
+        self.member_names = {}
+        self.member_columns = {}
+
+        template = clients[members[0]]
+        self.client = copy.copy(template)
+        self.client.report_object = copy.deepcopy(template.report_object)
+        self.client.dimensions = list(template.dimensions)
+
+        if (len(members) == 1):
+            metrics = template.report_object['metricContainer']['metrics']
+            self.member_names[members[0]] = [metric['id'] for metric in metrics]
+            self.member_columns[members[0]] = list(range(len(metrics)))
+            return
+
+        member_segments = dict((idx, _get_segments(clients[idx].report_object)) for idx in members)
+        common_segments = [segment for segment in member_segments[members[0]] if all(segment in member_segments[idx] for idx in members)]
+
+        report_object = self.client.report_object
+        report_object['globalFilters'] = [global_filter for global_filter in report_object['globalFilters'] 
+            if global_filter.get('type') != 'segment' or global_filter['segmentId'] in common_segments]
+
+        columns = {}
+        segment_filters = {}
+        fused_metrics = []
+        metric_filters = []
+        for idx in members:
+            metric_segments = [segment for segment in member_segments[idx] if segment not in common_segments]
+            self.member_names[idx] = []
+            self.member_columns[idx] = []
+            for metric in clients[idx].report_object['metricContainer']['metrics']:
+                column_key = (metric['id'], tuple(sorted(metric_segments)))
+                if (column_key not in columns):
+                    columns[column_key] = len(fused_metrics)
+                    fused_metric = copy.deepcopy(metric)
+                    fused_metric['columnId'] = '{}'.format(len(fused_metrics))
+                    if (len(metric_segments) > 0):
+                        fused_metric['filters'] = []
+                    for segment in sorted(metric_segments):
+                        if (segment not in segment_filters):
+                            segment_filters[segment] = '{}'.format(len(metric_filters))
+                            metric_filters.append({'id': segment_filters[segment], 'type': 'segment', 'segmentId': segment})
+                        fused_metric['filters'].append(segment_filters[segment])
+                    fused_metrics.append(fused_metric)
+
+                self.member_names[idx].append(metric['id'])
+                self.member_columns[idx].append(columns[column_key])
+
+        report_object['metricContainer']['metrics'] = fused_metrics
+        if (len(metric_filters) > 0):
+            report_object['metricContainer']['metricFilters'] = metric_filters
+        # Members may request the same metric under different segments: name the columns by columnId
+        self.client._get_metrics = self._get_column_names
+
+    def _get_column_names(self, report_object = None):
+        '''
+        Return the metric names of the fused client, as in analytics_client._get_metrics(), using the columnIds.
+        '''
+        if report_object is None:
+            report_object = self.client.report_object
+        index = [metric['columnId'] for metric in report_object['metricContainer']['metrics']]
+        return pd.DataFrame(index = index, data = index)
+
+    def get_reports(self):
+        '''
+        Download the fused report and split it per member.
+
+        Returns
+        -------
+        list of tuples
+            (member position, Pandas data frame) per member.
+        '''
+        if (len(self.client.dimensions) > 1):
+            df = self.client.get_report_multiple_breakdowns()
+            is_breakdown = True
+        else:
+            df = self.client.get_report()
+            is_breakdown = False
+        return [(idx, self.split(df, idx, is_breakdown)) for idx in self.members]
+
+    def split(self, df, member, is_breakdown = False):
+        '''
+        Select the columns of a member from the fused report and restore its metric names.
+        '''
+        if (len(self.members) == 1):
+            return df
+
+        offset = len(df.columns) - len(self.client.report_object['metricContainer']['metrics'])
+        # Fused metric columns are named by columnId
+        column_ids = ['{}'.format(column) for column in self.member_columns[member]]
+        df_member = df[list(df.columns[:offset]) + column_ids]
+        df_member.columns = list(df.columns[:offset]) + self.member_names[member]
+
+        df_member = df_member[(df_member.iloc[:, offset:] != 0).any(axis = 'columns')].reset_index(drop = True)
+        if (len(df_member) == 0 and not is_breakdown):
+            # Same output as format_output() for a report without results
+            df_member = pd.DataFrame([['0', 'Unspecified'] + [0] * len(self.member_names[member])], columns = df_member.columns)
+        return df_member
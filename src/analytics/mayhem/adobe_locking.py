@@ -0,0 +1,47 @@
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+@contextmanager
+def file_lock(path):
+    '''
+    Exclusive lock on a file, shared by all the processes of a host.
+
+    The lock file is created if it does not exist. On POSIX systems fcntl.flock is used, on Windows msvcrt.locking.
+
+    Parameters
+    ----------
+    path : string
+        Location of the lock file.
+    '''
+    directory = os.path.dirname(path)
+    if (directory and not os.path.exists(directory)):
+        os.makedirs(directory, exist_ok = True)
+
+    lock_file = open(path, 'a+')
+    try:
+        if (fcntl is not None):
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.05)
+        yield
+    finally:
+        if (fcntl is not None):
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        lock_file.close()
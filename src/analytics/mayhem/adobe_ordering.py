@@ -0,0 +1,185 @@
+import copy
+import json
+import itertools
+
+import numpy as np
+import pandas as pd
+
+
+def estimate_requests(cardinalities, limit = 50000, totals_only = False):
+    '''
+    Estimate the number of requests of a breakdown report from the number of items of its dimensions.
+
+    Every node of a level is broken down by the next dimension, so level k is requested once per
+    combination of the items of the previous levels, with one request per page of its items:
+    ceil(c1 / limit) + c1 * ceil(c2 / limit) + c1 * c2 * ceil(c3 / limit) + ...
+    Not every combination occurs, so this is an upper bound that is tight for the first levels.
+    With totals_only, the last dimension is requested once per parent path with a single page.
+
+    Parameters
+    ----------
+    cardinalities : list
+        Number of items of every dimension, in breakdown order
+
+    limit : int - default: 50000
+        Rows per page
+
+    totals_only : bool - default: False
+        See get_report_multiple_breakdowns()
+    '''
+    requests = 0
+    parents = 1
+    for idx in range(len(cardinalities)):
+        if (totals_only and idx == len(cardinalities) - 1):
+            pages = 1
+        else:
+            pages = max(1, -(-int(cardinalities[idx]) // int(limit)))
+        requests = requests + parents * pages
+        parents = parents * max(1, int(cardinalities[idx]))
+    return requests
+
+
+class breakdown_order_optimizer:
+    '''
+    Reorders the dimensions of breakdown reports to minimise the number of requests.
+
+    The number of requests of get_report_multiple_breakdowns() depends on the order of the dimensions: device
+    type (5 items) by channel (20 items) takes 1 + 5 requests, channel by device type 1 + 20. The optimizer
+    obtains the number of items of every dimension (totalElements of a request with the minimum page size,
+    for the date range and segments of the report), downloads the order with the fewest estimated requests
+    (see estimate_requests()) and returns the report with the columns of the requested order.
+
+    Rows are sorted by the levels in the requested order. Within a level, items keep the order in which the
+    API returned them. With totals_only, the last dimension is not moved.
+
+    Parameters
+    ----------
+    cardinalities : dict - optional
+        Known number of items per dimension, i.e. from previous runs. They take precedence over the
+        stats_catalog of the client (if configured). Other dimensions are requested.
+
+    max_permutations : int - default: 5040
+        Orders are compared exhaustively up to this number of permutations (7 dimensions), otherwise the
+        dimensions are sorted by their number of items.
+    '''
+
+    def __init__(self, cardinalities = None, max_permutations = 5040):
+        self.cardinalities = dict(cardinalities or {})
+        self.max_permutations = max_permutations
+        self.cache = {}
+        self.last_estimates = None
+
+    def get_cardinalities(self, client, dimensions):
+        '''
+        Return the number of items of every dimension for the report of the client.
+        '''
+        known = {}
+        if (client.stats_catalog is not None):
+            known = client.stats_catalog.get_cardinalities(client.report_object, dimensions)
+        known.update(self.cardinalities)
+        cardinalities = []
+        for dimension in dimensions:
+            if (dimension in known):
+                cardinalities.append(known[dimension])
+                continue
+            report_object = json.loads(json.dumps(client.report_object))
+            report_object['dimension'] = dimension
+            report_object.pop('search', None)
+            key = json.dumps(report_object, sort_keys = True)
+            if (key not in self.cache):
+                self.cache[key] = client._get_summary_page(report_object)['totalElements']
+            cardinalities.append(self.cache[key])
+        return cardinalities
+
+    def get_order(self, dimensions, cardinalities, limit = 50000, totals_only = False):
+        '''
+        Return the positions of the dimensions in the order with the fewest estimated requests.
+        '''
+        movable = len(dimensions) - 1 if totals_only else len(dimensions)
+        positions = list(range(movable))
+        fixed = list(range(movable, len(dimensions)))
+
+        number_of_permutations = 1
+        for count in range(2, movable + 1):
+            number_of_permutations = number_of_permutations * count
+        if (number_of_permutations > self.max_permutations):
+            # Fewer items first minimises the products of the leading levels
+            return sorted(positions, key = lambda position: cardinalities[position]) + fixed
+
+        best_order = None
+        best_requests = None
+        for order in itertools.permutations(positions):
+            order = list(order) + fixed
+            requests = estimate_requests([cardinalities[position] for position in order], limit, totals_only)
+            # Ties keep the requested order (first permutation)
+            if (best_requests is None or requests < best_requests):
+                best_order, best_requests = order, requests
+        return best_order
+
+    def get_report(self, client, totals_only = False):
+        '''
+        Download the breakdown report of the client in the optimal order of its dimensions.
+
+        Returns
+        -------
+        Pandas data frame
+            Same output as client.get_report_multiple_breakdowns() in the requested order.
+        '''
+        dimensions = list(client.dimensions)
+        if (client.limit_policy is not None):
+            limit = client.limit_policy.get_limit()
+        else:
+            limit = int(client.report_object.get('settings', {}).get('limit', 50000))
+        cardinalities = self.get_cardinalities(client, dimensions)
+        order = self.get_order(dimensions, cardinalities, limit, totals_only)
+
+        self.last_estimates = pd.DataFrame({
+            'order': ['requested', 'optimised'],
+            'dimensions': [dimensions, [dimensions[position] for position in order]],
+            'estimated_requests': [
+                estimate_requests(cardinalities, limit, totals_only),
+                estimate_requests([cardinalities[position] for position in order], limit, totals_only)
+            ]
+        })
+
+        client_copy = copy.copy(client)
+        client_copy.order_optimizer = None
+        if (order != list(range(len(dimensions)))):
+            client_copy.report_object = copy.deepcopy(client.report_object)
+            client_copy.dimensions = [dimensions[position] for position in order]
+            client_copy.report_object['dimension'] = client_copy.dimensions[0]
+        df = client_copy.get_report_multiple_breakdowns(totals_only)
+        return reorder_breakdown_levels(df, order)
+
+
+def reorder_breakdown_levels(df, order):
+    '''
+    Return the output of get_report_multiple_breakdowns() downloaded in a permuted dimension order with the
+    itemId_lvl_* and value_lvl_* columns of the requested order.
+
+    Parameters
+    ----------
+    df : Pandas data frame
+        Report downloaded with the dimensions in the order [dimensions[position] for position in order]
+
+    order : list
+        Positions of the requested dimensions in the downloaded order
+    '''
+    if (order == list(range(len(order)))):
+        return df
+    number_of_levels = len([column for column in df.columns if column.startswith('itemId_lvl_')])
+
+    output = {}
+    for position in range(number_of_levels):
+        level = order.index(position) + 1
+        output['itemId_lvl_{}'.format(position + 1)] = df['itemId_lvl_{}'.format(level)]
+        output['value_lvl_{}'.format(position + 1)] = df['value_lvl_{}'.format(level)]
+    for column in df.columns:
+        if ('_lvl_' not in column):
+            output[column] = df[column]
+    output = pd.DataFrame(output)
+
+    # Sort by the levels in the requested order; items keep the order of their categories
+    level_codes = [np.asarray(output['itemId_lvl_{}'.format(position + 1)].cat.codes) for position in range(number_of_levels)]
+    rows = np.lexsort(level_codes[::-1])
+    return output.iloc[rows].reset_index(drop = True)
@@ -0,0 +1,123 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+# First characters of the partitions by prefix. The search is not case sensitive.
+partition_characters = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def get_prefix_partitions(number_of_partitions = 8, characters = partition_characters):
+    '''
+    Return search clauses that split the values of a dimension into disjoint partitions by their first character.
+
+    The characters are divided into number_of_partitions - 1 groups of consecutive characters; the last
+    partition holds the values that do not start with any of the characters (i.e. punctuation, accents).
+
+    Parameters
+    ----------
+    number_of_partitions : int - default: 8
+        Number of search clauses, at least 2
+
+    characters : string - optional
+        First characters of the values, in the order they are grouped
+
+    Returns
+    -------
+    list
+        Search clauses, i.e. "( BEGINS-WITH 'a' ) OR ( BEGINS-WITH 'b' )"
+    '''
+    if (number_of_partitions < 2):
+        raise ValueError('At least 2 partitions are required', number_of_partitions)
+    groups = [group for group in np.array_split(list(characters), number_of_partitions - 1) if len(group) > 0]
+    clauses = [' OR '.join("( BEGINS-WITH '{}' )".format(character) for character in group) for group in groups]
+    clauses.append(' AND '.join("( NOT BEGINS-WITH '{}' )".format(character) for character in characters))
+    return clauses
+
+
+def get_partition_report_object(report_object, clause):
+    '''
+    Return a copy of the report object restricted to a search clause, combined with the existing search clause.
+    '''
+    report_object = json.loads(json.dumps(report_object))
+    search = report_object.get('search', {})
+    if (search.get('clause')):
+        clause = '( {} ) AND ( {} )'.format(search['clause'], clause)
+    search['clause'] = clause
+    report_object['search'] = search
+    return report_object
+
+
+def merge_partitions(frames, report_object):
+    '''
+    Concatenate the reports of the partitions in the sort order of the report object.
+
+    Partitions without results are returned by get_report() as a single 'Unspecified' row with zero metrics;
+    these rows are dropped, unless no partition has results: the report is then returned as get_report() does.
+    Rows are sorted by value (not case sensitive) if the report object sets dimensionSort, otherwise by
+    the first metric in descending order (as the API does).
+    '''
+    metric_columns = [column for column in frames[0].columns if column not in ['itemId', 'value']]
+    empty_report = frames[0]
+    frames = [df[~_is_empty_row(df, metric_columns)] for df in frames]
+    df = pd.concat(frames, ignore_index = True)
+    if (len(df) == 0):
+        return empty_report.reset_index(drop = True)
+
+    dimension_sort = report_object.get('settings', {}).get('dimensionSort')
+    if (dimension_sort is not None):
+        df = df.sort_values('value', ascending = dimension_sort == 'asc', kind = 'mergesort', key = lambda values: values.str.lower())
+    elif (len(metric_columns) > 0):
+        df = df.sort_values(metric_columns[0], ascending = False, kind = 'mergesort')
+    return df.reset_index(drop = True)
+
+
+def _is_empty_row(df, metric_columns):
+    return (df['itemId'] == '0') & (df[metric_columns] == 0).all(axis = 1)
+
+
+def is_count_metric(metric_id):
+    '''
+    Return whether the rows of a metric sum to at least its report total, i.e. visits or page views.
+    Rates, averages, time spent and calculated metrics are not counts.
+    '''
+    name = metric_id.split('/')[-1]
+    return not (metric_id.startswith('cm') or name.endswith('rate') or name.startswith('average') or name.startswith('timespent'))
+
+
+def check_partition_coverage(df, summary, tolerance = 1e-6):
+    '''
+    Verify that the merged partitions contain every item of the report exactly once.
+
+    The number of rows must match totalElements of the unpartitioned report and every item ID must occur
+    once. For count metrics (see is_count_metric()), the sum of the rows must reach the report totals:
+    a missing item lowers the sum, while items that share visits or visitors only raise it.
+
+    Parameters
+    ----------
+    df : Pandas data frame
+        Merged partitions
+
+    summary : dict
+        Decoded first page of the unpartitioned report (totalElements and summaryData)
+
+    Raises
+    ------
+    ValueError
+        If the partitions overlap or do not cover the report.
+    '''
+    metric_columns = [column for column in df.columns if column not in ['itemId', 'value']]
+    if (summary['totalElements'] == 0 and _is_empty_row(df, metric_columns).all()):
+        # Report without results (see merge_partitions())
+        return
+    duplicates = int(df['itemId'].duplicated().sum())
+    if (duplicates > 0):
+        raise ValueError('Partitions overlap: {} items were returned more than once'.format(duplicates))
+    if (len(df) != summary['totalElements']):
+        raise ValueError('Partitions do not cover the report: {} rows instead of {}'.format(len(df), summary['totalElements']))
+
+    totals = summary.get('summaryData', {}).get('totals', [])
+    for column, total in zip(metric_columns, totals):
+        if (is_count_metric(column) and df[column].sum() < total * (1 - tolerance)):
+            raise ValueError('Partitions do not cover the report: the rows of {} sum to {} instead of at least {}'.format(
+                column, df[column].sum(), total))
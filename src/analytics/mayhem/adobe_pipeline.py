@@ -0,0 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor
+
+
+class report_pipeline:
+    '''
+    Executors used to overlap downloading and parsing of report pages.
+
+    Once the first page of a report is downloaded, the remaining pages are fetched by the fetch workers
+    while earlier pages are parsed by the parse workers. At most queue_size page bodies are held between the
+    two stages per report, so fetching pauses when parsing falls behind. Breakdown children of
+    get_report_multiple_breakdowns() are downloaded concurrently by the breakdown workers.
+
+    With use_processes, pages are parsed in a process pool: the raw page text is sent to a worker process,
+    which decodes and formats it, and the formatted data frame is pickled back to the client. This keeps the
+    JSON decoding and pandas work off the GIL of the client process, at the cost of pickling every frame.
+
+    Parameters
+    ----------
+    fetch_workers : int - default: 4
+        Number of concurrent page downloads.
+
+    parse_workers : int - default: 2
+        Number of concurrent page parsers.
+
+    breakdown_workers : int - default: 4
+        Number of breakdown children downloaded concurrently.
+
+    use_processes : bool - default: False
+        Parse pages in a process pool instead of threads.
+
+    queue_size : int - default: 8
+        Maximum number of downloaded, not yet parsed pages per report.
+    '''
+
+    def __init__(self, fetch_workers = 4, parse_workers = 2, breakdown_workers = 4, use_processes = False, queue_size = 8):
+        self.queue_size = queue_size
+        self.breakdown_workers = breakdown_workers
+        self.fetch_executor = ThreadPoolExecutor(max_workers = fetch_workers)
+        self.breakdown_executor = ThreadPoolExecutor(max_workers = breakdown_workers)
+        if (use_processes):
+            self.parse_executor = ProcessPoolExecutor(max_workers = parse_workers)
+        else:
+            self.parse_executor = ThreadPoolExecutor(max_workers = parse_workers)
+
+    def shutdown(self):
+        self.breakdown_executor.shutdown()
+        self.fetch_executor.shutdown()
+        self.parse_executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
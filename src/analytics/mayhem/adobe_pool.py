@@ -0,0 +1,213 @@
+import time
+import threading
+from collections import OrderedDict
+from collections import deque
+
+import pandas as pd
+import requests
+
+from .adobe import analytics_client
+from .adobe_tokens import memory_token_store
+from .adobe_transport import requests_transport
+
+
+class client_pool:
+    '''
+    Analytics clients of several companies (tenants) in one process.
+
+    Every tenant is registered with its own credentials (adobe_org_id, account_id, client_id, ...). The clients
+    of all the tenants share one transport, so connections are pooled, and one token store, where the tokens
+    are kept per company. With a rate limiter, the request budget is kept per global company ID.
+
+    At most max_requests requests are in flight across all the tenants. When the cap is reached, the waiting
+    requests are admitted round-robin across tenants, so a tenant downloading a large report does not hold
+    back the others. get_metrics() returns the throughput of every tenant.
+
+    Parameters
+    ----------
+    max_requests : int - default: 8
+        Maximum number of concurrent requests across all the tenants
+
+    transport : object - optional
+        Shared transport. Default: requests_transport() over a requests.Session with max_requests connections
+
+    token_store : object - optional
+        Shared token store. Default: memory_token_store()
+
+    rate_limiter : shared_rate_limiter - optional
+        Rate limiter applied to the clients of all the tenants
+    '''
+
+    def __init__(self, max_requests = 8, transport = None, token_store = None, rate_limiter = None):
+        if (transport is None):
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections = max_requests, pool_maxsize = max_requests)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            transport = requests_transport(session)
+        self.max_requests = max_requests
+        self.transport = transport
+        self.token_store = token_store or memory_token_store()
+        self.rate_limiter = rate_limiter
+        self.tenants = {}
+        self.metrics = {}
+        self._slots = fair_semaphore(max_requests)
+        self._lock = threading.Lock()
+
+    def add_tenant(self, tenant, **credentials):
+        '''
+        Register the credentials of a tenant.
+
+        Parameters
+        ----------
+        tenant : string
+            Name of the tenant
+
+        credentials
+            Arguments of analytics_client, i.e. adobe_org_id, subject_account, client_id, client_secret,
+            account_id and private_key_location
+        '''
+        with self._lock:
+            self.tenants[tenant] = credentials
+            self.metrics.setdefault(tenant, _new_metrics())
+
+    def remove_tenant(self, tenant):
+        with self._lock:
+            self.tenants.pop(tenant)
+
+    def get_client(self, tenant):
+        '''
+        Return a new client of a tenant.
+
+        The clients of a tenant share its access token through the token store, so a new client per report
+        (or per thread) does not authenticate again.
+        '''
+        client = analytics_client(token_store = self.token_store, **self.tenants[tenant])
+        client.set_transport(_tenant_transport(self, tenant))
+        client.set_rate_limiter(self.rate_limiter)
+        return client
+
+    def _record(self, tenant, queued, started, finished, status_code = None, response_bytes = 0):
+        with self._lock:
+            metrics = self.metrics.setdefault(tenant, _new_metrics())
+            metrics['requests'] = metrics['requests'] + 1
+            if (status_code is None or status_code >= 400):
+                metrics['errors'] = metrics['errors'] + 1
+            if (status_code == 429):
+                metrics['throttled'] = metrics['throttled'] + 1
+            metrics['bytes'] = metrics['bytes'] + response_bytes
+            metrics['queue_seconds'] = metrics['queue_seconds'] + started - queued
+            metrics['request_seconds'] = metrics['request_seconds'] + finished - started
+            if (metrics['first_request'] is None):
+                metrics['first_request'] = queued
+            metrics['last_response'] = finished
+
+    def get_metrics(self):
+        '''
+        Return the request metrics per tenant.
+
+        Returns
+        -------
+        Pandas data frame
+            One row per tenant with the columns tenant, requests, errors, throttled (429 responses), bytes,
+            queue_seconds (waiting for the concurrency cap), request_seconds and requests_per_second
+            (between the first request and the last response of the tenant).
+        '''
+        rows = []
+        with self._lock:
+            for tenant, metrics in self.metrics.items():
+                row = dict((key, value) for key, value in metrics.items() if key not in ['first_request', 'last_response'])
+                elapsed = (metrics['last_response'] or 0) - (metrics['first_request'] or 0)
+                row['requests_per_second'] = metrics['requests'] / elapsed if elapsed > 0 else 0.0
+                rows.append(dict([('tenant', tenant)] + list(row.items())))
+        return pd.DataFrame(rows, columns = ['tenant', 'requests', 'errors', 'throttled', 'bytes', 'queue_seconds',
+            'request_seconds', 'requests_per_second'])
+
+    def close(self):
+        if (hasattr(self.transport, 'close')):
+            self.transport.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class fair_semaphore:
+    '''
+    Semaphore that hands released slots to the waiting tenants in turn.
+
+    Every tenant has a FIFO queue of waiting threads. A released slot is given to the first waiter of the
+    tenant that has waited longest for its turn; that tenant then moves to the end of the rotation.
+
+    Parameters
+    ----------
+    capacity : int
+        Number of slots
+    '''
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.active = 0
+        self.waiting = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, tenant):
+        with self._lock:
+            if (self.active < self.capacity and len(self.waiting) == 0):
+                self.active = self.active + 1
+                return
+            event = threading.Event()
+            self.waiting.setdefault(tenant, deque()).append(event)
+        event.wait()
+
+    def release(self):
+        with self._lock:
+            if (len(self.waiting) == 0):
+                self.active = self.active - 1
+                return
+            # The slot passes to the next tenant in the rotation
+            tenant, events = self.waiting.popitem(last = False)
+            event = events.popleft()
+            if (len(events) > 0):
+                self.waiting[tenant] = events
+        event.set()
+
+
+class _tenant_transport:
+    '''
+    Transport of the clients of a tenant: the shared transport of the pool, within the concurrency cap.
+    '''
+
+    def __init__(self, pool, tenant):
+        self.pool = pool
+        self.tenant = tenant
+
+    def post(self, url, headers, data, timeout, stream = False):
+        queued = time.time()
+        self.pool._slots.acquire(self.tenant)
+        started = time.time()
+        try:
+            if (stream):
+                response = self.pool.transport.post(url, headers, data, timeout, stream = True)
+            else:
+                response = self.pool.transport.post(url, headers, data, timeout)
+        except Exception:
+            self.pool._record(self.tenant, queued, started, time.time())
+            raise
+        finally:
+            self.pool._slots.release()
+
+        # The body of a streamed response is not read yet
+        if (stream):
+            response_bytes = int(response.headers.get('Content-Length', 0))
+        else:
+            response_bytes = len(response.content)
+        self.pool._record(self.tenant, queued, started, time.time(), response.status_code, response_bytes)
+        return response
+
+
+def _new_metrics():
+    return {'requests': 0, 'errors': 0, 'throttled': 0, 'bytes': 0, 'queue_seconds': 0.0, 'request_seconds': 0.0,
+        'first_request': None, 'last_response': None}
@@ -0,0 +1,135 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+
+default_parent_history_location = os.path.join(os.path.expanduser('~'), '.analytics_mayhem', 'parents')
+
+
+class parent_history:
+    '''
+    Parent item IDs of previous runs of breakdown reports, used for speculative prefetching.
+
+    The parent paths (item IDs from the top level down) of every breakdown level are stored in one JSON file
+    per report specification. The specification is the report object without its date range, page and limit,
+    together with the dimensions, so the daily runs of the same report share their history.
+
+    Parameters
+    ----------
+    directory : string - optional
+        Location of the JSON files. Default: ~/.analytics_mayhem/parents
+    '''
+
+    def __init__(self, directory = None):
+        self.directory = directory or default_parent_history_location
+        self.hits = 0
+        self.misses = 0
+        self.discarded = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_report_key(report_object, dimensions):
+        report_object = json.loads(json.dumps(report_object))
+        report_object['globalFilters'] = [report_filter for report_filter in report_object.get('globalFilters', [])
+            if report_filter.get('type') != 'dateRange']
+        # The page size can be tuned between runs
+        report_object.get('settings', {}).pop('page', None)
+        report_object.get('settings', {}).pop('limit', None)
+        spec = json.dumps({'report_object': report_object, 'dimensions': list(dimensions)}, sort_keys = True)
+        return hashlib.sha1(spec.encode('utf-8')).hexdigest()
+
+    def _get_path(self, key):
+        return os.path.join(self.directory, '{}.json'.format(key))
+
+    def get(self, key):
+        '''
+        Return the parent paths of the last run per parent level ({level: [path, ...]}), or an empty dict.
+        '''
+        path = self._get_path(key)
+        if (not os.path.exists(path)):
+            return {}
+        with open(path, 'r') as history_file:
+            return {int(level): paths for level, paths in json.load(history_file).items()}
+
+    def put(self, key, parent_paths):
+        if (not os.path.exists(self.directory)):
+            os.makedirs(self.directory, exist_ok = True)
+        file_descriptor, temp_path = tempfile.mkstemp(dir = self.directory)
+        with os.fdopen(file_descriptor, 'w') as history_file:
+            json.dump({str(level): paths for level, paths in parent_paths.items()}, history_file)
+        os.replace(temp_path, self._get_path(key))
+
+    def record(self, hits = 0, misses = 0, discarded = 0):
+        with self._lock:
+            self.hits = self.hits + hits
+            self.misses = self.misses + misses
+            self.discarded = self.discarded + discarded
+
+
+class speculative_prefetch:
+    '''
+    Breakdown nodes downloaded ahead of their parent level.
+
+    The children of the parent paths seen in the previous run are submitted to the executor before the
+    parent levels are downloaded. get() returns the prefetched result of a path, or downloads it if it was
+    not expected; finish() cancels the prefetched paths that were not requested.
+
+    Parameters
+    ----------
+    download : function
+        Called with the list of parent item IDs; returns the child rows.
+
+    executor : concurrent.futures.Executor
+        Executor of the prefetch downloads.
+
+    expected_paths : dict
+        Parent paths per parent level, as returned by parent_history.get().
+
+    cancel_queued : bool - default: False
+        Cancel prefetches that have not started when they are requested and download them in the caller.
+        Required when get() is called from workers of the same executor, which must not wait on queued tasks.
+    '''
+
+    def __init__(self, download, executor, expected_paths, cancel_queued = False):
+        self.download = download
+        self.executor = executor
+        self.expected_paths = expected_paths
+        self.cancel_queued = cancel_queued
+        self.hits = 0
+        self.misses = 0
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def start(self, max_parent_level):
+        for level in sorted(self.expected_paths):
+            if (level > max_parent_level):
+                continue
+            for path in self.expected_paths[level]:
+                self._futures[tuple(path)] = self.executor.submit(self.download, list(path))
+
+    def get(self, path):
+        with self._lock:
+            future = self._futures.pop(tuple(path), None)
+        if (future is None or (self.cancel_queued and future.cancel())):
+            with self._lock:
+                self.misses = self.misses + 1
+            return self.download(path)
+        try:
+            result = future.result()
+        except Exception:
+            result = self.download(path)
+        with self._lock:
+            self.hits = self.hits + 1
+        return result
+
+    def finish(self):
+        '''
+        Cancel the prefetched paths that were not requested. Returns their number.
+        '''
+        with self._lock:
+            futures = list(self._futures.values())
+            self._futures = {}
+        for future in futures:
+            future.cancel()
+        return len(futures)
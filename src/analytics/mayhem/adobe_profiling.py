@@ -0,0 +1,146 @@
+import time
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+
+# Per-thread CPU time (Python 3.7+); the process CPU time is used otherwise
+_thread_time = getattr(time, 'thread_time', time.process_time)
+
+
+class report_profiler:
+    '''
+    Wall time, CPU time and allocations per phase of the report downloads.
+
+    The client wraps its internal phases (authentication, rate limit wait, network, json_decode,
+    format_output, concat, assemble) and the breakdown levels (level_1, level_2, ...) in profiler phases.
+    Phases are nested per thread, so the statistics are kept per stack of phases, i.e. level_2;network.
+
+    Allocations are the net change of the memory traced by tracemalloc during the phase. Tracing is started
+    by start() if it is not already active. Concurrent phases (pipelined downloads) are all counted in full,
+    so their sum can exceed the elapsed time, and their allocations include those of the other threads.
+
+    Parameters
+    ----------
+    trace_allocations : bool - default: True
+        Trace allocations with tracemalloc. Tracing slows down the client.
+    '''
+
+    def __init__(self, trace_allocations = True):
+        self.trace_allocations = trace_allocations
+        # Stack of phase names -> [calls, wall time, CPU time, allocated bytes]
+        self.stacks = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._started_tracing = False
+
+    def start(self):
+        if (self.trace_allocations and not tracemalloc.is_tracing()):
+            tracemalloc.start()
+            self._started_tracing = True
+        return self
+
+    def stop(self):
+        if (self._started_tracing):
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @contextmanager
+    def phase(self, name):
+        '''
+        Context manager that records the enclosed block as a phase nested in the current phase of the thread.
+        '''
+        stack = getattr(self._local, 'stack', None)
+        if (stack is None):
+            stack = []
+            self._local.stack = stack
+        stack.append(name)
+        key = tuple(stack)
+
+        tracing = tracemalloc.is_tracing()
+        memory_start = tracemalloc.get_traced_memory()[0] if tracing else 0
+        cpu_start = _thread_time()
+        wall_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall_time = time.perf_counter() - wall_start
+            cpu_time = _thread_time() - cpu_start
+            allocated = tracemalloc.get_traced_memory()[0] - memory_start if tracing and tracemalloc.is_tracing() else 0
+            stack.pop()
+            with self._lock:
+                stats = self.stacks.setdefault(key, [0, 0.0, 0.0, 0])
+                stats[0] = stats[0] + 1
+                stats[1] = stats[1] + wall_time
+                stats[2] = stats[2] + cpu_time
+                stats[3] = stats[3] + allocated
+
+    def _get_self_wall_times(self):
+        '''
+        Return the wall time of every stack excluding the time of its nested phases.
+        '''
+        with self._lock:
+            stacks = {key: list(stats) for key, stats in self.stacks.items()}
+        self_times = {key: stats[1] for key, stats in stacks.items()}
+        for key, stats in stacks.items():
+            if (len(key) > 1 and key[:-1] in self_times):
+                self_times[key[:-1]] = self_times[key[:-1]] - stats[1]
+        return stacks, {key: max(value, 0.0) for key, value in self_times.items()}
+
+    def get_summary(self, by = 'stack'):
+        '''
+        Return the statistics as a data frame, sorted by wall time.
+
+        Parameters
+        ----------
+        by : string - default: 'stack'
+            'stack' for one row per stack of phases (i.e. level_2;network), 'phase' for one row per phase name.
+
+        Returns
+        -------
+        Pandas data frame
+            Columns phase, calls, wall_time, self_wall_time, cpu_time, allocated_bytes.
+        '''
+        stacks, self_times = self._get_self_wall_times()
+        rows = []
+        for key, stats in stacks.items():
+            phase = ';'.join(key) if by == 'stack' else key[-1]
+            rows.append([phase, stats[0], stats[1], self_times[key], stats[2], stats[3]])
+        columns = ['phase', 'calls', 'wall_time', 'self_wall_time', 'cpu_time', 'allocated_bytes']
+        df = pd.DataFrame(rows, columns = columns)
+        if (by == 'phase'):
+            df = df.groupby('phase', as_index = False, sort = False).sum()
+        return df.sort_values('wall_time', ascending = False, kind = 'stable').reset_index(drop = True)
+
+    def get_collapsed_stacks(self):
+        '''
+        Return the stacks in the collapsed format of flamegraph.pl (one "phase;phase microseconds" line per stack).
+        The value of a stack is its wall time excluding the nested phases.
+        '''
+        stacks, self_times = self._get_self_wall_times()
+        return '\n'.join('{} {}'.format(';'.join(key), int(round(self_times[key] * 1e6))) for key in sorted(stacks)) + '\n'
+
+    def write_collapsed_stacks(self, path):
+        with open(path, 'w') as fil:
+            fil.write(self.get_collapsed_stacks())
+
+
+@contextmanager
+def _no_phase():
+    yield
+
+
+def profile_phase(profiler, name):
+    '''
+    Return the context manager of a phase, or a no-op context manager if profiler is None.
+    '''
+    if (profiler is None):
+        return _no_phase()
+    return profiler.phase(name)
@@ -0,0 +1,243 @@
+import os
+import json
+import time
+import uuid
+import pickle
+import sqlite3
+from abc import ABC
+from abc import abstractmethod
+
+
+class work_unit:
+    '''
+    A single page of a breakdown report.
+
+    Attributes
+    ----------
+    unit_id : int
+        Unique ID of the unit within the queue
+
+    job_id : string
+        Breakdown job the unit belongs to
+
+    path : list
+        Item IDs of the parent nodes, from the top-level dimension down. Empty for the top level.
+
+    page : int
+        Page number of the report
+
+    lease_token : string
+        Token of the current lease. Only the holder of the lease can complete the unit.
+    '''
+
+    def __init__(self, unit_id, job_id, path, page, lease_token = None):
+        self.unit_id = unit_id
+        self.job_id = job_id
+        self.path = path
+        self.page = page
+        self.lease_token = lease_token
+
+
+class work_queue(ABC):
+    '''
+    Interface of a durable queue of breakdown work units.
+
+    A job is a report specification (report object and dimensions). It is split into work units (parent
+    item ID path and page) that are claimed by workers with a lease. A worker completes a unit by writing
+    its partial result together with the units it discovered (next pages and children) in one step.
+    Units whose lease expires are handed out again.
+
+    sqlite_work_queue implements the interface for the processes of a single host. A network broker can
+    implement the same methods to distribute the units across machines. Subclasses that do not implement
+    all the abstract methods cannot be instantiated.
+    '''
+
+    @abstractmethod
+    def add_job(self, spec):
+        '''
+        Store a job specification and its first unit (top level, page 0). Returns the job ID.
+        '''
+
+    @abstractmethod
+    def get_job(self, job_id):
+        '''
+        Return the specification of a job.
+        '''
+
+    @abstractmethod
+    def claim(self, job_id = None, lease_seconds = 600):
+        '''
+        Lease the next available unit (optionally of a single job). Returns a work_unit or None.
+        '''
+
+    @abstractmethod
+    def complete(self, unit, result, new_units):
+        '''
+        Store the result of a leased unit and add the new (path, page) units.
+        Returns False if the lease was lost, in which case nothing is stored.
+        '''
+
+    @abstractmethod
+    def fail(self, unit):
+        '''
+        Release a leased unit so that it can be claimed again.
+        '''
+
+    @abstractmethod
+    def get_results(self, job_id):
+        '''
+        Return the (path, page, result) of all the completed units of a job.
+        '''
+
+    @abstractmethod
+    def get_job_status(self, job_id):
+        '''
+        Return the number of units per state (pending, leased, done, failed).
+        '''
+
+    def is_job_done(self, job_id):
+        status = self.get_job_status(job_id)
+        return status.get('pending', 0) == 0 and status.get('leased', 0) == 0
+
+
+class sqlite_work_queue(work_queue):
+    '''
+    Work queue stored in a SQLite database, shared by the processes of a host.
+
+    Results are stored as pickled data frames.
+
+    Parameters
+    ----------
+    path : string
+        Location of the database.
+
+    max_attempts : int - default: 5
+        Number of claims after which a failing unit is marked as failed.
+    '''
+
+    def __init__(self, path, max_attempts = 5):
+        self.path = path
+        self.max_attempts = max_attempts
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if (not os.path.exists(directory)):
+            os.makedirs(directory, exist_ok = True)
+        connection = self._connect()
+        try:
+            connection.executescript('''
+                CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, spec TEXT NOT NULL, created_at REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS units (
+                    unit_id INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT NOT NULL, path TEXT NOT NULL, page INTEGER NOT NULL,
+                    state TEXT NOT NULL, lease_token TEXT, lease_expires REAL, attempts INTEGER NOT NULL DEFAULT 0,
+                    UNIQUE (job_id, path, page));
+                CREATE INDEX IF NOT EXISTS units_state ON units (state, job_id);
+                CREATE TABLE IF NOT EXISTS results (unit_id INTEGER PRIMARY KEY, job_id TEXT NOT NULL, path TEXT NOT NULL, page INTEGER NOT NULL, result BLOB NOT NULL);
+                CREATE INDEX IF NOT EXISTS results_job ON results (job_id);
+            ''')
+        finally:
+            connection.close()
+
+    def _connect(self):
+        # Transactions are managed explicitly with BEGIN IMMEDIATE
+        return sqlite3.connect(self.path, timeout = 60, isolation_level = None)
+
+    def _transaction(self, function):
+        connection = self._connect()
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            result = function(connection)
+            connection.execute('COMMIT')
+            return result
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _insert_units(connection, job_id, units):
+        connection.executemany('INSERT OR IGNORE INTO units (job_id, path, page, state) VALUES (?, ?, ?, ?)',
+            [(job_id, json.dumps(path), page, 'pending') for path, page in units])
+
+    def add_job(self, spec):
+        job_id = uuid.uuid4().hex
+
+        def add(connection):
+            connection.execute('INSERT INTO jobs (job_id, spec, created_at) VALUES (?, ?, ?)', (job_id, json.dumps(spec), time.time()))
+            self._insert_units(connection, job_id, [([], 0)])
+
+        self._transaction(add)
+        return job_id
+
+    def get_job(self, job_id):
+        connection = self._connect()
+        try:
+            row = connection.execute('SELECT spec FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        finally:
+            connection.close()
+        return json.loads(row[0]) if row is not None else None
+
+    def claim(self, job_id = None, lease_seconds = 600):
+        lease_token = uuid.uuid4().hex
+
+        def claim_unit(connection):
+            now = time.time()
+            query = '''SELECT unit_id, job_id, path, page, attempts FROM units
+                WHERE (state = 'pending' OR (state = 'leased' AND lease_expires < ?))'''
+            parameters = [now]
+            if (job_id is not None):
+                query = query + ' AND job_id = ?'
+                parameters.append(job_id)
+            rows = connection.execute(query + ' ORDER BY unit_id LIMIT 1', parameters).fetchall()
+            if (len(rows) == 0):
+                return None
+
+            unit_id, unit_job_id, path, page, attempts = rows[0]
+            if (attempts >= self.max_attempts):
+                connection.execute("UPDATE units SET state = 'failed', lease_token = NULL WHERE unit_id = ?", (unit_id,))
+                return False
+            connection.execute("UPDATE units SET state = 'leased', lease_token = ?, lease_expires = ?, attempts = attempts + 1 WHERE unit_id = ?",
+                (lease_token, now + lease_seconds, unit_id))
+            return work_unit(unit_id, unit_job_id, json.loads(path), page, lease_token)
+
+        unit = self._transaction(claim_unit)
+        while (unit is False):
+            # The unit ran out of attempts; try the next one
+            unit = self._transaction(claim_unit)
+        return unit
+
+    def complete(self, unit, result, new_units):
+        def complete_unit(connection):
+            row = connection.execute('SELECT state, lease_token FROM units WHERE unit_id = ?', (unit.unit_id,)).fetchone()
+            if (row is None or row[0] != 'leased' or row[1] != unit.lease_token):
+                return False
+            connection.execute('INSERT OR REPLACE INTO results (unit_id, job_id, path, page, result) VALUES (?, ?, ?, ?, ?)',
+                (unit.unit_id, unit.job_id, json.dumps(unit.path), unit.page, sqlite3.Binary(pickle.dumps(result))))
+            self._insert_units(connection, unit.job_id, new_units)
+            connection.execute("UPDATE units SET state = 'done', lease_token = NULL WHERE unit_id = ?", (unit.unit_id,))
+            return True
+
+        return self._transaction(complete_unit)
+
+    def fail(self, unit):
+        def release_unit(connection):
+            connection.execute("UPDATE units SET state = 'pending', lease_token = NULL, lease_expires = NULL WHERE unit_id = ? AND lease_token = ?",
+                (unit.unit_id, unit.lease_token))
+
+        self._transaction(release_unit)
+
+    def get_results(self, job_id):
+        connection = self._connect()
+        try:
+            rows = connection.execute('SELECT path, page, result FROM results WHERE job_id = ? ORDER BY unit_id', (job_id,)).fetchall()
+        finally:
+            connection.close()
+        return [(json.loads(path), page, pickle.loads(result)) for path, page, result in rows]
+
+    def get_job_status(self, job_id):
+        connection = self._connect()
+        try:
+            rows = connection.execute('SELECT state, COUNT(*) FROM units WHERE job_id = ? GROUP BY state', (job_id,)).fetchall()
+        finally:
+            connection.close()
+        return dict(rows)
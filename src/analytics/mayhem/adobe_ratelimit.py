@@ -0,0 +1,139 @@
+import os
+import time
+import sqlite3
+
+default_rate_limiter_location = os.path.join(os.path.expanduser('~'), '.analytics_mayhem', 'rate_limits.sqlite')
+
+
+class shared_rate_limiter:
+    '''
+    Token bucket rate limiter shared by all the processes of a host through a SQLite database.
+
+    Every client consults the limiter before sending a request. The bucket of a key (the global company ID,
+    as Adobe enforces the quota per company) is refilled at the current rate up to burst requests.
+    The rate adapts to the responses: a 429 response cuts the rate by decrease_factor and pauses all
+    processes for one request interval, while successful responses raise it again by increase_step up to
+    the configured rate. The aggregate request rate therefore settles just under the limit.
+
+    Parameters
+    ----------
+    path : string - optional
+        Location of the database. Default: ~/.analytics_mayhem/rate_limits.sqlite
+
+    rate : float - default: 2
+        Maximum requests per second per key.
+
+    burst : int - default: 12
+        Maximum number of requests that can be sent back to back.
+
+    min_rate : float - default: 0.1
+        Lower bound of the adapted rate.
+
+    decrease_factor : float - default: 0.5
+        Rate multiplier applied on a 429 response.
+
+    increase_step : float - default: 0.05
+        Rate increase (requests per second) applied on a successful response.
+    '''
+
+    def __init__(self, path = None, rate = 2.0, burst = 12, min_rate = 0.1, decrease_factor = 0.5, increase_step = 0.05):
+        self.path = path or default_rate_limiter_location
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.decrease_factor = decrease_factor
+        self.increase_step = increase_step
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if (not os.path.exists(directory)):
+            os.makedirs(directory, exist_ok = True)
+        connection = self._connect()
+        try:
+            connection.execute('''CREATE TABLE IF NOT EXISTS buckets (
+                key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, rate REAL NOT NULL, blocked_until REAL NOT NULL)''')
+        finally:
+            connection.close()
+
+    def _connect(self):
+        # Transactions are managed explicitly with BEGIN IMMEDIATE
+        return sqlite3.connect(self.path, timeout = 30, isolation_level = None)
+
+    def _update(self, key, update_function):
+        '''
+        Apply update_function(tokens, rate, blocked_until, now) to the refilled bucket of a key in a single
+        write transaction. The function returns the new (tokens, rate, blocked_until) and a result.
+        '''
+        connection = self._connect()
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            now = time.time()
+            row = connection.execute('SELECT tokens, updated_at, rate, blocked_until FROM buckets WHERE key = ?', (key,)).fetchone()
+            if (row is None):
+                tokens, rate, blocked_until = float(self.burst), self.rate, 0.0
+            else:
+                tokens, updated_at, rate, blocked_until = row
+                tokens = min(float(self.burst), tokens + max(0.0, now - updated_at) * rate)
+
+            tokens, rate, blocked_until, result = update_function(tokens, rate, blocked_until, now)
+            connection.execute('INSERT OR REPLACE INTO buckets (key, tokens, updated_at, rate, blocked_until) VALUES (?, ?, ?, ?, ?)',
+                (key, tokens, now, rate, blocked_until))
+            connection.execute('COMMIT')
+            return result
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        finally:
+            connection.close()
+
+    def try_acquire(self, key = 'default'):
+        '''
+        Take one request from the bucket if available.
+
+        Returns
+        -------
+        float
+            0 if the request can be sent, otherwise the number of seconds to wait before trying again.
+        '''
+        def take(tokens, rate, blocked_until, now):
+            if (now < blocked_until):
+                return tokens, rate, blocked_until, blocked_until - now
+            if (tokens >= 1):
+                return tokens - 1, rate, blocked_until, 0.0
+            return tokens, rate, blocked_until, (1 - tokens) / rate
+
+        return self._update(key, take)
+
+    def acquire(self, key = 'default'):
+        '''
+        Block until a request can be sent for the key.
+
+        Returns
+        -------
+        float
+            Seconds spent waiting.
+        '''
+        waited = 0.0
+        wait = self.try_acquire(key)
+        while (wait > 0):
+            time.sleep(wait)
+            waited = waited + wait
+            wait = self.try_acquire(key)
+        return waited
+
+    def record_response(self, key, status_code):
+        '''
+        Adapt the rate of the key based on the response status code.
+        '''
+        def adapt(tokens, rate, blocked_until, now):
+            if (status_code == 429):
+                rate = max(self.min_rate, rate * self.decrease_factor)
+                return 0.0, rate, max(blocked_until, now + 1 / rate), None
+            return tokens, min(self.rate, rate + self.increase_step), blocked_until, None
+
+        self._update(key, adapt)
+
+    def get_rate(self, key = 'default'):
+        '''
+        Return the current (adapted) rate of a key in requests per second.
+        '''
+        return self._update(key, lambda tokens, rate, blocked_until, now: (tokens, rate, blocked_until, rate))
@@ -0,0 +1,148 @@
+import os
+import pickle
+import tempfile
+import threading
+from datetime import datetime
+
+import numpy as np
+
+default_breakdown_store_location = os.path.join(os.path.expanduser('~'), '.analytics_mayhem', 'breakdowns')
+
+
+class breakdown_store:
+    '''
+    Results of previous breakdown reports, used to refresh them incrementally.
+
+    Every level of a report is stored as a data frame with the item ID path of the nodes (path), itemId,
+    value and the metrics, in one pickle file per report specification (see parent_history.get_report_key()),
+    together with the date range of the report. The stored levels are only returned for a date range that
+    starts at the same time and contains the stored one (see is_refresh_of()).
+
+    Parameters
+    ----------
+    directory : string - optional
+        Location of the files. Default: ~/.analytics_mayhem/breakdowns
+    '''
+
+    def __init__(self, directory = None):
+        self.directory = directory or default_breakdown_store_location
+        self.reused = 0
+        self.downloaded = 0
+        self._lock = threading.Lock()
+
+    def _get_path(self, key):
+        return os.path.join(self.directory, '{}.pickle'.format(key))
+
+    def get(self, key, date_range = None):
+        '''
+        Return the stored levels of a report, or an empty list if there are none for the date range
+        (start and end, see get_date_range()).
+        '''
+        path = self._get_path(key)
+        if (not os.path.exists(path)):
+            return []
+        with open(path, 'rb') as store_file:
+            stored = pickle.load(store_file)
+        if (not isinstance(stored, dict) or not is_refresh_of(date_range, stored['date_range'])):
+            return []
+        return stored['levels']
+
+    def put(self, key, levels, date_range = None):
+        if (not os.path.exists(self.directory)):
+            os.makedirs(self.directory, exist_ok = True)
+        file_descriptor, temp_path = tempfile.mkstemp(dir = self.directory)
+        with os.fdopen(file_descriptor, 'wb') as store_file:
+            pickle.dump({'date_range': date_range, 'levels': levels}, store_file)
+        os.replace(temp_path, self._get_path(key))
+
+    def record(self, reused = 0, downloaded = 0):
+        with self._lock:
+            self.reused = self.reused + reused
+            self.downloaded = self.downloaded + downloaded
+
+
+def get_date_range(report_object):
+    '''
+    Return the start and end of the date range of a report object (the intersection of its date range
+    filters), or None if it has none.
+    '''
+    date_ranges = [[datetime.strptime(value[:19], '%Y-%m-%dT%H:%M:%S') for value in report_filter['dateRange'].split('/')]
+        for report_filter in report_object.get('globalFilters', []) if report_filter.get('type') == 'dateRange']
+    if (len(date_ranges) == 0):
+        return None
+    return (max(start for start, end in date_ranges), min(end for start, end in date_ranges))
+
+
+def is_refresh_of(date_range, stored_date_range):
+    '''
+    Return whether a report over date_range can reuse the subtrees of a report over stored_date_range:
+    the same range (i.e. a reprocessed period), or a range that starts at the same time and extends it.
+    The metrics of a parent over another period say nothing about its children.
+    '''
+    if (date_range is None or stored_date_range is None):
+        return date_range == stored_date_range
+    return date_range[0] == stored_date_range[0] and date_range[1] >= stored_date_range[1]
+
+
+class breakdown_refresh:
+    '''
+    Reuse of the children of unchanged parents from a stored breakdown report.
+
+    The children of a parent are taken from the stored report when the parent path was stored with the same
+    metrics; otherwise they are downloaded. As the reused children have their stored metrics, the subtrees
+    below unchanged parents are reused entirely.
+
+    Parameters
+    ----------
+    levels : list
+        Stored levels, as returned by breakdown_store.get()
+    '''
+
+    def __init__(self, levels):
+        self.metric_columns = []
+        # Per level: node path -> metrics
+        self.node_metrics = []
+        # Per level: parent path -> child rows
+        self.children = []
+        self.reused = 0
+        self.downloaded = 0
+        self._lock = threading.Lock()
+
+        for df in levels:
+            self.metric_columns = [column for column in df.columns if column not in ['path', 'itemId', 'value']]
+            metrics = df[self.metric_columns].to_numpy()
+            self.node_metrics.append(dict(zip(df['path'], metrics)))
+
+            parent_paths = [path[:-1] for path in df['path']]
+            rows = df.drop(columns = ['path']).reset_index(drop = True)
+            groups = {}
+            for position in range(len(parent_paths)):
+                groups.setdefault(parent_paths[position], []).append(position)
+            self.children.append(dict((parent_path, rows.iloc[positions]) for parent_path, positions in groups.items()))
+
+    def get_children(self, level, parent_path, parent_metrics):
+        '''
+        Return the stored children of a parent at the given level if the parent is unchanged, otherwise None.
+        '''
+        if (level > len(self.children)):
+            return None
+        stored_metrics = self.node_metrics[level - 2].get(tuple(parent_path))
+        if (stored_metrics is None or len(stored_metrics) != len(parent_metrics)):
+            return None
+        if (not np.array_equal(np.asarray(stored_metrics, dtype = np.float64), np.asarray(parent_metrics, dtype = np.float64))):
+            return None
+        return self.children[level - 1].get(tuple(parent_path))
+
+    def get_node(self, tree, parent_level, parent, download):
+        '''
+        Return the children of a node of the tree from the store, or download(tree, parent_level, parent).
+        '''
+        parent_path = tree.get_item_path(parent_level, parent)
+        children = self.get_children(parent_level + 1, parent_path, tree.get_node_metrics(parent_level, parent))
+        if (children is None):
+            with self._lock:
+                self.downloaded = self.downloaded + 1
+            return download(tree, parent_level, parent)
+        with self._lock:
+            self.reused = self.reused + 1
+        return children.reset_index(drop = True)
@@ -0,0 +1,208 @@
+import json
+import gzip
+import time
+import threading
+from http.server import BaseHTTPRequestHandler
+from http.server import HTTPServer
+from socketserver import ThreadingMixIn
+
+import requests
+
+from .adobe_transport import requests_transport
+
+
+def get_replay_key(request_data):
+    '''
+    Key of a recorded request: the report object serialised with sorted keys.
+    '''
+    try:
+        return json.dumps(json.loads(request_data), sort_keys = True, separators = (',', ':'))
+    except ValueError:
+        return request_data
+
+
+class recording_transport:
+    '''
+    Transport that records the report requests of another transport into an archive.
+
+    Every request is appended to a gzip-compressed JSON lines file with its report object, the status code
+    and body of the response (including 429 and other errors), the time it started (relative to the first
+    request) and its duration. Timeouts and connection errors are recorded with the name of the error.
+    Request headers are not recorded, as they contain the access token.
+
+    Parameters
+    ----------
+    path : string
+        Location of the archive (i.e. breakdown_job.jsonl.gz)
+
+    transport : object - optional
+        Transport performing the requests. Default: requests_transport()
+    '''
+
+    def __init__(self, path, transport = None):
+        self.path = path
+        self.transport = transport or requests_transport()
+        self.requests = 0
+        self._start_time = None
+        self._lock = threading.Lock()
+        self._file = gzip.open(path, 'at', encoding = 'utf-8')
+
+    def post(self, url, headers, data, timeout, stream = False):
+        start_time = time.time()
+        with self._lock:
+            if (self._start_time is None):
+                self._start_time = start_time
+        entry = {'url': url, 'request': data, 'started': start_time - self._start_time}
+        try:
+            if (stream):
+                response = self.transport.post(url, headers, data, timeout, stream = True)
+            else:
+                response = self.transport.post(url, headers, data, timeout)
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as error:
+            entry.update({'error': type(error).__name__, 'elapsed': time.time() - start_time})
+            self._write(entry)
+            raise
+
+        entry.update({
+            'status': response.status_code,
+            'content_type': response.headers.get('Content-Type', 'application/json'),
+            # Reading the body of a streamed response keeps it available to the caller
+            'response': response.content.decode('utf-8'),
+            'elapsed': time.time() - start_time
+        })
+        self._write(entry)
+        return response
+
+    def _write(self, entry):
+        with self._lock:
+            self._file.write(json.dumps(entry) + '\n')
+            self._file.flush()
+            self.requests = self.requests + 1
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+        if (hasattr(self.transport, 'close')):
+            self.transport.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def read_archive(path):
+    '''
+    Return the recorded entries of an archive, in recorded order.
+    '''
+    with gzip.open(path, 'rt', encoding = 'utf-8') as archive:
+        return [json.loads(line) for line in archive if line.strip()]
+
+
+class replay_server:
+    '''
+    Local HTTP server replaying a recorded archive.
+
+    Requests are matched to the recorded ones by their report object. Identical requests receive the
+    recorded responses in their recorded order (i.e. a 429 followed by the successful retry); once they are
+    exhausted, the last response is repeated. Responses are delayed by the recorded duration multiplied
+    by latency_scale. Recorded timeouts and connection errors close the connection without a response.
+    Requests that were not recorded receive a 404.
+
+    Point a client to the server with client.analytics_url = server.url. The server does not check the
+    authorization headers.
+
+    Parameters
+    ----------
+    path : string
+        Location of the archive
+
+    latency_scale : float - default: 1.0
+        Factor applied to the recorded durations (0 to respond immediately)
+
+    host, port : string, int - default: '127.0.0.1', 0
+        Address of the server. Port 0 selects a free port.
+    '''
+
+    def __init__(self, path, latency_scale = 1.0, host = '127.0.0.1', port = 0):
+        self.latency_scale = latency_scale
+        self.entries = {}
+        for entry in read_archive(path):
+            self.entries.setdefault(get_replay_key(entry['request']), []).append(entry)
+        self.positions = {}
+        self.requests = 0
+        self.unmatched = 0
+        self._lock = threading.Lock()
+        self._server = _replay_http_server((host, port), _replay_handler, self)
+        self._thread = None
+
+    @property
+    def url(self):
+        return 'http://{}:{}/'.format(*self._server.server_address[:2])
+
+    def get_entry(self, request_data):
+        key = get_replay_key(request_data)
+        with self._lock:
+            self.requests = self.requests + 1
+            entries = self.entries.get(key)
+            if (entries is None):
+                self.unmatched = self.unmatched + 1
+                return None
+            position = self.positions.get(key, 0)
+            self.positions[key] = position + 1
+            return entries[min(position, len(entries) - 1)]
+
+    def start(self):
+        self._thread = threading.Thread(target = self._server.serve_forever, daemon = True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+class _replay_http_server(ThreadingMixIn, HTTPServer):
+    # http.server.ThreadingHTTPServer requires Python 3.7
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, address, handler, replay):
+        self.replay = replay
+        super().__init__(address, handler)
+
+
+class _replay_handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        request_data = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+        replay = self.server.replay
+        entry = replay.get_entry(request_data)
+        if (entry is None):
+            self._respond(404, 'application/json', json.dumps({'error': 'Request not found in the archive'}))
+            return
+
+        time.sleep(entry.get('elapsed', 0) * replay.latency_scale)
+        if ('error' in entry):
+            self.close_connection = True
+            return
+        self._respond(entry['status'], entry.get('content_type', 'application/json'), entry['response'])
+
+    def _respond(self, status, content_type, body):
+        body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,170 @@
+import time
+import random
+import threading
+from collections import deque
+
+import numpy as np
+
+
+class retry_policy:
+    '''
+    Retries and hedging of report requests.
+
+    Server errors (5xx) and timeouts/connection errors are retried up to max_retries times with full jitter
+    back-off: the delay before retry n is drawn uniformly between 0 and min(max_delay, base_delay * 2^n).
+    Client errors (4xx other than 429) are raised immediately.
+
+    With hedging, a duplicate request is sent when the first one takes longer than the hedge_percentile of the
+    observed latencies; whichever response arrives first is used. Hedging starts after min_hedge_samples
+    requests have been observed.
+
+    Parameters
+    ----------
+    max_retries : int - default: 3
+        Number of retries after the first attempt.
+
+    base_delay, max_delay : float - default: 1, 60
+        Back-off parameters in seconds.
+
+    retry_statuses : tuple - default: (500, 502, 503, 504)
+        Response codes that are retried.
+
+    hedge : bool - default: True
+        Send a duplicate request for slow requests.
+
+    hedge_percentile : float - default: 95
+        Latency percentile after which a duplicate request is sent.
+
+    min_hedge_samples : int - default: 20
+        Number of observed requests needed before hedging.
+    '''
+
+    def __init__(self, max_retries = 3, base_delay = 1.0, max_delay = 60.0, retry_statuses = (500, 502, 503, 504),
+            hedge = True, hedge_percentile = 95, min_hedge_samples = 20):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_statuses = retry_statuses
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.min_hedge_samples = min_hedge_samples
+
+        self.latencies = deque(maxlen = 500)
+        self.retries = 0
+        self.hedges = 0
+        self._lock = threading.Lock()
+
+    def get_delay(self, attempt):
+        '''
+        Return the back-off delay before retry number attempt (starting from 1).
+        '''
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def should_retry(self, attempt):
+        return attempt < self.max_retries
+
+    def record_latency(self, latency):
+        with self._lock:
+            self.latencies.append(latency)
+
+    def record_retry(self):
+        with self._lock:
+            self.retries = self.retries + 1
+
+    def record_hedge(self):
+        with self._lock:
+            self.hedges = self.hedges + 1
+
+    def get_hedge_delay(self):
+        '''
+        Return the time after which a duplicate request is sent, or None if hedging is not active.
+        '''
+        with self._lock:
+            if (not self.hedge or len(self.latencies) < self.min_hedge_samples):
+                return None
+            return float(np.percentile(self.latencies, self.hedge_percentile))
+
+
+class circuit_breaker:
+    '''
+    Pause dispatching requests while the recent error rate is high.
+
+    The outcomes of the last window requests are tracked. When at least min_requests outcomes are known and
+    the share of errors reaches error_threshold, the breaker opens and requests wait for cooldown seconds.
+    After the cooldown the breaker is half-open: a single probe request is admitted and the other requests keep
+    waiting until its outcome closes the breaker on success or opens it again on error. If the probe reports no
+    outcome within cooldown seconds, another probe is admitted.
+
+    Parameters
+    ----------
+    error_threshold : float - default: 0.5
+        Share of errors that opens the breaker.
+
+    window : int - default: 20
+        Number of recent outcomes considered.
+
+    min_requests : int - default: 10
+        Minimum number of outcomes before the breaker can open.
+
+    cooldown : float - default: 30
+        Seconds the breaker stays open.
+    '''
+
+    def __init__(self, error_threshold = 0.5, window = 20, min_requests = 10, cooldown = 30.0):
+        self.error_threshold = error_threshold
+        self.min_requests = min_requests
+        self.cooldown = cooldown
+
+        self.outcomes = deque(maxlen = window)
+        self.open_until = 0.0
+        self.half_open = False
+        self.probe_started = None
+        self.times_opened = 0
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+
+    def is_open(self):
+        with self._lock:
+            return time.time() < self.open_until
+
+    def wait(self):
+        '''
+        Block while the breaker is open, and while the probe of a half-open breaker is in flight.
+        '''
+        with self._condition:
+            while True:
+                now = time.time()
+                remaining = self.open_until - now
+                if (remaining > 0):
+                    self._condition.wait(remaining)
+                elif (not self.half_open):
+                    return
+                elif (self.probe_started is None or now - self.probe_started >= self.cooldown):
+                    # This request is the probe
+                    self.probe_started = now
+                    return
+                else:
+                    self._condition.wait(self.probe_started + self.cooldown - now)
+
+    def _open(self):
+        self.open_until = time.time() + self.cooldown
+        self.half_open = True
+        self.probe_started = None
+        self.times_opened = self.times_opened + 1
+        self.outcomes.clear()
+
+    def record(self, success):
+        with self._condition:
+            if (self.half_open and time.time() >= self.open_until):
+                if (success):
+                    self.half_open = False
+                    self.probe_started = None
+                else:
+                    self._open()
+                self._condition.notify_all()
+                return
+
+            self.outcomes.append(success)
+            errors = len([outcome for outcome in self.outcomes if not outcome])
+            if (len(self.outcomes) >= self.min_requests and errors >= self.error_threshold * len(self.outcomes)):
+                self._open()
@@ -0,0 +1,233 @@
+import copy
+import json
+
+import numpy as np
+import pandas as pd
+
+# Time dimensions that can be derived from the daily report
+time_dimensions = {
+    'variables/daterangeday': 'day',
+    'variables/daterangeweek': 'week',
+    'variables/daterangemonth': 'month',
+    'variables/daterangequarter': 'quarter',
+    'variables/daterangeyear': 'year'
+}
+
+# Metrics that can not be summed across days
+non_additive_metrics = [
+    'metrics/visitors',
+    'metrics/uniquevisitors',
+    'metrics/dailyuniquevisitors',
+    'metrics/weeklyuniquevisitors',
+    'metrics/monthlyuniquevisitors',
+    'metrics/quarterlyuniquevisitors',
+    'metrics/yearlyuniquevisitors',
+    'metrics/bouncerate',
+    'metrics/averagepagedepth',
+    'metrics/averagetimespentonsite',
+    'metrics/averagetimespentonpage',
+    'metrics/averagevisitdepth',
+    'metrics/timespentvisit',
+    'metrics/timespentvisitor',
+    'metrics/reloads'
+]
+
+
+def is_additive_metric(metric_id):
+    '''
+    Return whether a metric can be summed across days.
+
+    Unique visitor metrics, rates, averages and calculated metrics (cm...) are not additive.
+    '''
+    if (metric_id in non_additive_metrics or metric_id.startswith('cm')):
+        return False
+    name = metric_id.split('/')[-1]
+    return not (name.endswith('rate') or name.startswith('average') or name.endswith('visitors'))
+
+
+class time_rollup:
+    '''
+    Reports by time dimension derived from the daily report.
+
+    The daily report (variables/daterangeday) is downloaded once per report configuration and kept.
+    Weekly, monthly, quarterly and yearly reports are computed from it by summing the additive metrics of
+    the days of every period. Non-additive metrics (see is_additive_metric()) are downloaded from the API
+    for the requested dimension and merged by item ID.
+
+    Item IDs and values follow the API: the item ID of a period is the item ID of its first day,
+    (year - 1900) * 10000 + (month - 1) * 100 + day, i.e. 1200001 for 2020-01-01.
+
+    Parameters
+    ----------
+    week_start : int - default: 6
+        First day of the week (Monday = 0, Sunday = 6). Must match the calendar of the report suite;
+        report suites with custom calendars should not use the rollup for weeks.
+
+    additive_metrics : list - optional
+        Metrics that are additive regardless of is_additive_metric(), i.e. additive calculated metrics.
+    '''
+
+    def __init__(self, week_start = 6, additive_metrics = None):
+        self.week_start = week_start
+        self.additive_metrics = additive_metrics or []
+        self.daily_reports = {}
+        self.api_requests = 0
+
+    def is_additive(self, metric_id):
+        return metric_id in self.additive_metrics or is_additive_metric(metric_id)
+
+    def get_reports(self, client, dimensions):
+        '''
+        Return the report of the client by each of the time dimensions, as a dict of data frames.
+        '''
+        return dict((dimension, self.get_report(client, dimension)) for dimension in dimensions)
+
+    def get_report(self, client, dimension):
+        '''
+        Return the report of the client (metrics, date range and segments) by a time dimension.
+
+        Parameters
+        ----------
+        client : analytics_client
+            Configured client. Its dimensions are ignored.
+
+        dimension : string
+            Time dimension, i.e. variables/daterangemonth
+
+        Returns
+        -------
+        Pandas data frame
+            Same columns as get_report(): itemId, value and one column per metric
+        '''
+        if (dimension not in time_dimensions):
+            raise ValueError('Not a time dimension', dimension)
+
+        metric_ids = [metric['id'] for metric in client.report_object['metricContainer']['metrics']]
+        additive_metrics = [metric_id for metric_id in metric_ids if self.is_additive(metric_id)]
+        other_metrics = [metric_id for metric_id in metric_ids if metric_id not in additive_metrics]
+
+        if (len(additive_metrics) == 0):
+            return self._download(client, dimension, metric_ids)
+
+        daily_report = self._get_daily_report(client, additive_metrics)
+        if (time_dimensions[dimension] == 'day'):
+            df = daily_report.copy()
+        else:
+            df = rollup_daily_report(daily_report, time_dimensions[dimension], self.week_start)
+
+        if (len(other_metrics) > 0):
+            df_other = self._download(client, dimension, other_metrics).drop(columns = ['value'])
+            df = df.merge(df_other, on = 'itemId', how = 'outer' if len(df) > 0 else 'right')
+            df = df[['itemId', 'value'] + metric_ids]
+        return df
+
+    def _get_daily_report(self, client, metric_ids):
+        report_object = _get_client_copy(client, 'variables/daterangeday', metric_ids).report_object
+        report_object['settings'].pop('page', None)
+        key = json.dumps(report_object, sort_keys = True)
+        if (key not in self.daily_reports):
+            self.daily_reports[key] = self._download(client, 'variables/daterangeday', metric_ids)
+        return self.daily_reports[key]
+
+    def _download(self, client, dimension, metric_ids):
+        self.api_requests = self.api_requests + 1
+        client_copy = _get_client_copy(client, dimension, metric_ids)
+        return client_copy.get_report(client_copy.report_object)
+
+
+def _get_client_copy(client, dimension, metric_ids):
+    '''
+    Return a copy of the client reporting the given metrics by a single dimension, sorted by date.
+    '''
+    client_copy = copy.copy(client)
+    client_copy.report_object = copy.deepcopy(client.report_object)
+    client_copy.dimensions = [dimension]
+    client_copy.report_object['dimension'] = dimension
+    client_copy._set_report_setting('dimensionSort', 'asc')
+
+    metrics = []
+    for metric in client_copy.report_object['metricContainer']['metrics']:
+        if (metric['id'] in metric_ids):
+            # Column IDs are positional in the formatted output
+            metric['columnId'] = '{}'.format(len(metrics))
+            metrics.append(metric)
+    client_copy.report_object['metricContainer']['metrics'] = metrics
+    return client_copy
+
+
+def get_item_dates(item_ids):
+    '''
+    Convert daterange item IDs ((year - 1900) * 10000 + (month - 1) * 100 + day) into dates.
+    '''
+    item_ids = np.asarray(item_ids, dtype = np.int64)
+    return pd.to_datetime(pd.DataFrame({
+        'year': item_ids // 10000 + 1900,
+        'month': (item_ids // 100) % 100 + 1,
+        'day': item_ids % 100
+    }))
+
+
+def get_date_item_ids(dates):
+    dates = pd.Series(dates)
+    item_ids = (dates.dt.year - 1900) * 10000 + (dates.dt.month - 1) * 100 + dates.dt.day
+    return item_ids.astype(str)
+
+
+def _get_period_values(period_starts, grain):
+    months = np.array(['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'])
+    month_names = pd.Series(months[period_starts.dt.month - 1], index = period_starts.index)
+    years = period_starts.dt.year.astype(str)
+    if (grain in ['day', 'week']):
+        return month_names + ' ' + period_starts.dt.day.astype(str) + ', ' + years
+    if (grain == 'month'):
+        return month_names + ' ' + years
+    if (grain == 'quarter'):
+        return 'Q' + period_starts.dt.quarter.astype(str) + ' ' + years
+    return years
+
+
+def rollup_daily_report(daily_report, grain, week_start = 6):
+    '''
+    Sum a daily report (variables/daterangeday) into weeks, months, quarters or years.
+
+    Parameters
+    ----------
+    daily_report : Pandas data frame
+        Output of get_report() by variables/daterangeday with additive metrics
+
+    grain : string
+        'week', 'month', 'quarter' or 'year'
+
+    week_start : int - default: 6
+        First day of the week (Monday = 0, Sunday = 6)
+
+    Returns
+    -------
+    Pandas data frame
+        Columns itemId, value and the metrics, one row per period in ascending order.
+    '''
+    metric_columns = [column for column in daily_report.columns if column not in ['itemId', 'value']]
+    # Empty reports contain a single 'Unspecified' row
+    daily_report = daily_report[daily_report['itemId'] != '0']
+    if (len(daily_report) == 0):
+        return pd.DataFrame(dict([('itemId', ['0']), ('value', ['Unspecified'])] + [(column, [0]) for column in metric_columns]))
+
+    dates = get_item_dates(daily_report['itemId'])
+    if (grain == 'week'):
+        period_starts = dates - pd.to_timedelta((dates.dt.dayofweek - week_start) % 7, unit = 'D')
+    elif (grain == 'month'):
+        period_starts = dates.dt.to_period('M').dt.start_time
+    elif (grain == 'quarter'):
+        period_starts = dates.dt.to_period('Q').dt.start_time
+    elif (grain == 'year'):
+        period_starts = dates.dt.to_period('Y').dt.start_time
+    else:
+        raise ValueError('Unknown time grain', grain)
+
+    df_metrics = daily_report[metric_columns].reset_index(drop = True)
+    df = df_metrics.groupby(period_starts.to_numpy(), sort = True).sum()
+    period_starts = pd.Series(df.index)
+    df = df.reset_index(drop = True)
+    df.insert(0, 'itemId', get_date_item_ids(period_starts))
+    df.insert(1, 'value', _get_period_values(period_starts, grain))
+    return df
@@ -0,0 +1,117 @@
+import math
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+class subtree_scheduler:
+    '''
+    Size-aware ordering of breakdown children.
+
+    The number of child rows of every parent is estimated from a metric of the parent (the first metric of
+    the report by default) and the number of child rows per unit of that metric observed in the previous
+    levels and runs. Children are submitted longest-expected-first, so that the largest subtrees do not start
+    last under the concurrency cap of the pipeline. The pages of a large subtree are downloaded concurrently
+    by the fetch workers of the pipeline.
+
+    The predicted and actual rows, pages and durations of the last run are kept in last_schedule.
+
+    Parameters
+    ----------
+    cost_metric : string - optional
+        Metric used to estimate the size of a subtree, i.e. metrics/visits. Default: the first metric.
+
+    smoothing : float - default: 0.3
+        Weight of the latest observation in the rows per metric and seconds per page estimates.
+    '''
+
+    def __init__(self, cost_metric = None, smoothing = 0.3):
+        self.cost_metric = cost_metric
+        self.smoothing = smoothing
+        # Level -> {'rows_per_metric': float, 'seconds_per_page': float}
+        self.levels = {}
+        self.last_schedule = None
+        self._schedules = []
+        self._lock = threading.Lock()
+
+    def start_run(self):
+        self._schedules = []
+        self.last_schedule = None
+
+    def get_cost_values(self, level_table):
+        '''
+        Return the cost metric of every node of a level table.
+        '''
+        metric_columns = [column for column in level_table if column not in ['code', 'parent']]
+        column = self.cost_metric if self.cost_metric in metric_columns else (metric_columns[0] if metric_columns else None)
+        if (column is None):
+            return np.zeros(len(level_table['code']))
+        return np.nan_to_num(np.asarray(level_table[column], dtype = np.float64))
+
+    def estimate_rows(self, level, cost_values):
+        '''
+        Return the expected number of rows of the children at the given level, or NaN if the level was not observed.
+        '''
+        rows_per_metric = self.levels.get(level, {}).get('rows_per_metric')
+        if (rows_per_metric is None):
+            return np.full(len(cost_values), np.nan)
+        return np.maximum(1.0, cost_values * rows_per_metric)
+
+    def get_order(self, level, cost_values):
+        '''
+        Return the parent positions in the order in which their children are submitted (largest first).
+        '''
+        estimates = self.estimate_rows(level, cost_values)
+        if (np.isnan(estimates).all()):
+            estimates = cost_values
+        return np.argsort(-estimates, kind = 'stable')
+
+    def record(self, level, cost_values, order, actual_rows, limit, started, finished):
+        '''
+        Add the outcome of a level to last_schedule and update the estimates of the level.
+        '''
+        cost_values = np.asarray(cost_values, dtype = np.float64)
+        actual_rows = np.asarray(actual_rows, dtype = np.float64)
+        durations = np.asarray(finished) - np.asarray(started)
+        predicted_rows = self.estimate_rows(level, cost_values)
+        seconds_per_page = self.levels.get(level, {}).get('seconds_per_page', np.nan)
+
+        rank = np.empty(len(order), dtype = np.int64)
+        rank[order] = np.arange(len(order))
+        predicted_pages = np.ceil(predicted_rows / limit)
+        actual_pages = np.maximum(1, np.ceil(actual_rows / limit))
+        schedule = pd.DataFrame({
+            'level': level,
+            'parent': np.arange(len(cost_values)),
+            'rank': rank,
+            'predicted_rows': predicted_rows,
+            'actual_rows': actual_rows,
+            'predicted_pages': predicted_pages,
+            'actual_pages': actual_pages,
+            'predicted_seconds': predicted_pages * seconds_per_page,
+            'started': started,
+            'finished': finished
+        })
+
+        with self._lock:
+            self._schedules.append(schedule)
+            self.last_schedule = pd.concat(self._schedules, ignore_index = True)
+
+            stats = self.levels.setdefault(level, {})
+            if (cost_values.sum() > 0):
+                stats['rows_per_metric'] = self._smooth(stats.get('rows_per_metric'), actual_rows.sum() / cost_values.sum())
+            if (actual_pages.sum() > 0):
+                stats['seconds_per_page'] = self._smooth(stats.get('seconds_per_page'), durations.sum() / actual_pages.sum())
+
+    def set_seconds_per_page(self, level, seconds_per_page):
+        '''
+        Initialise the seconds per page of a level from previous runs (i.e. a stats_catalog), if it was not observed.
+        '''
+        with self._lock:
+            self.levels.setdefault(level, {}).setdefault('seconds_per_page', seconds_per_page)
+
+    def _smooth(self, previous, value):
+        if (previous is None or math.isnan(previous)):
+            return value
+        return (1 - self.smoothing) * previous + self.smoothing * value
@@ -0,0 +1,273 @@
+import os
+import json
+import time
+import sqlite3
+import warnings
+
+import pandas as pd
+
+default_stats_catalog_location = os.path.join(os.path.expanduser('~'), '.analytics_mayhem', 'stats.sqlite')
+
+_counters = ['reports', 'pages', 'rows', 'throttled', 'total_elements', 'total_pages', 'bytes', 'latency']
+
+
+class stats_catalog:
+    '''
+    Statistics of the report requests, kept per report suite, dimension, segments and breakdown level in a
+    SQLite database shared by the processes of a host.
+
+    Every downloaded page adds its rows, response size and latency; the first page of every report adds
+    totalElements and totalPages (at breakdown levels, per parent node); 429 responses are counted as
+    throttled. The statistics are used to:
+    - initialise the limit policy and the scheduler of a client before its first requests (configure()),
+    - provide the number of items of the dimensions to the breakdown order optimizer (get_cardinalities()),
+    - warn before a breakdown report that is estimated to be expensive (check_report()).
+
+    Parameters
+    ----------
+    path : string - optional
+        Location of the database. Default: ~/.analytics_mayhem/stats.sqlite
+
+    max_requests : int - default: 10000
+        Breakdown reports estimated to need more requests are reported by check_report().
+
+    max_seconds : float - default: 3600
+        Breakdown reports estimated to take longer (without concurrency) are reported by check_report().
+    '''
+
+    def __init__(self, path = None, max_requests = 10000, max_seconds = 3600.0):
+        self.path = path or default_stats_catalog_location
+        self.max_requests = max_requests
+        self.max_seconds = max_seconds
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if (not os.path.exists(directory)):
+            os.makedirs(directory, exist_ok = True)
+        connection = self._connect()
+        try:
+            connection.execute('''CREATE TABLE IF NOT EXISTS dimension_stats (
+                rsid TEXT NOT NULL, dimension TEXT NOT NULL, segments TEXT NOT NULL, level INTEGER NOT NULL,
+                reports INTEGER NOT NULL DEFAULT 0, pages INTEGER NOT NULL DEFAULT 0, rows INTEGER NOT NULL DEFAULT 0,
+                throttled INTEGER NOT NULL DEFAULT 0, total_elements INTEGER NOT NULL DEFAULT 0, max_total_elements INTEGER NOT NULL DEFAULT 0,
+                last_total_elements INTEGER, total_pages INTEGER NOT NULL DEFAULT 0, bytes INTEGER NOT NULL DEFAULT 0,
+                latency REAL NOT NULL DEFAULT 0, max_latency REAL NOT NULL DEFAULT 0, updated_at REAL,
+                PRIMARY KEY (rsid, dimension, segments, level))''')
+        finally:
+            connection.close()
+
+    def _connect(self):
+        # Transactions are managed explicitly with BEGIN IMMEDIATE
+        return sqlite3.connect(self.path, timeout = 30, isolation_level = None)
+
+    @staticmethod
+    def get_segments(report_object):
+        '''
+        Return the segments of a report object as a canonical string (sorted JSON list of segment IDs).
+        '''
+        segment_ids = [report_filter.get('segmentId') for report_filter in report_object.get('globalFilters', [])
+            if report_filter.get('type') == 'segment']
+        return json.dumps(sorted(segment_ids))
+
+    @staticmethod
+    def is_recorded(report_object):
+        '''
+        Return whether the requests of a report object are recorded. Requests restricted by a search
+        (i.e. the partitions of get_report_partitioned()) only return part of the items of the dimension.
+        '''
+        return not report_object.get('search')
+
+    def _get_key(self, report_object, level, dimension = None):
+        return (report_object.get('rsid', ''), dimension or report_object.get('dimension', ''), self.get_segments(report_object), level)
+
+    def _update(self, key, assignments, parameters):
+        connection = self._connect()
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.execute('INSERT OR IGNORE INTO dimension_stats (rsid, dimension, segments, level) VALUES (?, ?, ?, ?)', key)
+            connection.execute('UPDATE dimension_stats SET {}, updated_at = ? WHERE rsid = ? AND dimension = ? AND segments = ? AND level = ?'.format(assignments),
+                list(parameters) + [time.time()] + list(key))
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        finally:
+            connection.close()
+
+    def record_page(self, report_object, level, json_obj, response_bytes, latency):
+        '''
+        Record a downloaded page of a report. Requests restricted by a search are ignored (see is_recorded()).
+
+        Parameters
+        ----------
+        report_object : dict
+            Report object of the request
+
+        level : int
+            Breakdown level of the request (1 for the top-level dimension)
+
+        json_obj : dict
+            Decoded response (the rows are not needed)
+
+        response_bytes : int
+            Size of the response body
+
+        latency : float
+            Duration of the request in seconds
+        '''
+        if (not self.is_recorded(report_object)):
+            return
+        rows = json_obj.get('numberOfElements', len(json_obj.get('rows', [])))
+        assignments = 'pages = pages + 1, rows = rows + ?, bytes = bytes + ?, latency = latency + ?, max_latency = MAX(max_latency, ?)'
+        parameters = [rows, response_bytes, latency, latency]
+        if (json_obj.get('number', 0) == 0):
+            total_elements = json_obj.get('totalElements', 0)
+            assignments = assignments + (', reports = reports + 1, total_elements = total_elements + ?, max_total_elements = MAX(max_total_elements, ?),'
+                ' last_total_elements = ?, total_pages = total_pages + ?')
+            parameters = parameters + [total_elements, total_elements, total_elements, json_obj.get('totalPages', 0)]
+        self._update(self._get_key(report_object, level), assignments, parameters)
+
+    def record_throttled(self, report_object, level):
+        '''
+        Record a 429 response to a request.
+        '''
+        if (not self.is_recorded(report_object)):
+            return
+        self._update(self._get_key(report_object, level), 'throttled = throttled + 1', [])
+
+    def get_stats(self, rsid = None, dimension = None, segments = None, level = None):
+        '''
+        Return the statistics, optionally filtered.
+
+        Parameters
+        ----------
+        rsid, dimension : string - optional
+            Report suite and dimension
+
+        segments : list or string - optional
+            Segment IDs, or the canonical string of get_segments()
+
+        level : int - optional
+            Breakdown level
+
+        Returns
+        -------
+        Pandas data frame
+            One row per report suite, dimension, segments and level with the counters (reports, pages, rows,
+            throttled, bytes, latency in seconds), max_total_elements and last_total_elements, and the averages
+            avg_total_elements and avg_total_pages (per report or parent node), avg_bytes and avg_latency
+            (per page), seconds_per_row, bytes_per_row and throttle_rate (429 responses per request).
+        '''
+        conditions = []
+        parameters = []
+        if (segments is not None and not isinstance(segments, str)):
+            segments = json.dumps(sorted(segments))
+        for column, value in [('rsid', rsid), ('dimension', dimension), ('segments', segments), ('level', level)]:
+            if (value is not None):
+                conditions.append('{} = ?'.format(column))
+                parameters.append(value)
+        query = 'SELECT * FROM dimension_stats'
+        if (len(conditions) > 0):
+            query = query + ' WHERE ' + ' AND '.join(conditions)
+
+        connection = self._connect()
+        try:
+            cursor = connection.execute(query + ' ORDER BY rsid, dimension, segments, level', parameters)
+            columns = [description[0] for description in cursor.description]
+            df = pd.DataFrame(cursor.fetchall(), columns = columns)
+        finally:
+            connection.close()
+
+        df[_counters] = df[_counters].astype(float)
+        reports = df['reports'].where(df['reports'] > 0)
+        pages = df['pages'].where(df['pages'] > 0)
+        rows = df['rows'].where(df['rows'] > 0)
+        requests = (df['pages'] + df['throttled']).where(df['pages'] + df['throttled'] > 0)
+        df['avg_total_elements'] = df['total_elements'] / reports
+        df['avg_total_pages'] = df['total_pages'] / reports
+        df['avg_bytes'] = df['bytes'] / pages
+        df['avg_latency'] = df['latency'] / pages
+        df['seconds_per_row'] = df['latency'] / rows
+        df['bytes_per_row'] = df['bytes'] / rows
+        df['throttle_rate'] = df['throttled'] / requests
+        return df.drop(columns = ['total_elements', 'total_pages', 'updated_at'])
+
+    def _get_level_stats(self, report_object, dimension, level):
+        rsid, dimension, segments, level = self._get_key(report_object, level, dimension)
+        df = self.get_stats(rsid, dimension, segments, level)
+        if (len(df) == 0 or df['reports'].iloc[0] == 0):
+            return None
+        return df.iloc[0]
+
+    def get_cardinalities(self, report_object, dimensions):
+        '''
+        Return the last observed number of items (totalElements at the top level) of the dimensions for the
+        report suite and segments of the report object. Dimensions that were not observed are omitted.
+        '''
+        cardinalities = {}
+        for dimension in dimensions:
+            stats = self._get_level_stats(report_object, dimension, 1)
+            if (stats is not None):
+                cardinalities[dimension] = int(stats['last_total_elements'])
+        return cardinalities
+
+    def estimate_report(self, report_object, dimensions, totals_only = False):
+        '''
+        Estimate the requests and the duration (without concurrency) of a breakdown report.
+
+        The number of nodes of every level is the number of nodes of the previous level multiplied by the
+        average number of items per parent observed at that level (or the number of items at the top level
+        if the dimension was not observed at that level).
+
+        Returns
+        -------
+        dict
+            requests and seconds, or None if a dimension was not observed.
+        '''
+        requests = 0
+        seconds = 0.0
+        parents = 1.0
+        for idx in range(len(dimensions)):
+            level = idx + 1
+            stats = self._get_level_stats(report_object, dimensions[idx], level)
+            if (stats is None and level > 1):
+                stats = self._get_level_stats(report_object, dimensions[idx], 1)
+            if (stats is None):
+                return None
+            if (totals_only and level == len(dimensions)):
+                pages = 1.0
+            else:
+                pages = max(1.0, stats['avg_total_pages'])
+            level_requests = parents * pages
+            requests = requests + level_requests
+            seconds = seconds + level_requests * (stats['avg_latency'] if stats['pages'] > 0 else 0.0)
+            parents = parents * max(1.0, stats['avg_total_elements'])
+        return {'requests': int(round(requests)), 'seconds': seconds}
+
+    def check_report(self, report_object, dimensions, totals_only = False):
+        '''
+        Warn if a breakdown report is estimated to need more than max_requests requests or max_seconds seconds.
+        Returns the estimate (see estimate_report()).
+        '''
+        estimate = self.estimate_report(report_object, dimensions, totals_only)
+        if (estimate is not None and (estimate['requests'] > self.max_requests or estimate['seconds'] > self.max_seconds)):
+            warnings.warn('Expensive report: about {} requests and {:.0f} seconds of requests for {}'.format(
+                estimate['requests'], estimate['seconds'], ' > '.join(dimensions)))
+        return estimate
+
+    def configure(self, client, totals_only = False):
+        '''
+        Initialise the limit policy and the scheduler of a client from the statistics of its dimensions,
+        and warn if its breakdown report is expensive (see check_report()).
+
+        Levels that the limit policy or the scheduler have already observed are not changed.
+        '''
+        for idx in range(len(client.dimensions)):
+            level = idx + 1
+            stats = self._get_level_stats(client.report_object, client.dimensions[idx], level)
+            if (stats is None or stats['rows'] == 0):
+                continue
+            if (client.limit_policy is not None):
+                client.limit_policy.set_level_estimates(level, stats['seconds_per_row'], stats['bytes_per_row'], stats['max_total_elements'])
+            if (client.scheduler is not None and level > 1):
+                client.scheduler.set_seconds_per_page(level, stats['avg_latency'])
+        return self.check_report(client.report_object, client.dimensions, totals_only)
@@ -0,0 +1,170 @@
+import json
+import codecs
+
+import numpy as np
+
+_whitespace = ' \t\n\r'
+
+
+class _column_buffers:
+    '''
+    Growable column buffers of the rows of a report page.
+    '''
+
+    def __init__(self, capacity, number_of_metrics = None):
+        self.capacity = max(1, capacity)
+        self.size = 0
+        self.item_ids = np.empty(self.capacity, dtype = object)
+        self.values = np.empty(self.capacity, dtype = object)
+        self.data = None if number_of_metrics is None else np.empty((self.capacity, number_of_metrics))
+
+    def _grow(self):
+        self.capacity = self.capacity * 2
+        self.item_ids = np.resize(self.item_ids, self.capacity)
+        self.values = np.resize(self.values, self.capacity)
+        self.data = np.resize(self.data, (self.capacity, self.data.shape[1]))
+
+    def append(self, row):
+        if (self.data is None):
+            self.data = np.empty((self.capacity, len(row['data'])))
+        if (self.size == self.capacity):
+            self._grow()
+        self.item_ids[self.size] = row['itemId']
+        self.values[self.size] = row['value']
+        self.data[self.size, :] = row['data']
+        self.size = self.size + 1
+
+    def get_columns(self):
+        data = self.data if self.data is not None else np.empty((0, 0))
+        return self.item_ids[:self.size], self.values[:self.size], data[:self.size]
+
+
+class _stream_reader:
+    '''
+    Incremental reader of a JSON document delivered in chunks.
+    '''
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = json.JSONDecoder()
+        self.text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.position = 0
+        self.size = 0
+        self.finished = False
+
+    def fill(self):
+        '''
+        Append the next chunk to the buffer. Returns False at the end of the stream.
+        '''
+        if (self.finished):
+            return False
+        chunk = next(self.chunks, None)
+        if (chunk is None):
+            self.finished = True
+            self.buffer = self.buffer[self.position:] + self.text_decoder.decode(b'', final = True)
+        elif (isinstance(chunk, bytes)):
+            self.size = self.size + len(chunk)
+            self.buffer = self.buffer[self.position:] + self.text_decoder.decode(chunk)
+        else:
+            self.size = self.size + len(chunk.encode('utf-8'))
+            self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def peek(self):
+        '''
+        Skip whitespace and return the next character ('' at the end of the stream).
+        '''
+        while True:
+            while (self.position < len(self.buffer) and self.buffer[self.position] in _whitespace):
+                self.position = self.position + 1
+            if (self.position < len(self.buffer)):
+                return self.buffer[self.position]
+            if (not self.fill()):
+                return ''
+
+    def expect(self, character):
+        if (self.peek() != character):
+            raise ValueError('Expected {} at byte {} of the report page'.format(character, self.size))
+        self.position = self.position + 1
+
+    def read_value(self):
+        '''
+        Decode the next JSON value.
+        '''
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+                # A number at the end of the buffer may continue in the next chunk
+                if (end < len(self.buffer) or self.finished):
+                    self.position = end
+                    return value
+            except ValueError:
+                if (self.finished):
+                    raise
+            self.fill()
+
+
+def read_report_stream(chunks):
+    '''
+    Decode a Reports API page from an iterable of chunks without building the rows as a list of dicts.
+
+    The top-level keys are decoded as usual, while the rows array is walked one row at a time and the
+    itemId, value and data of every row are written into column buffers. The buffers are preallocated
+    with numberOfElements when it precedes the rows (as in the API responses).
+
+    Parameters
+    ----------
+    chunks : iterable
+        Chunks of the response body (bytes or strings), i.e. response.iter_content()
+
+    Returns
+    -------
+    tuple
+        - The decoded response without the rows. numberOfElements is set to the number of rows if missing.
+        - itemId and value of the rows (object arrays)
+        - Metric values of the rows (float array, one column per metric)
+        - Size of the response body in bytes
+    '''
+    reader = _stream_reader(chunks)
+    json_obj = {}
+    buffers = None
+
+    reader.expect('{')
+    while True:
+        character = reader.peek()
+        if (character == '}'):
+            break
+        if (character == ','):
+            reader.position = reader.position + 1
+            continue
+        key = reader.read_value()
+        reader.expect(':')
+        if (key != 'rows'):
+            json_obj[key] = reader.read_value()
+            continue
+
+        number_of_metrics = len(json_obj['columns']['columnIds']) if 'columnIds' in json_obj.get('columns', {}) else None
+        buffers = _column_buffers(json_obj.get('numberOfElements') or 1024, number_of_metrics)
+        reader.expect('[')
+        while True:
+            character = reader.peek()
+            if (character == ']'):
+                reader.position = reader.position + 1
+                break
+            if (character == ','):
+                reader.position = reader.position + 1
+                continue
+            buffers.append(reader.read_value())
+
+    # Consume the rest of the body to count its size
+    while (reader.fill()):
+        pass
+
+    if (buffers is None):
+        buffers = _column_buffers(1)
+    item_ids, values, data = buffers.get_columns()
+    json_obj.setdefault('numberOfElements', len(item_ids))
+    return json_obj, item_ids, values, data, reader.size
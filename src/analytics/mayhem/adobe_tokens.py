@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import sqlite3
+import tempfile
+import threading
+
+from .adobe_locking import file_lock
+
+default_token_store_location = os.path.join(os.path.expanduser('~'), '.analytics_mayhem', 'tokens')
+
+
+class file_token_store:
+    '''
+    Access token store backed by a JSON file, shared by the processes of a host.
+
+    Every entry is a token record with the keys access_token, expires_at (epoch seconds, optional)
+    and refresh_token (optional). Writes replace the file atomically, so reads do not need the lock.
+    lock() is used by the clients to refresh an expired token only once across processes.
+
+    Parameters
+    ----------
+    path : string - optional
+        Location of the JSON file. Default: ~/.analytics_mayhem/tokens.json
+    '''
+
+    def __init__(self, path = None):
+        self.path = path or default_token_store_location + '.json'
+        self.lock_path = self.path + '.lock'
+
+    def _read(self):
+        if (not os.path.exists(self.path)):
+            return {}
+        with open(self.path, 'r') as token_file:
+            return json.load(token_file)
+
+    def get(self, key):
+        return self._read().get(key)
+
+    def put(self, key, record):
+        '''
+        Save the token record of a key. Must be called while holding lock().
+        '''
+        records = self._read()
+        records[key] = record
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if (not os.path.exists(directory)):
+            os.makedirs(directory, exist_ok = True)
+        file_descriptor, temp_path = tempfile.mkstemp(dir = directory)
+        with os.fdopen(file_descriptor, 'w') as token_file:
+            json.dump(records, token_file)
+        # Tokens are credentials; keep them readable by the owner only
+        os.chmod(temp_path, 0o600)
+        os.replace(temp_path, self.path)
+
+    def lock(self, key):
+        return file_lock(self.lock_path)
+
+
+class sqlite_token_store:
+    '''
+    Access token store backed by a SQLite database, shared by the processes of a host.
+
+    Same interface as file_token_store. Refreshes are serialised with a lock file next to the database.
+
+    Parameters
+    ----------
+    path : string - optional
+        Location of the database. Default: ~/.analytics_mayhem/tokens.sqlite
+    '''
+
+    def __init__(self, path = None):
+        self.path = path or default_token_store_location + '.sqlite'
+        self.lock_path = self.path + '.lock'
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if (not os.path.exists(directory)):
+            os.makedirs(directory, exist_ok = True)
+        # Tokens are credentials; create the database readable by the owner only
+        if (not os.path.exists(self.path)):
+            os.close(os.open(self.path, os.O_CREAT | os.O_WRONLY, 0o600))
+        os.chmod(self.path, 0o600)
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute('CREATE TABLE IF NOT EXISTS tokens (key TEXT PRIMARY KEY, record TEXT NOT NULL)')
+        finally:
+            connection.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout = 30)
+
+    def get(self, key):
+        connection = self._connect()
+        try:
+            row = connection.execute('SELECT record FROM tokens WHERE key = ?', (key,)).fetchone()
+        finally:
+            connection.close()
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, key, record):
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute('INSERT OR REPLACE INTO tokens (key, record) VALUES (?, ?)', (key, json.dumps(record)))
+        finally:
+            connection.close()
+
+    def lock(self, key):
+        return file_lock(self.lock_path)
+
+
+class memory_token_store:
+    '''
+    Access token store held in memory, shared by the clients of a process.
+
+    Same interface as file_token_store. Refreshes are serialised with one lock per key, so the clients
+    of a company refresh its token once while the clients of other companies are not blocked.
+    '''
+
+    def __init__(self):
+        self.records = {}
+        self.locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            record = self.records.get(key)
+        return dict(record) if record is not None else None
+
+    def put(self, key, record):
+        with self._lock:
+            self.records[key] = dict(record)
+
+    def lock(self, key):
+        with self._lock:
+            return self.locks.setdefault(key, threading.Lock())
+
+
+def is_token_record_valid(record, margin = 300):
+    '''
+    Check whether a token record holds an access token that is valid for at least margin more seconds.
+    Records without expiration are considered valid.
+    '''
+    if (record is None or not record.get('access_token')):
+        return False
+    expires_at = record.get('expires_at')
+    return expires_at is None or time.time() < expires_at - margin
@@ -0,0 +1,113 @@
+import io
+import requests
+from requests.structures import CaseInsensitiveDict
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+class requests_transport:
+    '''
+    Transport of the report requests through the requests package (default).
+
+    Without a session, every request opens its own connection. A requests.Session can be passed
+    to reuse HTTP/1.1 connections; the session's adapters determine the size of the pool.
+
+    Parameters
+    ----------
+    session : requests.Session - optional
+        Session used for the requests
+    '''
+
+    def __init__(self, session = None):
+        self.session = session
+
+    def post(self, url, headers, data, timeout, stream = False):
+        post = self.session.post if self.session is not None else requests.post
+        if (stream):
+            return post(url, headers = headers, data = data, timeout = timeout, stream = True)
+        return post(url, headers = headers, data = data, timeout = timeout)
+
+    def close(self):
+        if (self.session is not None):
+            self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class http2_transport:
+    '''
+    Transport of the report requests over HTTP/2 through the httpx package.
+
+    Concurrent requests are multiplexed as streams over at most max_connections connections, with
+    the flow control of HTTP/2 and HPACK compression of the repeated authorization and company headers.
+    Responses are returned as requests.Response objects and timeouts/connection errors are raised as the
+    equivalent requests exceptions, so the retry logic of the client is unchanged.
+
+    Responses are read completely before they are returned, also when a stream is requested.
+
+    Requires httpx with HTTP/2 support: pip install "httpx[http2]". HTTP/2 is negotiated with TLS (ALPN);
+    servers that do not support it, and http:// URLs, are used over HTTP/1.1. http_versions counts the
+    responses per protocol version.
+
+    Parameters
+    ----------
+    max_connections : int - default: 4
+        Maximum number of connections
+
+    http1 : bool - default: True
+        Allow HTTP/1.1. Pass False to always use HTTP/2, also over http:// (h2c with prior knowledge,
+        i.e. for local mock servers).
+    '''
+
+    def __init__(self, max_connections = 4, http1 = True):
+        if (httpx is None):
+            raise ImportError('http2_transport requires httpx with HTTP/2 support: pip install "httpx[http2]"')
+        self.max_connections = max_connections
+        self.client = httpx.Client(http1 = http1, http2 = True,
+            limits = httpx.Limits(max_connections = max_connections, max_keepalive_connections = max_connections))
+        self.http_versions = {}
+
+    def post(self, url, headers, data, timeout, stream = False):
+        try:
+            response = self.client.post(url, headers = headers, content = data, timeout = timeout)
+        except httpx.TimeoutException as error:
+            raise requests.exceptions.Timeout(str(error))
+        except httpx.TransportError as error:
+            raise requests.exceptions.ConnectionError(str(error))
+        self.http_versions[response.http_version] = self.http_versions.get(response.http_version, 0) + 1
+        return _to_requests_response(response)
+
+    def close(self):
+        self.client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _to_requests_response(response):
+    '''
+    Convert an httpx response into a requests.Response.
+
+    The body is already read: iter_content() serves it from memory and close() has no connection to release.
+    '''
+    result = requests.Response()
+    result.status_code = response.status_code
+    result._content = response.content
+    result._content_consumed = True
+    result.raw = io.BytesIO(result._content)
+    result.headers = CaseInsensitiveDict(response.headers)
+    result.url = str(response.url)
+    result.reason = response.reason_phrase
+    result.encoding = response.encoding
+    result.elapsed = response.elapsed
+    return result
@@ -0,0 +1,160 @@
+import threading
+from collections import deque
+
+import numpy as np
+
+
+class adaptive_limit_policy:
+    '''
+    Page size (limit) and timeout policy based on the observed latency and payload size of report pages.
+
+    Every downloaded page is recorded per breakdown level. The seconds and bytes per row are tracked as
+    exponentially weighted averages and used to size the next requests so that a page takes about
+    target_latency seconds and stays below max_page_bytes. A level only grows its limit when a full page
+    was returned and more rows were available, so small breakdowns keep fitting in a single page.
+
+    Note: The limit is only changed between paginated streams. All pages of one report request are downloaded
+    with the same limit, as the page numbers depend on it.
+
+    Parameters
+    ----------
+    initial_limit : int - default: 1000
+        Limit used for a level before anything has been observed.
+
+    min_limit, max_limit : int - default: 50, 50000
+        Bounds of the limit. The Reports API returns at most 50000 rows per page.
+
+    target_latency : float - default: 10
+        Target duration of a single page request in seconds.
+
+    max_page_bytes : int - default: 20 MB
+        Maximum size of a single page response.
+
+    growth_factor : float - default: 4
+        Maximum growth of the limit between two streams of the same level.
+
+    min_timeout, max_timeout : float - default: 30, 360
+        Bounds of the request timeout in seconds.
+
+    timeout_factor : float - default: 4
+        The timeout is the 95th percentile of the observed latencies multiplied by this factor.
+    '''
+
+    def __init__(self, initial_limit = 1000, min_limit = 50, max_limit = 50000, target_latency = 10.0, max_page_bytes = 20 * 1024 * 1024,
+            growth_factor = 4.0, min_timeout = 30.0, max_timeout = 360.0, timeout_factor = 4.0, smoothing = 0.3):
+        self.initial_limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.max_page_bytes = max_page_bytes
+        self.growth_factor = growth_factor
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_factor = timeout_factor
+        self.smoothing = smoothing
+
+        self.levels = {}
+        self.latencies = deque(maxlen = 200)
+        self._lock = threading.Lock()
+
+    def _get_level(self, level):
+        if (level not in self.levels):
+            self.levels[level] = {
+                'limit': self._clamp_limit(self.initial_limit),
+                'seconds_per_row': None,
+                'bytes_per_row': None,
+                'pages': 0
+            }
+        return self.levels[level]
+
+    def _clamp_limit(self, limit):
+        return int(max(self.min_limit, min(self.max_limit, limit)))
+
+    def _smooth(self, previous, value):
+        if (previous is None):
+            return value
+        return previous + self.smoothing * (value - previous)
+
+    def get_limit(self, level = 1):
+        '''
+        Return the limit to use for the next request of a breakdown level (1 for the top-level dimension).
+        '''
+        with self._lock:
+            return self._get_level(level)['limit']
+
+    def get_timeout(self):
+        '''
+        Return the request timeout in seconds. Until enough latencies have been observed, max_timeout is used.
+        '''
+        with self._lock:
+            if (len(self.latencies) < 5):
+                return self.max_timeout
+            p95 = float(np.percentile(self.latencies, 95))
+        return max(self.min_timeout, min(self.max_timeout, p95 * self.timeout_factor))
+
+    def record(self, level, limit, rows, total_elements, latency, response_bytes):
+        '''
+        Record a downloaded page and resize the limit of its level.
+
+        Parameters
+        ----------
+        level : int
+            Breakdown level of the request (1 for the top-level dimension)
+
+        limit : int
+            Limit used for the request
+
+        rows : int
+            Number of rows returned in the page (numberOfElements)
+
+        total_elements : int
+            Total number of rows of the report (totalElements)
+
+        latency : float
+            Duration of the request in seconds
+
+        response_bytes : int
+            Size of the response body
+        '''
+        with self._lock:
+            self.latencies.append(latency)
+            state = self._get_level(level)
+            state['pages'] = state['pages'] + 1
+            if (rows <= 0):
+                return
+
+            state['seconds_per_row'] = self._smooth(state['seconds_per_row'], latency / rows)
+            state['bytes_per_row'] = self._smooth(state['bytes_per_row'], response_bytes / rows)
+            target_limit = min(self.target_latency / max(state['seconds_per_row'], 1e-9), self.max_page_bytes / max(state['bytes_per_row'], 1e-9))
+
+            if (latency > self.target_latency or response_bytes > self.max_page_bytes):
+                state['limit'] = self._clamp_limit(min(target_limit, limit))
+            elif (rows >= limit and total_elements > rows):
+                state['limit'] = self._clamp_limit(min(target_limit, limit * self.growth_factor))
+
+    def set_level_estimates(self, level, seconds_per_row, bytes_per_row, total_elements = None):
+        '''
+        Initialise a breakdown level from previous runs (i.e. a stats_catalog), before its first page.
+        Levels that have already recorded pages are not changed.
+
+        Parameters
+        ----------
+        level : int
+            Breakdown level (1 for the top-level dimension)
+
+        seconds_per_row, bytes_per_row : float
+            Observed duration and size per row
+
+        total_elements : int - optional
+            Largest number of rows of a report of the level. The limit does not exceed it.
+        '''
+        with self._lock:
+            state = self._get_level(level)
+            if (state['pages'] > 0):
+                return
+            state['seconds_per_row'] = seconds_per_row
+            state['bytes_per_row'] = bytes_per_row
+            limit = min(self.target_latency / max(seconds_per_row, 1e-9), self.max_page_bytes / max(bytes_per_row, 1e-9))
+            if (total_elements is not None and total_elements > 0):
+                limit = min(limit, total_elements)
+            state['limit'] = self._clamp_limit(limit)
@@ -0,0 +1,75 @@
+'''
+Breakdown report mocks shared by the test modules of the breakdown features.
+'''
+import json
+import requests
+from src.analytics.mayhem.adobe import analytics_client
+
+
+def mock_response(response_obj, status_code = 200):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(response_obj).encode('utf-8')
+    return response
+
+def sample_tree():
+    # Parent item ID path -> rows (itemId, value, metric values)
+    return {
+        (): [('10', 'Mobile', [10.0, 1.0]), ('20', 'Desktop', [20.0, 2.0])],
+        ('10',): [('1', 'Paid Search', [4.0, 0.0]), ('2', 'Natural Search', [6.0, 1.0])],
+        ('20',): [('1', 'Paid Search', [5.0, 1.0]), ('3', 'Display', [15.0, 1.0])],
+        ('10', '1'): [('100', 'Home', [4.0, 0.0])],
+        ('10', '2'): [('100', 'Home', [2.0, 0.0]), ('200', 'Cart', [4.0, 1.0])],
+        ('20', '1'): [('200', 'Cart', [5.0, 1.0])],
+        ('20', '3'): [('300', 'Checkout', [15.0, 1.0])]
+    }
+
+def breakdown_mock(client, tree, requests_made = None):
+    '''
+    Serve report objects from a breakdown tree. The parent path is read from the breakdown metric filters.
+    '''
+    def get_page(report_object = None):
+        if report_object is None:
+            report_object = client.report_object
+        metrics = report_object['metricContainer']['metrics']
+        metric_filters = report_object['metricContainer'].get('metricFilters', [])
+        path = tuple(metric_filter['itemId'] for metric_filter in metric_filters[::len(metrics)])
+        if requests_made is not None:
+            requests_made.append(path)
+
+        settings = report_object.get('settings', {})
+        limit = int(settings.get('limit', 50000))
+        page = int(settings.get('page', 0))
+        rows = tree.get(path, [])
+        total_pages = max(1, -(-len(rows) // limit))
+        page_rows = rows[page * limit:(page + 1) * limit]
+        return mock_response({
+            "totalPages": total_pages,
+            "firstPage": page == 0,
+            "lastPage": page >= total_pages - 1,
+            "numberOfElements": len(page_rows),
+            "number": page,
+            "totalElements": len(rows),
+            "columns": {"dimension": {"id": report_object['dimension'], "type": "string"}, "columnIds": [m['columnId'] for m in metrics]},
+            "rows": [{"itemId": r[0], "value": r[1], "data": r[2]} for r in page_rows],
+            "summaryData": {"totals": [sum(r[2][idx] for r in rows) for idx in range(len(metrics))]}
+        })
+    return get_page
+
+def generate_client():
+    return analytics_client(
+        adobe_org_id = 'fake_org_id',
+        subject_account = 'fake_subject_account',
+        client_id = 'fake_client_id',
+        client_secret = 'fake_client_secret',
+        account_id = 'fake_account_id')
+
+def generate_breakdown_client(levels = 3):
+    client = generate_client()
+    client.set_report_suite('fake_rsid')
+    client.add_metric('metrics/visits')
+    client.add_metric('metrics/orders')
+    for dimension in ['variables/mobiledevicetype', 'variables/lasttouchchannel', 'variables/page'][:levels]:
+        client.add_dimension(dimension)
+    client.set_date_range('2020-01-01', '2020-01-31')
+    return client
@@ -0,0 +1,259 @@
+import json
+import threading
+import time
+import requests
+import requests_mock
+import pytest
+from src.analytics.mayhem.adobe import analytics_client
+from src.analytics.mayhem.adobe_cache import request_coalescer
+from src.analytics.mayhem.adobe_cache import result_store
+from src.analytics.mayhem.adobe_tuning import adaptive_limit_policy
+
+def _generate_adobe_client():
+    client = analytics_client(
+        adobe_org_id = 'fake_org_id', 
+        subject_account = 'fake_subject_account', 
+        client_id = 'fake_client_id',
+        client_secret = 'fake_client_secret',
+        account_id = 'fake_account_id')
+    client.set_report_suite('fake_rsid')
+    client.add_metric('metrics/visits')
+    client.add_dimension('variables/daterangeday')
+    return client
+
+def _mock_post_response():
+    response_text = json.dumps({
+        "totalPages": 1, "firstPage": True, "lastPage": True, "numberOfElements": 1, "number": 0, "totalElements": 1,
+        "columns": {"dimension": {"id": "variables/daterangeday", "type": "time"}, "columnIds": ["0"]},
+        "rows": [{"itemId": "1180001", "value": "Jan 1, 2018", "data": [10.0]}],
+        "summaryData": {"totals": [10.0]}
+    })
+    adapter = requests_mock.Adapter()
+    adapter.register_uri('POST', 'mock://test.com/', status_code = 200, text = response_text)
+    session = requests.Session()
+    session.mount('mock', adapter)
+    return session.post('mock://test.com/')
+
+def test_request_key_is_canonical():
+    key_1 = request_coalescer.get_request_key('url', {'a': 1, 'b': {'c': 2, 'd': 3}})
+    key_2 = request_coalescer.get_request_key('url', {'b': {'d': 3, 'c': 2}, 'a': 1})
+    key_3 = request_coalescer.get_request_key('other_url', {'a': 1, 'b': {'c': 2, 'd': 3}})
+
+    assert key_1 == key_2
+    assert key_1 != key_3
+
+def test_concurrent_requests_share_one_call():
+    coalescer = request_coalescer()
+    calls = []
+    release = threading.Event()
+
+    def request_function():
+        calls.append(1)
+        release.wait(5)
+        return 'response'
+
+    results = []
+    threads = [threading.Thread(target = lambda: results.append(coalescer.execute('key', request_function))) for i in range(5)]
+    for thread in threads:
+        thread.start()
+    while (coalescer.shared < 4):
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == ['response'] * 5
+    assert coalescer.execute('key', request_function) == 'response'
+    assert coalescer.hits == 1
+
+def test_failed_requests_are_not_reused():
+    coalescer = request_coalescer()
+
+    def failing_request():
+        raise ValueError('failed')
+
+    with pytest.raises(ValueError):
+        coalescer.execute('key', failing_request)
+
+    assert coalescer.execute('key', lambda: 'response') == 'response'
+    assert coalescer.misses == 2
+
+def test_max_entries():
+    coalescer = request_coalescer(max_entries = 1)
+    coalescer.execute('key_1', lambda: 1)
+    coalescer.execute('key_2', lambda: 2)
+
+    assert coalescer.execute('key_1', lambda: 3) == 3
+
+def test_max_bytes(mocker):
+    coalescer = request_coalescer(max_bytes = 10)
+    response = mocker.Mock(content = b'123456')
+    coalescer.execute('key_1', lambda: response)
+    coalescer.execute('key_2', lambda: mocker.Mock(content = b'1234'))
+    assert coalescer.stored_bytes == 10
+    assert coalescer.execute('key_1', lambda: None) is response
+
+    # The least recently used response is dropped; responses larger than max_bytes are not kept
+    coalescer.execute('key_3', lambda: mocker.Mock(content = b'12'))
+    assert coalescer.execute('key_2', lambda: None) is None
+    coalescer.execute('key_4', lambda: mocker.Mock(content = b'12345678901'))
+    assert coalescer.stored_bytes <= 10
+    assert coalescer.execute('key_4', lambda: None) is None
+
+def test_clients_share_coalescer(mocker):
+    coalescer = request_coalescer()
+    client_1 = _generate_adobe_client()
+    client_2 = _generate_adobe_client()
+    for client in [client_1, client_2]:
+        client._get_request_headers = mocker.Mock(return_value = 'test headers')
+        client.set_request_coalescer(coalescer)
+    mocker.patch("time.sleep")
+    post = mocker.patch("requests.post", return_value = _mock_post_response())
+
+    df_1 = client_1.get_report()
+    df_2 = client_2.get_report()
+
+    assert post.call_count == 1
+    assert df_1.equals(df_2)
+
+    client_2.set_request_coalescer(False)
+    client_2.get_report()
+    assert post.call_count == 2
+
+def test_reused_responses_are_not_recorded(mocker):
+    assert request_coalescer().max_entries == 100
+    client = _generate_adobe_client()
+    client._get_request_headers = mocker.Mock(return_value = 'test headers')
+    client.set_request_coalescer()
+    policy = adaptive_limit_policy()
+    client.set_limit(policy)
+    mocker.patch("time.sleep")
+    post = mocker.patch("requests.post", return_value = _mock_post_response())
+
+    df_1 = client.get_report()
+    df_2 = client.get_report()
+
+    assert post.call_count == 1
+    assert df_1.equals(df_2)
+    # The latency of the reused response is recorded once
+    assert policy.levels[1]['pages'] == 1
+    assert len(policy.latencies) == 1
+
+def _daily_mock(requests_made):
+    '''
+    Serve the daily visits and orders of January 2020 within the date range of the report object.
+    '''
+    def get_page(client, report_object = None):
+        report_object = report_object or client.report_object
+        date_range = [report_filter['dateRange'] for report_filter in report_object['globalFilters'] if report_filter['type'] == 'dateRange'][0]
+        start, end = [int(value[8:10]) if value[5:7] == '01' else 32 for value in date_range.split('/')]
+        metric_ids = [metric['id'] for metric in report_object['metricContainer']['metrics']]
+        requests_made.append((start, end, metric_ids))
+        values = {'metrics/visits': lambda day: 10.0 * day, 'metrics/orders': lambda day: float(day % 2)}
+        rows = [{'itemId': '{}'.format(1200000 + day), 'value': 'Jan {}, 2020'.format(day), 'data': [values[metric_id](day) for metric_id in metric_ids]}
+            for day in range(start, end)]
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps({
+            "totalPages": 1 if rows else 0, "firstPage": True, "lastPage": True, "numberOfElements": len(rows), "number": 0, "totalElements": len(rows),
+            "columns": {"dimension": {"id": "variables/daterangeday", "type": "time"}, "columnIds": [metric['columnId'] for metric in report_object['metricContainer']['metrics']]},
+            "rows": rows, "summaryData": {"totals": [0.0] * len(metric_ids)}
+        }).encode('utf-8')
+        return response
+    return get_page
+
+def _daily_client(date_start, date_end, metrics):
+    client = _generate_adobe_client()
+    client.report_object['metricContainer']['metrics'] = []
+    for metric in metrics:
+        client.add_metric(metric)
+    client.set_date_range(date_start, date_end)
+    return client
+
+def test_result_store_query():
+    client = _daily_client('2020-01-01', '2020-01-10', ['metrics/visits'])
+    key, start, end, metric_ids = result_store.get_query(client.report_object)
+    assert (start.day, end.day, metric_ids) == (1, 11, ['metrics/visits'])
+
+    client.set_limit(10)
+    assert result_store.get_query(client.report_object)[0] == key
+    client.add_global_segment('s1')
+    assert result_store.get_query(client.report_object)[0] != key
+
+def test_result_store_answers_contained_reports(mocker):
+    requests_made = []
+    mocker.patch.object(analytics_client, '_get_page', _daily_mock(requests_made))
+    store = result_store()
+
+    client = _daily_client('2020-01-01', '2020-01-10', ['metrics/visits', 'metrics/orders'])
+    client.set_result_store(store)
+    client.get_report()
+    assert len(requests_made) == 1
+
+    # Metric subset of a sub-range of the days
+    client = _daily_client('2020-01-03', '2020-01-05', ['metrics/orders'])
+    client.set_result_store(store)
+    client.set_limit(2)
+    df = client.get_report()
+    assert len(requests_made) == 1
+    assert store.hits == 1
+    # Days without orders are dropped, as in the response of the API
+    assert list(df['itemId']) == ['1200003', '1200005']
+    assert list(df.columns) == ['itemId', 'value', 'metrics/orders']
+
+    # Only the days after the stored range are requested
+    client = _daily_client('2020-01-08', '2020-01-12', ['metrics/visits'])
+    client.set_result_store(store)
+    df = client.get_report()
+    assert requests_made[1] == (11, 13, ['metrics/visits'])
+    assert store.partial_hits == 1
+    assert list(df['itemId']) == ['1200008', '1200009', '1200010', '1200011', '1200012']
+    assert list(df['metrics/visits']) == [80.0, 90.0, 100.0, 110.0, 120.0]
+
+    # Other dimensions require the same date range
+    client = _daily_client('2020-01-03', '2020-01-05', ['metrics/visits'])
+    client.set_dimension('variables/daterangeweek')
+    client.set_result_store(store)
+    client.get_report()
+    assert store.misses == 2
+
+def test_result_store_bounds(mocker):
+    requests_made = []
+    mocker.patch.object(analytics_client, '_get_page', _daily_mock(requests_made))
+    store = result_store()
+    assert (store.max_entries, store.max_bytes) == (100, 256 * 1024 ** 2)
+
+    # Reports that can not be answered from other reports are downloaded with a copy of the report object
+    client = _daily_client('2020-01-01', '2020-01-10', ['metrics/visits'])
+    client.report_object['metricContainer']['metrics'][0]['sort'] = 'desc'
+    client.set_result_store(store)
+    report_object = json.dumps(client.report_object, sort_keys = True)
+    client.get_report()
+    assert json.dumps(client.report_object, sort_keys = True) == report_object
+
+    # Breakdown children are not stored by default
+    client = _daily_client('2020-01-01', '2020-01-10', ['metrics/visits'])
+    client.report_object['metricContainer']['metricFilters'] = [
+        {'id': '0', 'type': 'breakdown', 'dimension': 'variables/page', 'itemId': '1'}]
+    client.report_object['metricContainer']['metrics'][0]['filters'] = ['0']
+    client.set_result_store(store)
+    client.get_report()
+    client.get_report()
+    assert len(requests_made) == 3
+    assert (store.hits, store.misses, store.stored_bytes) == (0, 0, 0)
+
+    store = client.set_result_store(result_store(store_breakdowns = True))
+    client.get_report()
+    client.get_report()
+    assert len(requests_made) == 4
+    assert store.hits == 1 and store.stored_bytes > 0
+
+    # The least recently used reports are dropped beyond max_bytes
+    store = result_store(max_bytes = store.stored_bytes * 3 // 2)
+    for date_end in ['2020-01-10', '2020-01-11']:
+        client = _daily_client('2020-01-01', date_end, ['metrics/visits'])
+        client.set_result_store(store)
+        client.get_report()
+    assert sum(len(entries) for entries in store._entries.values()) == 1
+    assert 0 < store.stored_bytes <= store.max_bytes
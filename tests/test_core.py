@@ -9,8 +9,14 @@ import os
 import pytest
 # from src.adobe_api.adobe_api import aa_client
 from src.analytics.mayhem.adobe import analytics_client
+from src.analytics.mayhem.adobe import breakdown_tree
+from src.analytics.mayhem.adobe import _format_totals
+import numpy as np
 import pandas as pd
 from pandas._testing import assert_frame_equal
+from breakdown_mocks import breakdown_mock
+from breakdown_mocks import generate_breakdown_client
+from breakdown_mocks import sample_tree
 
 test_adobe_org_id= 'fake_org_id'
 test_subject_account = 'fake_subject_account'
@@ -339,9 +345,104 @@ def test_get_report(mocker, monkeypatch):
     
     assert expected_df.equals(tmp)
 
-def test_get_report_multiple_breakdowns():
-    # TODO
-    pass
+def test_get_report_multiple_breakdowns(monkeypatch):
+    client = generate_breakdown_client()
+    monkeypatch.setattr(client, "_get_page", breakdown_mock(client, sample_tree()))
+
+    df = client.get_report_multiple_breakdowns()
+
+    expected_df = pd.DataFrame({
+        'itemId_lvl_1': ['10', '10', '10', '20', '20'],
+        'value_lvl_1': ['Mobile', 'Mobile', 'Mobile', 'Desktop', 'Desktop'],
+        'itemId_lvl_2': ['1', '2', '2', '1', '3'],
+        'value_lvl_2': ['Paid Search', 'Natural Search', 'Natural Search', 'Paid Search', 'Display'],
+        'itemId_lvl_3': ['100', '100', '200', '200', '300'],
+        'value_lvl_3': ['Home', 'Home', 'Cart', 'Cart', 'Checkout'],
+        'metrics/visits': [4.0, 2.0, 4.0, 5.0, 15.0],
+        'metrics/orders': [0.0, 0.0, 1.0, 1.0, 1.0]
+    })
+    assert list(df.columns) == list(expected_df.columns)
+    for column in ['itemId_lvl_1', 'value_lvl_1', 'itemId_lvl_2', 'value_lvl_2', 'itemId_lvl_3', 'value_lvl_3']:
+        assert isinstance(df[column].dtype, pd.CategoricalDtype)
+    assert_frame_equal(df.astype({column: object for column in df.columns if '_lvl_' in column}), expected_df.astype({column: object for column in df.columns if '_lvl_' in column}))
+
+def test_breakdown_tree():
+    tree = breakdown_tree()
+    tree.add_level(pd.DataFrame({'itemId': ['b', 'a'], 'value': ['B', 'A'], 'metrics/visits': [3, 2]}))
+    tree.add_level(pd.DataFrame({
+        'itemId': ['x', 'y', 'x'], 
+        'value': ['X', 'Y', 'X'], 
+        'metrics/visits': [1, 2, 2], 
+        'parent': [0, 0, 1]
+    }))
+
+    assert list(tree.levels[1]['code']) == [0, 1, 0]
+    assert list(tree.levels[1]['parent']) == [0, 0, 1]
+    assert list(tree.level_dictionaries[0]['itemId']) == ['b', 'a']
+    assert tree.get_level_size(2) == 3
+    assert tree.get_item_path(2, 2) == ['a', 'x']
+
+    df = tree.assemble()
+    assert list(df.columns) == ['itemId_lvl_1', 'value_lvl_1', 'itemId_lvl_2', 'value_lvl_2', 'metrics/visits']
+    assert list(df['itemId_lvl_1'].astype(str)) == ['b', 'b', 'a']
+    assert list(df['value_lvl_2'].astype(str)) == ['X', 'Y', 'X']
+    assert list(df['metrics/visits']) == [1, 2, 2]
+
+def test_breakdown_tree_spill(tmp_path):
+    tree = breakdown_tree(memory_budget = 0, spill_directory = str(tmp_path))
+    tree.start_level()
+    tree.append_to_level(pd.DataFrame({'itemId': ['b'], 'value': ['B'], 'metrics/visits': [3]}))
+    tree.append_to_level(pd.DataFrame({'itemId': ['a', 'b'], 'value': ['A', 'B'], 'metrics/visits': [2, 1]}))
+    tree.finish_level()
+
+    assert isinstance(tree.levels[0]['code'], np.memmap)
+    assert list(tree.levels[0]['code']) == [0, 1, 0]
+    # Only the item dictionaries are left in memory
+    assert tree.memory_used == tree.dictionary_bytes > 0
+    assert tree.spilled_bytes > 0
+    assert tree.get_item_path(1, 1) == ['a']
+    # Spilled columns keep their dtype
+    assert tree.assemble()['metrics/visits'].dtype == np.int64
+    assert list(tree.assemble()['metrics/visits']) == [3, 2, 1]
+
+    tree.close()
+    assert os.listdir(str(tmp_path)) == []
+
+def test_breakdown_tree_spill_promotes_dtype(tmp_path):
+    tree = breakdown_tree(memory_budget = 0, spill_directory = str(tmp_path))
+    tree.start_level()
+    tree.append_to_level(pd.DataFrame({'itemId': ['a'], 'value': ['A'], 'metrics/visits': [3]}))
+    tree.append_to_level(pd.DataFrame({'itemId': ['b'], 'value': ['B'], 'metrics/visits': [1.5]}))
+    tree.finish_level()
+
+    df = tree.assemble()
+    assert df['metrics/visits'].dtype == np.float64
+    assert list(df['metrics/visits']) == [3.0, 1.5]
+    tree.close()
+
+def test_get_report_multiple_breakdowns_memory_budget(tmp_path, monkeypatch):
+    client = generate_breakdown_client()
+    client.set_limit(1)
+    monkeypatch.setattr(client, "_get_page", breakdown_mock(client, sample_tree()))
+    expected_df = client.get_report_multiple_breakdowns()
+
+    client.set_memory_budget(100, spill_directory = str(tmp_path))
+    df = client.get_report_multiple_breakdowns()
+
+    assert_frame_equal(df, expected_df)
+    assert os.listdir(str(tmp_path)) == []
+
+def test_get_report_multiple_breakdowns_pagination(monkeypatch):
+    client = generate_breakdown_client(levels = 2)
+    client.set_limit(1)
+    requests_made = []
+    monkeypatch.setattr(client, "_get_page", breakdown_mock(client, sample_tree(), requests_made))
+
+    df = client.get_report_multiple_breakdowns()
+
+    assert list(df['itemId_lvl_2'].astype(str)) == ['1', '2', '1', '3']
+    assert list(df['metrics/visits']) == [4.0, 6.0, 5.0, 15.0]
+    assert requests_made == [(), (), ('10',), ('10',), ('20',), ('20',)]
 
 def test_get_report_breakdown(monkeypatch):
     client = _generate_adobe_client()
@@ -570,4 +671,38 @@ def test_add_global_segment():
     client.set_date_range(date_start = start_date, date_end = end_date)
     assert expected_global_filters == client.report_object['globalFilters']
 
+def test_get_report_totals(monkeypatch):
+    client = generate_breakdown_client(levels = 1)
+    report_objects = []
+    get_page = breakdown_mock(client, sample_tree())
+    def recording_get_page(report_object = None):
+        report_objects.append(json.loads(json.dumps(report_object)))
+        return get_page(report_object)
+    monkeypatch.setattr(client, "_get_page", recording_get_page)
+
+    totals = client.get_report_totals()
+
+    assert_frame_equal(totals, pd.DataFrame({'metrics/visits': [30.0], 'metrics/orders': [3.0]}))
+    assert report_objects[0]['settings']['limit'] == '1'
+    assert 'settings' not in client.report_object or client.report_object['settings'].get('limit') != '1'
+    assert_frame_equal(client.get_report_multiple_breakdowns(totals_only = True), totals)
+
+def test_get_report_multiple_breakdowns_totals_only(monkeypatch):
+    client = generate_breakdown_client()
+    requests_made = []
+    monkeypatch.setattr(client, "_get_page", breakdown_mock(client, sample_tree(), requests_made))
+
+    df = client.get_report_multiple_breakdowns(totals_only = True)
+
+    assert list(df.columns) == ['itemId_lvl_1', 'value_lvl_1', 'itemId_lvl_2', 'value_lvl_2', 'metrics/visits', 'metrics/orders']
+    assert list(df['itemId_lvl_2'].astype(str)) == ['1', '2', '1', '3']
+    assert list(df['metrics/visits']) == [4.0, 6.0, 5.0, 15.0]
+    assert list(df['metrics/orders']) == [0.0, 1.0, 1.0, 1.0]
+    assert requests_made == [(), ('10',), ('20',), ('10', '1'), ('10', '2'), ('20', '1'), ('20', '3')]
+
+def test_format_totals_without_results():
+    client = _generate_adobe_client()
+    client.add_metric('metrics/visits')
+    data_json = {"totalPages": 0, "columns": {"columnIds": ["0"]}, "rows": [], "summaryData": {"totals": []}}
 
+    assert_frame_equal(_format_totals(data_json, client._get_metrics()), pd.DataFrame({'metrics/visits': [0]}))
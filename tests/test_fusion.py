@@ -0,0 +1,158 @@
+import json
+import requests
+from src.analytics.mayhem.adobe import analytics_client
+from src.analytics.mayhem.adobe_fusion import plan_report_fusion
+from src.analytics.mayhem.adobe_fusion import get_fused_reports
+
+# Metric values per (metric, segment)
+metric_values = {
+    ('metrics/visits', None): [10.0, 20.0],
+    ('metrics/visits', 's_mobile'): [4.0, 0.0],
+    ('metrics/orders', 's_mobile'): [1.0, 0.0],
+    ('metrics/visits', 's_desktop'): [6.0, 20.0]
+}
+
+# Metric values per (metric, segment) and parent itemId of the breakdown
+breakdown_values = {
+    ('metrics/visits', None): {'1': [9.0, 1.0], '2': [5.0, 15.0]},
+    ('metrics/visits', 's_mobile'): {'1': [3.0, 1.0], '2': [0.0, 0.0]},
+    ('metrics/orders', 's_mobile'): {'1': [1.0, 0.0], '2': [0.0, 0.0]},
+    ('metrics/visits', 's_desktop'): {'1': [6.0, 0.0], '2': [5.0, 15.0]}
+}
+
+def _generate_adobe_client(report_suite_id = 'fake_rsid', segment_id = None, metrics = ['metrics/visits'], search = None, breakdown = False):
+    client = analytics_client(
+        adobe_org_id = 'fake_org_id', 
+        subject_account = 'fake_subject_account', 
+        client_id = 'fake_client_id',
+        client_secret = 'fake_client_secret',
+        account_id = 'fake_account_id')
+    client.set_report_suite(report_suite_id)
+    client.add_global_segment(segment_id)
+    for metric in metrics:
+        client.add_metric(metric)
+    client.add_dimension('variables/mobiledevicetype')
+    if breakdown:
+        client.add_dimension('variables/lasttouchchannel')
+    if search is not None:
+        client.report_object['search'] = {'clause': search}
+    client.set_date_range('2020-01-01', '2020-01-31')
+    return client
+
+def _fake_get_page(report_objects):
+    def get_page(self, report_object = None):
+        if report_object is None:
+            report_object = self.report_object
+        report_objects.append(json.loads(json.dumps(report_object)))
+        metric_filters = dict((f['id'], f) for f in report_object['metricContainer'].get('metricFilters', []))
+        global_segments = [f['segmentId'] for f in report_object['globalFilters'] if f['type'] == 'segment']
+
+        columns = []
+        for metric in report_object['metricContainer']['metrics']:
+            filters = [metric_filters[f] for f in metric.get('filters', [])]
+            segments = global_segments + [f['segmentId'] for f in filters if f['type'] == 'segment']
+            parents = [f['itemId'] for f in filters if f['type'] == 'breakdown']
+            if parents:
+                columns.append(breakdown_values[(metric['id'], segments[0] if segments else None)][parents[0]])
+            else:
+                columns.append(metric_values[(metric['id'], segments[0] if segments else None)])
+
+        if report_object['dimension'] == 'variables/lasttouchchannel':
+            items = [('1', 'Paid Search'), ('2', 'Natural Search')]
+        else:
+            items = [('1', 'Mobile'), ('2', 'Desktop')]
+        # Rows without any data are not returned by the API
+        rows = [{"itemId": item_id, "value": value, "data": [column[idx] for column in columns]} for idx, (item_id, value) in enumerate(items)]
+        rows = [row for row in rows if any(row['data'])]
+
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps({
+            "totalPages": 1, "firstPage": True, "lastPage": True, "numberOfElements": len(rows), "number": 0, "totalElements": len(rows),
+            "columns": {"dimension": {"id": report_object['dimension'], "type": "string"}, "columnIds": [m['columnId'] for m in report_object['metricContainer']['metrics']]},
+            "rows": rows,
+            "summaryData": {"totals": [sum(column) for column in columns]}
+        }).encode('utf-8')
+        return response
+    return get_page
+
+def test_plan_report_fusion():
+    clients = [
+        _generate_adobe_client(segment_id = 's_mobile', metrics = ['metrics/visits', 'metrics/orders']),
+        _generate_adobe_client(segment_id = 's_desktop'),
+        _generate_adobe_client(report_suite_id = 'other_rsid'),
+        _generate_adobe_client(segment_id = 's_mobile')
+    ]
+
+    plans = plan_report_fusion(clients)
+
+    assert [plan.members for plan in plans] == [[0, 1, 3], [2]]
+    report_object = plans[0].client.report_object
+    assert [f for f in report_object['globalFilters'] if f['type'] == 'segment'] == []
+    assert [m['id'] for m in report_object['metricContainer']['metrics']] == ['metrics/visits', 'metrics/orders', 'metrics/visits']
+    assert report_object['metricContainer']['metricFilters'] == [
+        {'id': '0', 'type': 'segment', 'segmentId': 's_mobile'},
+        {'id': '1', 'type': 'segment', 'segmentId': 's_desktop'}
+    ]
+    assert plans[0].member_columns == {0: [0, 1], 1: [2], 3: [0]}
+    # Original clients are not modified
+    assert len(clients[0].report_object['globalFilters']) == 2
+
+def test_get_fused_reports(monkeypatch):
+    report_objects = []
+    monkeypatch.setattr(analytics_client, "_get_page", _fake_get_page(report_objects))
+    clients = [
+        _generate_adobe_client(segment_id = 's_mobile', metrics = ['metrics/visits', 'metrics/orders']),
+        _generate_adobe_client(segment_id = 's_desktop'),
+        _generate_adobe_client(report_suite_id = 'other_rsid')
+    ]
+
+    results = get_fused_reports(clients)
+
+    assert len(report_objects) == 2
+    assert list(results[0].columns) == ['itemId', 'value', 'metrics/visits', 'metrics/orders']
+    assert list(results[0]['value']) == ['Mobile']
+    assert list(results[0]['metrics/orders']) == [1.0]
+    assert list(results[1]['metrics/visits']) == [6.0, 20.0]
+    assert list(results[2]['metrics/visits']) == [10.0, 20.0]
+
+    for idx in range(len(clients)):
+        assert results[idx].equals(clients[idx].get_report())
+
+def test_plan_report_fusion_search():
+    clients = [
+        _generate_adobe_client(segment_id = 's_mobile', search = "( BEGINS-WITH 'a' )"),
+        _generate_adobe_client(segment_id = 's_desktop'),
+        _generate_adobe_client(segment_id = 's_desktop', search = "( BEGINS-WITH 'a' )")
+    ]
+
+    plans = plan_report_fusion(clients)
+
+    assert [plan.members for plan in plans] == [[0, 2], [1]]
+    assert plans[0].client.report_object['search'] == {'clause': "( BEGINS-WITH 'a' )"}
+
+def test_get_fused_reports_breakdown(monkeypatch):
+    report_objects = []
+    monkeypatch.setattr(analytics_client, "_get_page", _fake_get_page(report_objects))
+    clients = [
+        _generate_adobe_client(segment_id = 's_mobile', metrics = ['metrics/visits', 'metrics/orders'], breakdown = True),
+        _generate_adobe_client(segment_id = 's_desktop', breakdown = True),
+        _generate_adobe_client(breakdown = True)
+    ]
+
+    results = get_fused_reports(clients)
+
+    # One request per level-1 report and per parent, the same metric is requested under each segment
+    assert len(report_objects) == 3
+    assert [m['id'] for m in report_objects[0]['metricContainer']['metrics']] == ['metrics/visits', 'metrics/orders', 'metrics/visits', 'metrics/visits']
+    assert list(results[0].columns) == ['itemId_lvl_1', 'value_lvl_1', 'itemId_lvl_2', 'value_lvl_2', 'metrics/visits', 'metrics/orders']
+    assert list(results[0]['value_lvl_2']) == ['Paid Search', 'Natural Search']
+    assert list(results[0]['metrics/visits']) == [3.0, 1.0]
+    assert list(results[1]['metrics/visits']) == [6.0, 5.0, 15.0]
+    assert list(results[2]['metrics/visits']) == [9.0, 1.0, 5.0, 15.0]
+
+    for idx in range(len(clients)):
+        expected = clients[idx].get_report_multiple_breakdowns()
+        assert list(results[idx].columns) == list(expected.columns)
+        for column in expected.columns:
+            assert list(results[idx][column]) == list(expected[column])
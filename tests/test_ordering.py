@@ -0,0 +1,103 @@
+import json
+import requests
+import pandas as pd
+from pandas._testing import assert_frame_equal
+from src.analytics.mayhem.adobe import analytics_client
+from src.analytics.mayhem.adobe_ordering import estimate_requests
+from src.analytics.mayhem.adobe_ordering import breakdown_order_optimizer
+from src.analytics.mayhem.adobe_ordering import reorder_breakdown_levels
+
+# Visits per combination of channel and device type
+_facts = pd.DataFrame({
+    'variables/lasttouchchannel': ['1', '1', '2', '3', '3', '4', '5', '6'],
+    'variables/mobiledevicetype': ['10', '20', '10', '10', '20', '20', '10', '10'],
+    'metrics/visits': [4.0, 5.0, 6.0, 1.0, 2.0, 3.0, 7.0, 8.0]
+})
+
+def _fact_mock(requests_made):
+    '''
+    Serve any breakdown of the fact table: the metric filters select the rows, the dimension groups them.
+    '''
+    def get_page(client, report_object = None):
+        report_object = report_object or client.report_object
+        requests_made.append(report_object['dimension'])
+        df = _facts
+        for metric_filter in report_object['metricContainer'].get('metricFilters', []):
+            df = df[df[metric_filter['dimension']] == metric_filter['itemId']]
+        rows = df.groupby(report_object['dimension'], sort = True)['metrics/visits'].sum()
+        limit = int(report_object.get('settings', {}).get('limit', 50000))
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps({
+            'totalPages': 1, 'firstPage': True, 'lastPage': True, 'number': 0,
+            'numberOfElements': min(limit, len(rows)), 'totalElements': len(rows),
+            'columns': {'dimension': {'id': report_object['dimension'], 'type': 'string'}, 'columnIds': ['0']},
+            'rows': [{'itemId': item_id, 'value': 'v' + item_id, 'data': [value]} for item_id, value in list(rows.items())[:limit]],
+            'summaryData': {'totals': [float(rows.sum())]}
+        }).encode('utf-8')
+        return response
+    return get_page
+
+def _client():
+    client = analytics_client(client_id = 'fake_client_id', account_id = 'fake_account_id')
+    client.set_report_suite('fake_rsid')
+    client.add_metric('metrics/visits')
+    client.add_dimension('variables/lasttouchchannel')
+    client.add_dimension('variables/mobiledevicetype')
+    client.set_date_range('2020-01-01', '2020-01-31')
+    return client
+
+def test_estimate_requests():
+    assert estimate_requests([5, 20]) == 6
+    assert estimate_requests([20, 5]) == 21
+    assert estimate_requests([5, 20, 3]) == 106
+    assert estimate_requests([120, 5], limit = 100) == 2 + 120
+    assert estimate_requests([5, 20], totals_only = True) == 6
+
+def test_get_order():
+    optimizer = breakdown_order_optimizer()
+    assert optimizer.get_order(['a', 'b', 'c'], [20, 5, 3]) == [2, 1, 0]
+    assert optimizer.get_order(['a', 'b'], [5, 5]) == [0, 1]
+    # The summarised dimension stays last
+    assert optimizer.get_order(['a', 'b', 'c'], [20, 5, 3], totals_only = True) == [1, 0, 2]
+    assert breakdown_order_optimizer(max_permutations = 1).get_order(['a', 'b', 'c'], [20, 5, 3]) == [2, 1, 0]
+
+def test_reorder_breakdown_levels():
+    df = pd.DataFrame({
+        'itemId_lvl_1': pd.Categorical(['x', 'x', 'y']),
+        'value_lvl_1': ['X', 'X', 'Y'],
+        'itemId_lvl_2': pd.Categorical(['b', 'a', 'a'], categories = ['b', 'a']),
+        'value_lvl_2': ['B', 'A', 'A'],
+        'metrics/visits': [1, 2, 3]
+    })
+    df = reorder_breakdown_levels(df, [1, 0])
+    assert list(df.columns) == ['itemId_lvl_1', 'value_lvl_1', 'itemId_lvl_2', 'value_lvl_2', 'metrics/visits']
+    assert list(df['itemId_lvl_1']) == ['b', 'a', 'a']
+    assert list(df['itemId_lvl_2']) == ['x', 'x', 'y']
+    assert list(df['metrics/visits']) == [1, 2, 3]
+
+def test_get_report_multiple_breakdowns_optimised(mocker):
+    mocker.patch("time.sleep")
+    client = _client()
+    requests_made = []
+    mocker.patch.object(analytics_client, '_get_page', _fact_mock(requests_made))
+    expected_df = client.get_report_multiple_breakdowns()
+    assert len(requests_made) == 7
+
+    optimizer = client.set_order_optimizer(breakdown_order_optimizer())
+    requests_made.clear()
+    df = client.get_report_multiple_breakdowns()
+
+    # 2 cardinality requests, then device type (2 items) by channel
+    assert len(requests_made) == 2 + 3
+    assert list(optimizer.last_estimates['estimated_requests']) == [7, 3]
+    sort_columns = ['itemId_lvl_1', 'itemId_lvl_2']
+    assert_frame_equal(
+        df.astype(str).sort_values(sort_columns).reset_index(drop = True),
+        expected_df.astype(str).sort_values(sort_columns).reset_index(drop = True))
+    assert client.dimensions == ['variables/lasttouchchannel', 'variables/mobiledevicetype']
+
+    # Cardinalities are cached for the report
+    requests_made.clear()
+    client.get_report_multiple_breakdowns()
+    assert len(requests_made) == 3
@@ -0,0 +1,92 @@
+import pandas as pd
+import pytest
+from pandas._testing import assert_frame_equal
+from src.analytics.mayhem.adobe_partitioning import get_prefix_partitions
+from src.analytics.mayhem.adobe_partitioning import get_partition_report_object
+from src.analytics.mayhem.adobe_partitioning import merge_partitions
+from src.analytics.mayhem.adobe_partitioning import check_partition_coverage
+import re
+from breakdown_mocks import breakdown_mock
+from breakdown_mocks import generate_breakdown_client
+
+def test_get_prefix_partitions():
+    clauses = get_prefix_partitions(3, characters = 'abc')
+    assert clauses == [
+        "( BEGINS-WITH 'a' ) OR ( BEGINS-WITH 'b' )",
+        "( BEGINS-WITH 'c' )",
+        "( NOT BEGINS-WITH 'a' ) AND ( NOT BEGINS-WITH 'b' ) AND ( NOT BEGINS-WITH 'c' )"
+    ]
+    assert len(get_prefix_partitions(8)) == 8
+    with pytest.raises(ValueError):
+        get_prefix_partitions(1)
+
+def test_get_partition_report_object():
+    report_object = {'dimension': 'variables/page', 'search': {'clause': "( CONTAINS 'shop' )"}}
+    partition = get_partition_report_object(report_object, "( BEGINS-WITH 'a' )")
+    assert partition['search']['clause'] == "( ( CONTAINS 'shop' ) ) AND ( ( BEGINS-WITH 'a' ) )"
+    assert report_object['search']['clause'] == "( CONTAINS 'shop' )"
+
+def test_merge_partitions():
+    frames = [
+        pd.DataFrame({'itemId': ['1', '2'], 'value': ['b', 'c'], 'metrics/visits': [5, 7]}),
+        pd.DataFrame({'itemId': ['0'], 'value': ['Unspecified'], 'metrics/visits': [0]}),
+        pd.DataFrame({'itemId': ['3'], 'value': ['a'], 'metrics/visits': [6]})
+    ]
+    df = merge_partitions(frames, {'settings': {}})
+    assert list(df['itemId']) == ['2', '3', '1']
+    df = merge_partitions(frames, {'settings': {'dimensionSort': 'desc'}})
+    assert list(df['value']) == ['c', 'b', 'a']
+
+    # Same output as get_report() for a report without results
+    df = merge_partitions([frames[1], frames[1]], {'settings': {}})
+    assert_frame_equal(df, frames[1])
+
+def test_check_partition_coverage():
+    df = pd.DataFrame({'itemId': ['1', '2'], 'value': ['a', 'b'], 'metrics/visits': [5.0, 7.0], 'metrics/bouncerate': [0.5, 0.1]})
+    check_partition_coverage(df, {'totalElements': 2, 'summaryData': {'totals': [11.0, 0.3]}})
+
+    with pytest.raises(ValueError, match = 'rows of metrics/visits'):
+        check_partition_coverage(df, {'totalElements': 2, 'summaryData': {'totals': [13.0, 0.3]}})
+    with pytest.raises(ValueError, match = 'overlap'):
+        check_partition_coverage(pd.concat([df, df]), {'totalElements': 4, 'summaryData': {'totals': [24.0, 0.3]}})
+
+def _search_mock(client, rows):
+    '''
+    Serve the pages of a single dimension report, filtered by the BEGINS-WITH characters of the search clause.
+    '''
+    def get_page(report_object = None):
+        clause = report_object.get('search', {}).get('clause', '')
+        characters = re.findall(r"BEGINS-WITH '(.)'", clause)
+        if 'NOT' in clause:
+            matched = [row for row in rows if row[1][0].lower() not in characters]
+        elif clause:
+            matched = [row for row in rows if row[1][0].lower() in characters]
+        else:
+            matched = rows
+        return breakdown_mock(client, {(): matched})(report_object)
+    return get_page
+
+def test_get_report_partitioned(monkeypatch):
+    client = generate_breakdown_client(levels = 1)
+    client.set_limit(2)
+    rows = [(str(idx), value, [float(idx), 1.0]) for idx, value in enumerate(['home', 'Cart', 'about', '#anchor', 'zoo', 'Checkout', '1st'])]
+    monkeypatch.setattr(client, "_get_page", _search_mock(client, rows))
+
+    df = client.get_report_partitioned(partitions = 4)
+
+    assert list(df['value']) == ['#anchor', '1st', 'about', 'Cart', 'Checkout', 'home', 'zoo']
+    assert list(df.columns) == ['itemId', 'value', 'metrics/visits', 'metrics/orders']
+
+def test_get_report_partitioned_incomplete(monkeypatch):
+    client = generate_breakdown_client(levels = 1)
+    rows = [('1', 'home', [1.0, 0.0]), ('2', '#anchor', [2.0, 0.0])]
+    monkeypatch.setattr(client, "_get_page", _search_mock(client, rows))
+
+    with pytest.raises(ValueError, match = '1 rows instead of 2'):
+        client.get_report_partitioned(partitions = ["( BEGINS-WITH 'h' )", "( BEGINS-WITH 'x' )"])
+
+def test_get_report_partitioned_without_results(monkeypatch):
+    client = generate_breakdown_client(levels = 1)
+    monkeypatch.setattr(client, "_get_page", _search_mock(client, []))
+
+    assert_frame_equal(client.get_report_partitioned(partitions = 3), client.get_report())
@@ -0,0 +1,23 @@
+import pytest
+from pandas._testing import assert_frame_equal
+from src.analytics.mayhem.adobe_pipeline import report_pipeline
+from breakdown_mocks import breakdown_mock
+from breakdown_mocks import generate_breakdown_client
+from breakdown_mocks import sample_tree
+
+@pytest.mark.parametrize('use_processes', [False, True])
+def test_get_report_multiple_breakdowns_pipelined(monkeypatch, use_processes):
+    client = generate_breakdown_client()
+    client.set_limit(1)
+    monkeypatch.setattr(client, "_get_page", breakdown_mock(client, sample_tree()))
+    expected_df = client.get_report_multiple_breakdowns()
+
+    requests_made = []
+    monkeypatch.setattr(client, "_get_page", breakdown_mock(client, sample_tree(), requests_made))
+    with report_pipeline(fetch_workers = 2, parse_workers = 2, breakdown_workers = 3, use_processes = use_processes, queue_size = 1) as pipeline:
+        client.set_pipeline(pipeline)
+        df = client.get_report_multiple_breakdowns()
+
+    assert_frame_equal(df, expected_df)
+    assert len(requests_made) == 11
+    assert client.set_pipeline(False) is None
@@ -0,0 +1,104 @@
+import time
+import threading
+import requests
+from src.analytics.mayhem.adobe_pool import client_pool
+from src.analytics.mayhem.adobe_pool import fair_semaphore
+from src.analytics.mayhem.adobe_tokens import memory_token_store
+
+def _response(status_code, text):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = text.encode('utf-8')
+    return response
+
+def _wait_for(condition):
+    deadline = time.time() + 5
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+
+def test_fair_semaphore_round_robin():
+    semaphore = fair_semaphore(1)
+    semaphore.acquire('a')
+    order = []
+
+    def request(tenant):
+        semaphore.acquire(tenant)
+        order.append(tenant)
+        semaphore.release()
+
+    threads = []
+    for tenant in ['a', 'a', 'a', 'b']:
+        threads.append(threading.Thread(target = request, args = (tenant,)))
+        threads[-1].start()
+        _wait_for(lambda: sum(len(events) for events in semaphore.waiting.values()) == len(threads))
+
+    semaphore.release()
+    for thread in threads:
+        thread.join()
+    assert order == ['a', 'b', 'a', 'a']
+    assert semaphore.active == 0
+
+def test_memory_token_store():
+    store = memory_token_store()
+    assert store.get('key') is None
+    store.put('key', {'access_token': 'token'})
+    assert store.get('key') == {'access_token': 'token'}
+    assert store.lock('key') is store.lock('key')
+    assert store.lock('key') is not store.lock('other_key')
+
+def test_client_pool(mocker):
+    mocker.patch("time.sleep")
+    transport = mocker.Mock()
+    transport.post.return_value = _response(200, '{"rows": []}')
+
+    pool = client_pool(max_requests = 2, transport = transport)
+    pool.add_tenant('acme', adobe_org_id = 'acme_org', client_id = 'acme_client', account_id = 'acme_company')
+    pool.add_tenant('globex', adobe_org_id = 'globex_org', client_id = 'globex_client', account_id = 'globex_company')
+    for tenant in ['acme', 'globex']:
+        pool.token_store.put('jwt:{}_org:{}_client'.format(tenant, tenant), {'access_token': tenant + '_token', 'expires_at': None})
+
+    pool.get_client('acme')._get_page()
+    pool.get_client('acme')._get_page()
+    pool.get_client('globex')._get_page()
+
+    headers = [call[0][1] for call in transport.post.call_args_list]
+    assert [header['x-proxy-global-company-id'] for header in headers] == ['acme_company', 'acme_company', 'globex_company']
+    assert headers[2]['Authorization'] == 'Bearer globex_token'
+
+    df = pool.get_metrics()
+    assert list(df['tenant']) == ['acme', 'globex']
+    assert list(df['requests']) == [2, 1]
+    assert list(df['bytes']) == [24, 12]
+
+def test_client_pool_caps_concurrency(mocker):
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def post(url, headers, data, timeout):
+        with lock:
+            active.append(1)
+            peak.append(len(active))
+        time.sleep(0.05)
+        with lock:
+            active.pop()
+        return _response(429 if data == 'throttled' else 200, '{}')
+
+    transport = mocker.Mock()
+    transport.post.side_effect = post
+    pool = client_pool(max_requests = 2, transport = transport)
+    pool.add_tenant('acme')
+    pool.add_tenant('globex')
+
+    threads = [threading.Thread(target = pool.get_client(tenant).transport.post, args = ('url', {}, data, 30))
+        for tenant, data in [('acme', '{}')] * 4 + [('globex', 'throttled')] * 2]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert max(peak) == 2
+    df = pool.get_metrics().set_index('tenant')
+    assert df.loc['acme', 'requests'] == 4
+    assert df.loc['globex', 'throttled'] == 2
+    assert df.loc['globex', 'errors'] == 2
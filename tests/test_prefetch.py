@@ -0,0 +1,114 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from src.analytics.mayhem.adobe_prefetch import parent_history
+from src.analytics.mayhem.adobe_prefetch import speculative_prefetch
+import time
+from pandas._testing import assert_frame_equal
+from breakdown_mocks import breakdown_mock
+from breakdown_mocks import generate_breakdown_client
+from breakdown_mocks import sample_tree
+
+
+def test_parent_history(tmp_path):
+    history = parent_history(str(tmp_path / 'parents'))
+    report_object = {
+        'rsid': 'test',
+        'globalFilters': [{'type': 'dateRange', 'dateRange': '2020-01-01T00:00:00/2020-01-02T00:00:00'}],
+        'settings': {'limit': '100', 'page': '3'}
+    }
+    key = history.get_report_key(report_object, ['variables/page', 'variables/browser'])
+    assert history.get(key) == {}
+
+    history.put(key, {1: [['a'], ['b']]})
+
+    other_day = {'rsid': 'test', 'globalFilters': [{'type': 'dateRange', 'dateRange': '2020-01-02T00:00:00/2020-01-03T00:00:00'}], 'settings': {}}
+    assert history.get_report_key(other_day, ['variables/page', 'variables/browser']) == key
+    assert history.get(key) == {1: [['a'], ['b']]}
+    assert history.get_report_key(other_day, ['variables/page']) != key
+
+def test_speculative_prefetch():
+    downloads = []
+    def download(path):
+        downloads.append(path)
+        return '/'.join(path)
+
+    with ThreadPoolExecutor(max_workers = 2) as executor:
+        prefetch = speculative_prefetch(download, executor, {1: [['a'], ['b']], 2: [['a', 'x']]})
+        prefetch.start(1)
+        assert prefetch.get(['a']) == 'a'
+        assert prefetch.get(['c']) == 'c'
+        assert prefetch.finish() == 1
+
+    assert (prefetch.hits, prefetch.misses) == (1, 1)
+    assert ['a', 'x'] not in downloads
+
+def test_speculative_prefetch_cancels_queued():
+    release = threading.Event()
+    def download(path):
+        if (path == ['blocked']):
+            release.wait(5)
+        return path[0]
+
+    with ThreadPoolExecutor(max_workers = 1) as executor:
+        prefetch = speculative_prefetch(download, executor, {1: [['blocked'], ['queued']]}, cancel_queued = True)
+        prefetch.start(1)
+        # The only worker is busy, so the queued prefetch is downloaded by the caller
+        assert prefetch.get(['queued']) == 'queued'
+        release.set()
+        assert prefetch.get(['blocked']) == 'blocked'
+
+    assert (prefetch.hits, prefetch.misses) == (1, 1)
+
+def test_get_report_multiple_breakdowns_speculative_prefetch(tmp_path, monkeypatch):
+    client = generate_breakdown_client()
+    history = client.set_speculative_prefetch(parent_history(str(tmp_path)))
+    monkeypatch.setattr(client, "_get_page", breakdown_mock(client, sample_tree()))
+    client.get_report_multiple_breakdowns()
+    assert (history.hits, history.misses, history.discarded) == (0, 6, 0)
+
+    # The next day, parent 3 is replaced by parent 4 under Desktop
+    tree = sample_tree()
+    tree[('20',)] = [('1', 'Paid Search', [5.0, 1.0]), ('4', 'Email', [3.0, 0.0])]
+    tree[('20', '4')] = [('400', 'Exit', [3.0, 0.0])]
+    del tree[('20', '3')]
+    client.set_speculative_prefetch(False)
+    monkeypatch.setattr(client, "_get_page", breakdown_mock(client, tree))
+    expected_df = client.get_report_multiple_breakdowns()
+
+    client.set_speculative_prefetch(history)
+    client.set_date_range('2020-02-01', '2020-02-29')
+    requests_made = []
+    monkeypatch.setattr(client, "_get_page", breakdown_mock(client, tree, requests_made))
+    df = client.get_report_multiple_breakdowns()
+
+    assert_frame_equal(df, expected_df)
+    assert (history.hits, history.misses, history.discarded) == (5, 7, 1)
+    assert ('20', '4') in requests_made
+    key = history.get_report_key(client.report_object, client.dimensions)
+    assert history.get(key)[2] == [['10', '1'], ['10', '2'], ['20', '1'], ['20', '4']]
+
+def test_get_report_multiple_breakdowns_prefetch_paginated_top_level(tmp_path, monkeypatch):
+    # 20 parents over 10 top-level pages, while the prefetched children are downloaded concurrently
+    tree = {(): [(str(item), 'Item {}'.format(item), [float(item), 0.0]) for item in range(1, 21)]}
+    for item in range(1, 21):
+        tree[(str(item),)] = [('100', 'Home', [float(item), 0.0])]
+    client = generate_breakdown_client(levels = 2)
+    client.set_limit(2)
+    expected_df = None
+    history = client.set_speculative_prefetch(parent_history(str(tmp_path)))
+    for run in range(2):
+        serve = breakdown_mock(client, tree)
+        def get_page(report_object = None):
+            if (report_object is None or len(report_object['metricContainer'].get('metricFilters', [])) == 0):
+                # Slow top-level pages let the prefetched requests run in between
+                time.sleep(0.01)
+            return serve(report_object)
+        monkeypatch.setattr(client, "_get_page", get_page)
+        df = client.get_report_multiple_breakdowns()
+        if (expected_df is None):
+            expected_df = df
+
+    assert list(df['itemId_lvl_1']) == [str(item) for item in range(1, 21)]
+    assert history.hits == 20
+    assert client.report_object['settings'].get('page', '0') == '0'
+    assert_frame_equal(df, expected_df)
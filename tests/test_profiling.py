@@ -0,0 +1,86 @@
+import time
+import threading
+import tracemalloc
+from src.analytics.mayhem.adobe_profiling import report_profiler
+from src.analytics.mayhem.adobe_profiling import profile_phase
+from breakdown_mocks import breakdown_mock
+from breakdown_mocks import generate_breakdown_client
+from breakdown_mocks import sample_tree
+
+
+def test_nested_phases():
+    profiler = report_profiler()
+    with profiler:
+        assert tracemalloc.is_tracing()
+        with profiler.phase('level_1'):
+            with profiler.phase('network'):
+                time.sleep(0.02)
+            with profiler.phase('network'):
+                pass
+            with profiler.phase('format_output'):
+                data = [0] * 100000
+    assert not tracemalloc.is_tracing()
+
+    assert profiler.stacks[('level_1', 'network')][0] == 2
+    assert profiler.stacks[('level_1', 'format_output')][3] > 0
+
+    df = profiler.get_summary()
+    assert list(df.columns) == ['phase', 'calls', 'wall_time', 'self_wall_time', 'cpu_time', 'allocated_bytes']
+    assert list(df['phase'])[:2] == ['level_1', 'level_1;network']
+    level = df[df['phase'] == 'level_1'].iloc[0]
+    assert level['self_wall_time'] < level['wall_time']
+
+def test_summary_by_phase():
+    profiler = report_profiler(trace_allocations = False)
+    for level in ['level_1', 'level_2']:
+        with profiler.phase(level):
+            with profiler.phase('network'):
+                pass
+
+    df = profiler.get_summary(by = 'phase')
+    assert sorted(df['phase']) == ['level_1', 'level_2', 'network']
+    assert df[df['phase'] == 'network']['calls'].iloc[0] == 2
+    assert df['allocated_bytes'].sum() == 0
+
+def test_phases_per_thread():
+    profiler = report_profiler(trace_allocations = False)
+    def worker():
+        with profiler.phase('network'):
+            pass
+    with profiler.phase('level_1'):
+        thread = threading.Thread(target = worker)
+        thread.start()
+        thread.join()
+
+    assert set(profiler.stacks) == {('level_1',), ('network',)}
+
+def test_collapsed_stacks(tmp_path):
+    profiler = report_profiler(trace_allocations = False)
+    with profiler.phase('level_1'):
+        with profiler.phase('network'):
+            time.sleep(0.01)
+
+    lines = profiler.get_collapsed_stacks().splitlines()
+    assert [line.split(' ')[0] for line in lines] == ['level_1', 'level_1;network']
+    assert int(lines[1].split(' ')[1]) >= 10000
+
+    path = str(tmp_path / 'stacks.txt')
+    profiler.write_collapsed_stacks(path)
+    assert open(path).read().splitlines() == lines
+
+def test_profile_phase_without_profiler():
+    with profile_phase(None, 'network'):
+        pass
+
+def test_get_report_multiple_breakdowns_profile(monkeypatch):
+    client = generate_breakdown_client()
+    monkeypatch.setattr(client, "_get_page", breakdown_mock(client, sample_tree()))
+
+    with client.profile() as profiler:
+        client.get_report_multiple_breakdowns()
+    assert client.profiler is None
+
+    df = profiler.get_summary()
+    phases = set(df['phase'])
+    assert {'level_1', 'level_1;json_decode', 'level_2;format_output', 'level_3;concat', 'assemble'} <= phases
+    assert df[df['phase'] == 'level_3']['calls'].iloc[0] == 4
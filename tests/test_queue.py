@@ -0,0 +1,93 @@
+import time
+import pytest
+import pandas as pd
+from src.analytics.mayhem.adobe_queue import work_queue
+from src.analytics.mayhem.adobe_queue import sqlite_work_queue
+import threading
+from pandas._testing import assert_frame_equal
+from breakdown_mocks import breakdown_mock
+from breakdown_mocks import generate_breakdown_client
+from breakdown_mocks import sample_tree
+from breakdown_mocks import generate_client
+
+def test_claim_and_complete(tmp_path):
+    queue = sqlite_work_queue(str(tmp_path / 'queue.sqlite'))
+    job_id = queue.add_job({'dimensions': ['variables/page']})
+
+    assert queue.get_job(job_id) == {'dimensions': ['variables/page']}
+    unit = queue.claim(job_id)
+    assert (unit.path, unit.page) == ([], 0)
+    assert queue.claim(job_id) is None
+
+    result = pd.DataFrame({'itemId': ['1']})
+    assert queue.complete(unit, result, [([], 1), (['1'], 0), (['1'], 0)])
+    assert queue.get_job_status(job_id) == {'done': 1, 'pending': 2}
+
+    units = [queue.claim(job_id), queue.claim(job_id)]
+    assert [(u.path, u.page) for u in units] == [([], 1), (['1'], 0)]
+    for u in units:
+        queue.complete(u, result, [])
+
+    assert queue.is_job_done(job_id)
+    results = queue.get_results(job_id)
+    assert [(path, page) for path, page, df in results] == [([], 0), ([], 1), (['1'], 0)]
+    assert results[0][2].equals(result)
+
+def test_expired_leases_are_claimed_again(tmp_path):
+    queue = sqlite_work_queue(str(tmp_path / 'queue.sqlite'))
+    job_id = queue.add_job({})
+
+    unit = queue.claim(job_id, lease_seconds = 0.05)
+    time.sleep(0.1)
+    second_unit = queue.claim(job_id)
+
+    assert second_unit.unit_id == unit.unit_id
+    # The first worker lost its lease
+    assert not queue.complete(unit, 'stale result', [])
+    assert queue.complete(second_unit, 'result', [])
+    assert [result for path, page, result in queue.get_results(job_id)] == ['result']
+
+def test_failed_units(tmp_path):
+    queue = sqlite_work_queue(str(tmp_path / 'queue.sqlite'), max_attempts = 2)
+    job_id = queue.add_job({})
+
+    queue.fail(queue.claim(job_id))
+    queue.fail(queue.claim(job_id))
+
+    assert queue.claim(job_id) is None
+    assert queue.get_job_status(job_id) == {'failed': 1}
+    assert queue.is_job_done(job_id)
+
+def test_incomplete_queue_cannot_be_created():
+    class claim_only_queue(work_queue):
+        def claim(self, job_id = None, lease_seconds = 600):
+            return None
+
+    with pytest.raises(TypeError):
+        claim_only_queue()
+
+def test_breakdown_job_with_workers(tmp_path, monkeypatch):
+    client = generate_breakdown_client()
+    client.set_limit(1)
+    monkeypatch.setattr(client, "_get_page", breakdown_mock(client, sample_tree()))
+    expected_df = client.get_report_multiple_breakdowns()
+
+    queue = sqlite_work_queue(str(tmp_path / 'queue.sqlite'))
+    job_id = client.enqueue_breakdown_job(queue)
+
+    # Workers only need credentials; the report specification is read from the queue
+    workers = []
+    for i in range(3):
+        worker = generate_client()
+        monkeypatch.setattr(worker, "_get_page", breakdown_mock(worker, sample_tree()))
+        workers.append(worker)
+    threads = [threading.Thread(target = worker.run_breakdown_worker, args = (queue, job_id)) for worker in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Units discovered after a worker stopped are picked up by another run
+    workers[0].run_breakdown_worker(queue, job_id)
+
+    assert queue.get_job_status(job_id) == {'done': 11}
+    assert_frame_equal(client.assemble_breakdown_job(queue, job_id), expected_df)
@@ -0,0 +1,74 @@
+import time
+import multiprocessing
+import requests
+from src.analytics.mayhem.adobe import analytics_client
+from src.analytics.mayhem.adobe_ratelimit import shared_rate_limiter
+
+def _acquire_in_process(path, requests_per_process, timestamps_path):
+    limiter = shared_rate_limiter(path, rate = 20, burst = 2)
+    for i in range(requests_per_process):
+        limiter.acquire('company')
+        with open(timestamps_path, 'a') as timestamps:
+            timestamps.write('{}\n'.format(time.time()))
+
+def test_burst_then_wait(tmp_path):
+    limiter = shared_rate_limiter(str(tmp_path / 'limits.sqlite'), rate = 10, burst = 3)
+
+    assert [limiter.try_acquire('company') for i in range(3)] == [0.0, 0.0, 0.0]
+    wait = limiter.try_acquire('company')
+    assert 0 < wait <= 0.1
+    # Keys have independent buckets
+    assert limiter.try_acquire('other_company') == 0.0
+
+def test_rate_adapts_to_429(tmp_path):
+    limiter = shared_rate_limiter(str(tmp_path / 'limits.sqlite'), rate = 4, burst = 5, decrease_factor = 0.5, increase_step = 1)
+
+    limiter.record_response('company', 429)
+    assert limiter.get_rate('company') == 2
+    # All requests pause for one request interval after a 429
+    assert 0.4 < limiter.try_acquire('company') <= 0.5
+
+    limiter.record_response('company', 200)
+    limiter.record_response('company', 200)
+    limiter.record_response('company', 200)
+    assert limiter.get_rate('company') == 4
+
+def test_rate_is_shared_across_processes(tmp_path):
+    path = str(tmp_path / 'limits.sqlite')
+    timestamps_path = str(tmp_path / 'timestamps')
+    shared_rate_limiter(path, rate = 20, burst = 2)
+    processes = [multiprocessing.Process(target = _acquire_in_process, args = (path, 5, timestamps_path)) for i in range(4)]
+    start = time.time()
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    with open(timestamps_path) as timestamps:
+        assert len(timestamps.readlines()) == 20
+    # 2 burst requests, then 18 requests at 20 per second
+    assert time.time() - start >= 0.85
+
+def test_client_consults_rate_limiter(tmp_path, mocker):
+    limiter = shared_rate_limiter(str(tmp_path / 'limits.sqlite'))
+    limiter.acquire = mocker.Mock(return_value = 0)
+    limiter.record_response = mocker.Mock()
+    sleep = mocker.patch("time.sleep")
+
+    client = analytics_client(client_id = 'fake_client_id', account_id = 'fake_account_id')
+    client._get_request_headers = mocker.Mock(return_value = 'test headers')
+    client.set_rate_limiter(limiter)
+
+    too_many_requests = requests.Response()
+    too_many_requests.status_code = 429
+    too_many_requests._content = b'{"error_code":"429050","message":"Too many requests"}'
+    success = requests.Response()
+    success.status_code = 200
+    success._content = b'success message'
+    mocker.patch("requests.post", side_effect = [too_many_requests, success])
+
+    assert client._get_page().text == 'success message'
+    assert limiter.acquire.call_count == 2
+    limiter.acquire.assert_called_with('fake_account_id')
+    assert [c[0][1] for c in limiter.record_response.call_args_list] == [429, 200]
+    sleep.assert_not_called()
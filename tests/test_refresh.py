@@ -0,0 +1,116 @@
+from datetime import datetime
+import pandas as pd
+from src.analytics.mayhem.adobe import breakdown_tree
+from src.analytics.mayhem.adobe_refresh import breakdown_store
+from src.analytics.mayhem.adobe_refresh import breakdown_refresh
+from src.analytics.mayhem.adobe_refresh import get_date_range
+import pytest
+from pandas._testing import assert_frame_equal
+from src.analytics.mayhem.adobe_pipeline import report_pipeline
+from breakdown_mocks import breakdown_mock
+from breakdown_mocks import generate_breakdown_client
+from breakdown_mocks import sample_tree
+
+
+def _tree():
+    tree = breakdown_tree()
+    tree.add_level(pd.DataFrame({'itemId': ['b', 'a'], 'value': ['B', 'A'], 'metrics/visits': [3.0, 2.0]}))
+    tree.add_level(pd.DataFrame({'itemId': ['x', 'y', 'x'], 'value': ['X', 'Y', 'X'], 'metrics/visits': [1.0, 2.0, 2.0], 'parent': [0, 0, 1]}))
+    return tree
+
+def test_breakdown_store(tmp_path):
+    store = breakdown_store(str(tmp_path / 'breakdowns'))
+    assert store.get('key') == []
+
+    store.put('key', _tree().get_level_frames())
+    levels = store.get('key')
+    assert list(levels[1].columns) == ['path', 'itemId', 'value', 'metrics/visits']
+    assert list(levels[1]['path']) == [('b', 'x'), ('b', 'y'), ('a', 'x')]
+
+def test_breakdown_store_date_range(tmp_path):
+    store = breakdown_store(str(tmp_path / 'breakdowns'))
+    january = get_date_range({'globalFilters': [{'type': 'dateRange', 'dateRange': '2020-01-01T00:00:00.000/2020-02-01T00:00:00.000'}]})
+    assert january == (datetime(2020, 1, 1), datetime(2020, 2, 1))
+    store.put('key', _tree().get_level_frames(), january)
+
+    # Same period or extended period
+    assert len(store.get('key', january)) == 2
+    assert len(store.get('key', (datetime(2020, 1, 1), datetime(2020, 2, 15)))) == 2
+    # Other periods, shorter periods and unknown periods
+    assert store.get('key', (datetime(2020, 2, 1), datetime(2020, 3, 1))) == []
+    assert store.get('key', (datetime(2019, 12, 1), datetime(2020, 2, 1))) == []
+    assert store.get('key', (datetime(2020, 1, 1), datetime(2020, 1, 15))) == []
+    assert store.get('key') == []
+
+def test_breakdown_refresh():
+    refresh = breakdown_refresh(_tree().get_level_frames())
+
+    children = refresh.get_children(2, ['b'], [3.0])
+    assert list(children['itemId']) == ['x', 'y']
+    assert list(children.columns) == ['itemId', 'value', 'metrics/visits']
+    # Changed metrics, new parents and levels that were not stored are downloaded
+    assert refresh.get_children(2, ['b'], [4.0]) is None
+    assert refresh.get_children(2, ['c'], [3.0]) is None
+    assert refresh.get_children(3, ['b', 'x'], [1.0]) is None
+
+    downloads = []
+    tree = _tree()
+    df = refresh.get_node(tree, 1, 1, lambda tree, parent_level, parent: downloads.append(parent))
+    assert list(df['metrics/visits']) == [2.0]
+    assert downloads == [] and refresh.reused == 1
+
+@pytest.mark.parametrize('pipelined', [False, True])
+def test_get_report_multiple_breakdowns_refresh(tmp_path, monkeypatch, pipelined):
+    client = generate_breakdown_client()
+    if pipelined:
+        client.set_pipeline(report_pipeline(fetch_workers = 2, breakdown_workers = 2))
+    store = client.set_refresh_store(breakdown_store(str(tmp_path)))
+    monkeypatch.setattr(client, "_get_page", breakdown_mock(client, sample_tree()))
+    client.get_report_multiple_breakdowns()
+    assert (store.reused, store.downloaded) == (0, 6)
+
+    # Reprocessing adds a visit to Desktop / Display / Checkout
+    tree = sample_tree()
+    tree[()] = [('10', 'Mobile', [10.0, 1.0]), ('20', 'Desktop', [21.0, 2.0])]
+    tree[('20',)] = [('1', 'Paid Search', [5.0, 1.0]), ('3', 'Display', [16.0, 1.0])]
+    tree[('20', '3')] = [('300', 'Checkout', [16.0, 1.0])]
+    client.set_refresh_store(False)
+    monkeypatch.setattr(client, "_get_page", breakdown_mock(client, tree))
+    expected_df = client.get_report_multiple_breakdowns()
+
+    client.set_refresh_store(store)
+    requests_made = []
+    monkeypatch.setattr(client, "_get_page", breakdown_mock(client, tree, requests_made))
+    df = client.get_report_multiple_breakdowns()
+
+    assert_frame_equal(df, expected_df)
+    assert sorted(requests_made) == [(), ('20',), ('20', '3')]
+    assert (store.reused, store.downloaded) == (4, 8)
+
+def test_get_report_multiple_breakdowns_refresh_other_period(tmp_path, monkeypatch):
+    client = generate_breakdown_client()
+    store = client.set_refresh_store(breakdown_store(str(tmp_path)))
+    monkeypatch.setattr(client, "_get_page", breakdown_mock(client, sample_tree()))
+    client.get_report_multiple_breakdowns()
+
+    # The parents of another month have the same metrics, but not the same children
+    tree = sample_tree()
+    tree[('20', '3')] = [('400', 'Exit', [15.0, 1.0])]
+    client.report_object['globalFilters'] = []
+    client.set_date_range('2020-02-01', '2020-02-29')
+    requests_made = []
+    monkeypatch.setattr(client, "_get_page", breakdown_mock(client, tree, requests_made))
+    df = client.get_report_multiple_breakdowns()
+
+    assert len(requests_made) == 7
+    assert 'Exit' in list(df['value_lvl_3'])
+    assert (store.reused, store.downloaded) == (0, 12)
+
+    # A range extending the stored month reuses the unchanged subtrees
+    client.report_object['globalFilters'] = []
+    client.set_date_range('2020-02-01', '2020-03-15')
+    requests_made = []
+    monkeypatch.setattr(client, "_get_page", breakdown_mock(client, tree, requests_made))
+    client.get_report_multiple_breakdowns()
+    assert requests_made == [()]
+    assert store.reused == 6
@@ -0,0 +1,82 @@
+import json
+import requests
+import pytest
+from src.analytics.mayhem.adobe import analytics_client
+from src.analytics.mayhem.adobe_replay import recording_transport
+from src.analytics.mayhem.adobe_replay import replay_server
+from src.analytics.mayhem.adobe_replay import read_archive
+from src.analytics.mayhem.adobe_transport import requests_transport
+
+def _response(status_code, text):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = text.encode('utf-8')
+    return response
+
+class _fake_transport:
+    def __init__(self, responses):
+        self.responses = list(responses)
+
+    def post(self, url, headers, data, timeout):
+        response = self.responses.pop(0)
+        if (isinstance(response, Exception)):
+            raise response
+        return response
+
+def _record(path):
+    inner = _fake_transport([
+        _response(429, '{"error_code":"429050","message":"Too many requests"}'),
+        _response(200, '{"page": 0}'),
+        _response(200, '{"page": 1}'),
+        requests.exceptions.Timeout('timed out')
+    ])
+    with recording_transport(path, inner) as transport:
+        assert transport.post('https://analytics.adobe.io/api/x/reports', {'Authorization': 'Bearer secret'}, '{"page": 0, "rsid": "a"}', 30).status_code == 429
+        assert transport.post('https://analytics.adobe.io/api/x/reports', {}, '{"rsid": "a", "page": 0}', 30).text == '{"page": 0}'
+        transport.post('https://analytics.adobe.io/api/x/reports', {}, '{"rsid": "a", "page": 1}', 30)
+        with pytest.raises(requests.exceptions.Timeout):
+            transport.post('https://analytics.adobe.io/api/x/reports', {}, '{"rsid": "a", "page": 2}', 30)
+        assert transport.requests == 4
+
+def test_recording_transport(tmp_path):
+    path = str(tmp_path / 'archive.jsonl.gz')
+    _record(path)
+
+    entries = read_archive(path)
+    assert [entry.get('status') for entry in entries] == [429, 200, 200, None]
+    assert entries[3]['error'] == 'Timeout'
+    assert all(entry['elapsed'] >= 0 and entry['started'] >= 0 for entry in entries)
+    assert 'secret' not in json.dumps(entries)
+
+def test_replay_server(tmp_path):
+    path = str(tmp_path / 'archive.jsonl.gz')
+    _record(path)
+
+    transport = requests_transport()
+    with replay_server(path, latency_scale = 0) as server:
+        # Identical requests replay the recorded sequence: 429 and then the successful retry
+        assert transport.post(server.url, {}, '{"rsid": "a", "page": 0}', 5).status_code == 429
+        response = transport.post(server.url, {}, '{"rsid": "a", "page": 0}', 5)
+        assert (response.status_code, response.json()) == (200, {'page': 0})
+        assert transport.post(server.url, {}, '{"rsid": "a", "page": 0}', 5).json() == {'page': 0}
+        assert transport.post(server.url, {}, '{"rsid": "a", "page": 1}', 5).json() == {'page': 1}
+        with pytest.raises(requests.exceptions.ConnectionError):
+            transport.post(server.url, {}, '{"rsid": "a", "page": 2}', 5)
+        assert transport.post(server.url, {}, '{"rsid": "b"}', 5).status_code == 404
+
+    assert (server.requests, server.unmatched) == (6, 1)
+
+def test_replay_client(tmp_path, mocker):
+    mocker.patch("time.sleep")
+    path = str(tmp_path / 'archive.jsonl.gz')
+    client = analytics_client(client_id = 'fake_client_id', account_id = 'fake_account_id')
+    client._get_request_headers = mocker.Mock(return_value = {'Authorization': 'Bearer secret'})
+    client.set_transport(recording_transport(path, _fake_transport([_response(429, '{}'), _response(200, '{"rows": []}')])))
+    assert client._get_page().text == '{"rows": []}'
+    client.transport.close()
+
+    client.set_transport()
+    with replay_server(path, latency_scale = 0) as server:
+        client.analytics_url = server.url
+        assert client._get_page().text == '{"rows": []}'
+    assert server.requests == 2
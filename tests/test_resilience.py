@@ -0,0 +1,142 @@
+import time
+import threading
+import requests
+import pytest
+from src.analytics.mayhem.adobe import analytics_client
+from src.analytics.mayhem.adobe_resilience import retry_policy
+from src.analytics.mayhem.adobe_resilience import circuit_breaker
+
+def _response(status_code, text):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = text.encode('utf-8')
+    return response
+
+def _generate_adobe_client(mocker):
+    client = analytics_client(client_id = 'fake_client_id', account_id = 'fake_account_id')
+    client._get_request_headers = mocker.Mock(return_value = 'test headers')
+    return client
+
+def test_retry_delay_is_jittered():
+    policy = retry_policy(base_delay = 1, max_delay = 5)
+    delays = [policy.get_delay(3) for i in range(50)]
+
+    assert all(0 <= delay <= 5 for delay in delays)
+    assert len(set(delays)) > 1
+    assert policy.should_retry(2)
+    assert not policy.should_retry(3)
+
+def test_hedge_delay():
+    policy = retry_policy(min_hedge_samples = 5, hedge_percentile = 50)
+    assert policy.get_hedge_delay() is None
+
+    for latency in [1, 2, 3, 4, 5]:
+        policy.record_latency(latency)
+    assert policy.get_hedge_delay() == 3
+    assert retry_policy(hedge = False, min_hedge_samples = 0).get_hedge_delay() is None
+
+def test_server_errors_and_timeouts_are_retried(mocker):
+    client = _generate_adobe_client(mocker)
+    client.set_retry_policy(retry_policy(max_retries = 3, hedge = False))
+    sleep = mocker.patch("time.sleep")
+    mocker.patch("requests.post", side_effect = [
+        _response(502, 'bad gateway'), 
+        requests.exceptions.ReadTimeout('timeout'), 
+        _response(200, 'success message')
+    ])
+
+    assert client._get_page().text == 'success message'
+    assert client.retry_policy.retries == 2
+    # Two back-off delays and the pacing after the successful request
+    assert sleep.call_count == 3
+
+def test_retries_are_limited(mocker):
+    client = _generate_adobe_client(mocker)
+    client.set_retry_policy(retry_policy(max_retries = 1, hedge = False))
+    mocker.patch("time.sleep")
+    mocker.patch("requests.post", side_effect = [_response(503, 'unavailable'), _response(503, 'unavailable')])
+
+    with pytest.raises(requests.exceptions.HTTPError) as e:
+        client._get_page()
+    assert e.value.response.status_code == 503
+
+    # Client errors are not retried
+    post = mocker.patch("requests.post", return_value = _response(400, 'error message'))
+    with pytest.raises(requests.exceptions.HTTPError):
+        client._get_page()
+    assert post.call_count == 1
+
+def test_hedged_request(mocker):
+    client = _generate_adobe_client(mocker)
+    policy = retry_policy(min_hedge_samples = 1, hedge_percentile = 50)
+    policy.record_latency(0.05)
+    client.set_retry_policy(policy)
+    client.set_rate_limiter(None)
+    mocker.patch("time.sleep")
+
+    release_slow_request = threading.Event()
+    slow_response = _response(200, 'slow response')
+    slow_response_closed = threading.Event()
+    slow_response.close = mocker.Mock(side_effect = slow_response_closed.set)
+    calls = []
+    def post(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            release_slow_request.wait(5)
+            return slow_response
+        return _response(200, 'hedged response')
+    mocker.patch("requests.post", side_effect = post)
+
+    assert client._get_page().text == 'hedged response'
+    assert policy.hedges == 1
+    release_slow_request.set()
+    # The slower copy is closed when it completes
+    assert slow_response_closed.wait(5)
+
+def test_circuit_breaker_opens_and_recovers():
+    breaker = circuit_breaker(error_threshold = 0.5, window = 4, min_requests = 4, cooldown = 0.1)
+    for success in [True, False, True]:
+        breaker.record(success)
+    assert not breaker.is_open()
+
+    breaker.record(False)
+    assert breaker.is_open()
+    start = time.time()
+    breaker.wait()
+    assert time.time() - start >= 0.05
+
+    # Half-open: an error opens the breaker again, a success closes it
+    breaker.record(False)
+    assert breaker.is_open()
+    breaker.wait()
+    breaker.record(True)
+    assert not breaker.is_open()
+    assert breaker.times_opened == 2
+
+def test_half_open_circuit_breaker_admits_one_probe():
+    breaker = circuit_breaker(error_threshold = 0.5, window = 2, min_requests = 2, cooldown = 0.1)
+    breaker.record(False)
+    breaker.record(False)
+    breaker.wait()
+
+    # The probe is in flight: other requests wait for its outcome
+    admitted = threading.Event()
+    waiter = threading.Thread(target = lambda: (breaker.wait(), admitted.set()))
+    waiter.start()
+    assert not admitted.wait(0.05)
+    breaker.record(True)
+    assert admitted.wait(1)
+    waiter.join()
+    assert not breaker.half_open
+
+def test_client_reports_to_circuit_breaker(mocker):
+    client = _generate_adobe_client(mocker)
+    breaker = circuit_breaker(min_requests = 2, window = 2, cooldown = 10)
+    client.set_circuit_breaker(breaker)
+    mocker.patch("time.sleep")
+    mocker.patch("requests.post", return_value = _response(500, 'error'))
+
+    for i in range(2):
+        with pytest.raises(requests.exceptions.HTTPError):
+            client._get_page()
+    assert breaker.is_open()
@@ -0,0 +1,112 @@
+import json
+import requests
+import pandas as pd
+import pytest
+from pandas._testing import assert_frame_equal
+from src.analytics.mayhem.adobe import analytics_client
+from src.analytics.mayhem.adobe_rollup import time_rollup
+from src.analytics.mayhem.adobe_rollup import is_additive_metric
+from src.analytics.mayhem.adobe_rollup import rollup_daily_report
+from src.analytics.mayhem.adobe_rollup import get_item_dates
+from src.analytics.mayhem.adobe_rollup import get_date_item_ids
+
+def _daily_report():
+    # 2020-01-30 (Thursday) to 2020-02-03 (Monday)
+    return pd.DataFrame({
+        'itemId': ['1200030', '1200031', '1200101', '1200102', '1200103'],
+        'value': ['Jan 30, 2020', 'Jan 31, 2020', 'Feb 1, 2020', 'Feb 2, 2020', 'Feb 3, 2020'],
+        'metrics/visits': [1.0, 2.0, 3.0, 4.0, 5.0],
+        'metrics/orders': [0.0, 1.0, 0.0, 1.0, 0.0]
+    })
+
+def _response(rows, metric_count):
+    response = requests.Response()
+    response.status_code = 200
+    response._content = json.dumps({
+        'totalPages': 1, 'lastPage': True, 'numberOfElements': len(rows), 'totalElements': len(rows),
+        'columns': {'columnIds': [str(idx) for idx in range(metric_count)]},
+        'rows': rows
+    }).encode('utf-8')
+    return response
+
+def _generate_client(metrics):
+    client = analytics_client(client_id = 'fake_client_id', account_id = 'fake_account_id')
+    client.set_report_suite('test_suite')
+    for metric in metrics:
+        client.add_metric(metric)
+    client.add_dimension('variables/page')
+    client.set_date_range('2020-01-30', '2020-02-03')
+    return client
+
+def test_is_additive_metric():
+    assert is_additive_metric('metrics/visits')
+    assert is_additive_metric('metrics/event3')
+    assert not is_additive_metric('metrics/visitors')
+    assert not is_additive_metric('metrics/bouncerate')
+    assert not is_additive_metric('metrics/averagetimespentonsite')
+    assert not is_additive_metric('cm300000_5f6b1c')
+
+def test_item_dates():
+    dates = get_item_dates(['1191131', '1200001', '1200129'])
+    assert list(dates.dt.strftime('%Y-%m-%d')) == ['2019-12-31', '2020-01-01', '2020-02-29']
+    assert list(get_date_item_ids(dates)) == ['1191131', '1200001', '1200129']
+
+def test_rollup_daily_report():
+    df = rollup_daily_report(_daily_report(), 'week')
+    assert list(df['itemId']) == ['1200026', '1200102']
+    assert list(df['value']) == ['Jan 26, 2020', 'Feb 2, 2020']
+    assert list(df['metrics/visits']) == [6.0, 9.0]
+
+    df = rollup_daily_report(_daily_report(), 'week', week_start = 0)
+    assert list(df['value']) == ['Jan 27, 2020', 'Feb 3, 2020']
+
+    df = rollup_daily_report(_daily_report(), 'month')
+    assert list(df.columns) == ['itemId', 'value', 'metrics/visits', 'metrics/orders']
+    assert list(df['itemId']) == ['1200001', '1200101']
+    assert list(df['value']) == ['Jan 2020', 'Feb 2020']
+    assert list(df['metrics/orders']) == [1.0, 1.0]
+
+    assert list(rollup_daily_report(_daily_report(), 'quarter')['value']) == ['Q1 2020']
+    assert list(rollup_daily_report(_daily_report(), 'year')['metrics/visits']) == [15.0]
+
+def test_rollup_empty_report():
+    empty = pd.DataFrame({'itemId': ['0'], 'value': ['Unspecified'], 'metrics/visits': [0]})
+    df = rollup_daily_report(empty, 'month')
+    assert list(df['value']) == ['Unspecified']
+
+def test_time_rollup(monkeypatch):
+    client = _generate_client(['metrics/visits', 'metrics/visitors'])
+    report_objects = []
+    def get_page(report_object = None):
+        report_objects.append(report_object)
+        metrics = [metric['id'] for metric in report_object['metricContainer']['metrics']]
+        assert len(metrics) == 1
+        if (report_object['dimension'] == 'variables/daterangeday'):
+            daily = _daily_report()
+            rows = [{'itemId': item_id, 'value': value, 'data': [visits]} for item_id, value, visits in zip(daily['itemId'], daily['value'], daily['metrics/visits'])]
+        else:
+            assert metrics == ['metrics/visitors']
+            rows = [{'itemId': '1200001', 'value': 'Jan 2020', 'data': [2.0]}, {'itemId': '1200101', 'value': 'Feb 2020', 'data': [3.0]}]
+        return _response(rows, len(metrics))
+    monkeypatch.setattr(client, '_get_page', get_page)
+    rollup = time_rollup()
+
+    reports = rollup.get_reports(client, ['variables/daterangemonth', 'variables/daterangeday'])
+
+    expected_month = pd.DataFrame({
+        'itemId': ['1200001', '1200101'],
+        'value': ['Jan 2020', 'Feb 2020'],
+        'metrics/visits': [3.0, 12.0],
+        'metrics/visitors': [2.0, 3.0]
+    })
+    assert_frame_equal(reports['variables/daterangemonth'].astype({'itemId': object, 'value': object}), expected_month.astype({'itemId': object, 'value': object}))
+    # The daily report is downloaded once; the day dimension still needs the visitors from the API
+    assert [report_object['dimension'] for report_object in report_objects] == ['variables/daterangeday', 'variables/daterangemonth', 'variables/daterangeday']
+    assert rollup.api_requests == 3
+    assert list(reports['variables/daterangeday']['metrics/visits']) == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert report_objects[2]['metricContainer']['metrics'][0]['id'] == 'metrics/visitors'
+    assert client.report_object['dimension'] == 'variables/page'
+
+def test_time_rollup_requires_time_dimension():
+    with pytest.raises(ValueError):
+        time_rollup().get_report(_generate_client(['metrics/visits']), 'variables/page')
@@ -0,0 +1,101 @@
+import numpy as np
+from src.analytics.mayhem.adobe_scheduling import subtree_scheduler
+from pandas._testing import assert_frame_equal
+from src.analytics.mayhem.adobe import breakdown_tree
+from src.analytics.mayhem.adobe_pipeline import report_pipeline
+from breakdown_mocks import breakdown_mock
+from breakdown_mocks import generate_breakdown_client
+from breakdown_mocks import sample_tree
+
+
+def _level_table():
+    return {
+        'code': np.array([0, 1, 2]),
+        'parent': np.array([-1, -1, -1]),
+        'metrics/orders': np.array([9.0, 0.0, 1.0]),
+        'metrics/visits': np.array([10.0, 40.0, np.nan])
+    }
+
+def test_cost_values():
+    assert list(subtree_scheduler().get_cost_values(_level_table())) == [9.0, 0.0, 1.0]
+    assert list(subtree_scheduler('metrics/visits').get_cost_values(_level_table())) == [10.0, 40.0, 0.0]
+    assert list(subtree_scheduler().get_cost_values({'code': np.array([0, 1]), 'parent': np.array([0, 0])})) == [0.0, 0.0]
+
+def test_order_and_estimates():
+    scheduler = subtree_scheduler(smoothing = 0.5)
+    cost_values = np.array([10.0, 40.0, 0.0, 40.0])
+
+    assert np.isnan(scheduler.estimate_rows(2, cost_values)).all()
+    order = scheduler.get_order(2, cost_values)
+    assert list(order) == [1, 3, 0, 2]
+
+    scheduler.record(2, cost_values, order, actual_rows = [5, 20, 0, 20], limit = 10,
+        started = [0.0, 0.0, 1.0, 0.0], finished = [1.0, 2.0, 2.0, 2.0])
+    assert scheduler.levels[2]['rows_per_metric'] == 0.5
+    assert scheduler.levels[2]['seconds_per_page'] == 1.0
+    assert list(scheduler.estimate_rows(2, cost_values)) == [5.0, 20.0, 1.0, 20.0]
+
+    schedule = scheduler.last_schedule
+    assert list(schedule['rank']) == [2, 0, 3, 1]
+    assert list(schedule['actual_pages']) == [1, 2, 1, 2]
+    assert schedule['predicted_rows'].isna().all()
+
+    scheduler.record(2, cost_values, order, actual_rows = [10, 40, 0, 40], limit = 10,
+        started = [0.0] * 4, finished = [1.0] * 4)
+    assert scheduler.levels[2]['rows_per_metric'] == 0.75
+    assert len(scheduler.last_schedule) == 8
+    assert list(scheduler.last_schedule['predicted_rows'][4:]) == [5.0, 20.0, 1.0, 20.0]
+
+    scheduler.start_run()
+    assert scheduler.last_schedule is None
+
+def test_get_report_multiple_breakdowns_scheduled(monkeypatch):
+    client = generate_breakdown_client()
+    monkeypatch.setattr(client, "_get_page", breakdown_mock(client, sample_tree()))
+    expected_df = client.get_report_multiple_breakdowns()
+
+    scheduler = client.set_scheduler(subtree_scheduler('metrics/visits'))
+    requests_made = []
+    monkeypatch.setattr(client, "_get_page", breakdown_mock(client, sample_tree(), requests_made))
+    with report_pipeline(breakdown_workers = 1) as pipeline:
+        client.set_pipeline(pipeline)
+        df = client.get_report_multiple_breakdowns()
+
+    assert_frame_equal(df, expected_df)
+    # Largest parents (by visits) first
+    assert requests_made == [(), ('20',), ('10',), ('20', '3'), ('10', '2'), ('20', '1'), ('10', '1')]
+    schedule = scheduler.last_schedule
+    assert list(schedule['level']) == [2, 2, 3, 3, 3, 3]
+    assert list(schedule['actual_rows']) == [2, 2, 1, 2, 1, 1]
+    assert (schedule['finished'] >= schedule['started']).all()
+    assert scheduler.levels[2]['rows_per_metric'] == 4 / 30
+
+def test_get_report_multiple_breakdowns_scheduled_window(monkeypatch):
+    tree = {(): [(str(item), 'Item {}'.format(item), [float(item), 0.0]) for item in range(1, 21)]}
+    for item in range(1, 21):
+        tree[(str(item),)] = [('100', 'Home', [float(item), 0.0])]
+    client = generate_breakdown_client(levels = 2)
+    monkeypatch.setattr(client, "_get_page", breakdown_mock(client, tree))
+    expected_df = client.get_report_multiple_breakdowns()
+
+    client.set_scheduler(subtree_scheduler('metrics/visits'))
+    started = []
+    consumed = []
+    get_breakdown_node = client._get_breakdown_node
+    def counted_breakdown_node(*args):
+        started.append(len(started) - len(consumed))
+        return get_breakdown_node(*args)
+    monkeypatch.setattr(client, "_get_breakdown_node", counted_breakdown_node)
+    append_to_level = breakdown_tree.append_to_level
+    def counted_append_to_level(tree, df):
+        consumed.append(1)
+        return append_to_level(tree, df)
+    monkeypatch.setattr(breakdown_tree, "append_to_level", counted_append_to_level)
+    with report_pipeline(breakdown_workers = 1, queue_size = 2) as pipeline:
+        client.set_pipeline(pipeline)
+        df = client.get_report_multiple_breakdowns()
+
+    assert_frame_equal(df, expected_df)
+    # Nodes in flight or waiting to be consumed: breakdown_workers + queue_size, plus the node consumed next
+    assert len(started) == 20
+    assert max(started) <= 1 + 2 + 1
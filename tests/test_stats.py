@@ -0,0 +1,144 @@
+import json
+import datetime
+import requests
+import pytest
+from src.analytics.mayhem.adobe import analytics_client
+from src.analytics.mayhem.adobe_stats import stats_catalog
+from src.analytics.mayhem.adobe_tuning import adaptive_limit_policy
+from src.analytics.mayhem.adobe_ordering import breakdown_order_optimizer
+
+def _report_object(dimension, segments = ()):
+    return {
+        'rsid': 'fake_rsid',
+        'dimension': dimension,
+        'globalFilters': [{'type': 'segment', 'segmentId': segment_id} for segment_id in segments]
+            + [{'type': 'dateRange', 'dateRange': '2020-01-01T00:00:00.000/2020-01-31T23:59:59.999'}]
+    }
+
+def _page(number, rows, total_elements, total_pages):
+    return {'number': number, 'numberOfElements': rows, 'totalElements': total_elements, 'totalPages': total_pages}
+
+def _breakdown_mock(items, status_codes = None):
+    '''
+    Every dimension has the given number of items, at every level. Responds with the queued status codes first.
+    '''
+    status_codes = list(status_codes or [])
+    def get_page(client, report_object = None):
+        report_object = report_object or client.report_object
+        response = requests.Response()
+        response.status_code = status_codes.pop(0) if len(status_codes) > 0 else 200
+        response.elapsed = datetime.timedelta(seconds = 0.5)
+        if (response.status_code != 200):
+            response._content = b'{"error_code":"429050","message":"Too many requests"}'
+            return response
+        response._content = json.dumps({
+            'totalPages': 1, 'firstPage': True, 'lastPage': True, 'number': 0,
+            'numberOfElements': items[report_object['dimension']], 'totalElements': items[report_object['dimension']],
+            'columns': {'dimension': {'id': report_object['dimension'], 'type': 'string'}, 'columnIds': ['0']},
+            'rows': [{'itemId': str(i), 'value': 'v{}'.format(i), 'data': [1.0]} for i in range(items[report_object['dimension']])],
+            'summaryData': {'totals': [float(items[report_object['dimension']])]}
+        }).encode('utf-8')
+        return response
+    return get_page
+
+def _client(catalog):
+    client = analytics_client(client_id = 'fake_client_id', account_id = 'fake_account_id')
+    client.set_report_suite('fake_rsid')
+    client.add_metric('metrics/visits')
+    client.add_dimension('variables/lasttouchchannel')
+    client.add_dimension('variables/mobiledevicetype')
+    client.set_date_range('2020-01-01', '2020-01-31')
+    client.set_stats_catalog(catalog)
+    return client
+
+def test_record_and_get_stats(tmp_path):
+    catalog = stats_catalog(str(tmp_path / 'stats.sqlite'))
+    report_object = _report_object('variables/page', ['s2', 's1'])
+
+    catalog.record_page(report_object, 1, _page(0, 100, 250, 3), 1000, 2.0)
+    catalog.record_page(report_object, 1, _page(1, 100, 250, 3), 1000, 1.0)
+    catalog.record_page(report_object, 1, _page(2, 50, 250, 3), 500, 1.0)
+    catalog.record_throttled(report_object, 1)
+    catalog.record_page(_report_object('variables/page'), 1, _page(0, 10, 10, 1), 100, 0.5)
+
+    # Segments are compared as a set
+    df = catalog.get_stats(dimension = 'variables/page', segments = ['s1', 's2'])
+    assert len(df) == 1
+    stats = df.iloc[0]
+    assert stats['segments'] == '["s1", "s2"]'
+    assert (stats['reports'], stats['pages'], stats['rows'], stats['throttled']) == (1, 3, 250, 1)
+    assert stats['avg_total_elements'] == 250
+    assert stats['avg_total_pages'] == 3
+    assert stats['max_latency'] == 2.0
+    assert stats['avg_latency'] == pytest.approx(4.0 / 3)
+    assert stats['bytes_per_row'] == pytest.approx(10.0)
+    assert stats['throttle_rate'] == pytest.approx(0.25)
+
+    # Partitions by search only return part of the items
+    partition = dict(_report_object('variables/page'), search = {'clause': "( BEGINS-WITH 'a' )"})
+    catalog.record_page(partition, 1, _page(0, 3, 3, 1), 30, 0.1)
+    catalog.record_throttled(partition, 1)
+    assert catalog.get_stats(dimension = 'variables/page', segments = [])['last_total_elements'].tolist() == [10]
+
+    assert len(catalog.get_stats()) == 2
+    assert len(catalog.get_stats(rsid = 'other_rsid')) == 0
+    # Shared by other instances of the same database
+    assert len(stats_catalog(str(tmp_path / 'stats.sqlite')).get_stats(level = 1)) == 2
+
+def test_estimate_and_check_report(tmp_path):
+    catalog = stats_catalog(str(tmp_path / 'stats.sqlite'), max_requests = 50)
+    # 20 channels, about 3 device types per channel
+    catalog.record_page(_report_object('variables/lasttouchchannel'), 1, _page(0, 20, 20, 1), 2000, 1.0)
+    catalog.record_page(_report_object('variables/mobiledevicetype'), 2, _page(0, 2, 2, 1), 200, 0.5)
+    catalog.record_page(_report_object('variables/mobiledevicetype'), 2, _page(0, 4, 4, 1), 400, 0.5)
+    catalog.record_page(_report_object('variables/mobiledevicetype'), 1, _page(0, 5, 5, 1), 500, 0.5)
+
+    dimensions = ['variables/lasttouchchannel', 'variables/mobiledevicetype']
+    assert catalog.estimate_report(_report_object('variables/lasttouchchannel'), dimensions) == {'requests': 21, 'seconds': 11.0}
+    assert catalog.estimate_report(_report_object('variables/lasttouchchannel'), dimensions + ['variables/page']) is None
+    # Falls back to the number of items of the dimension at the top level
+    assert catalog.estimate_report(_report_object('variables/mobiledevicetype'), dimensions[::-1])['requests'] == 6
+    assert catalog.get_cardinalities(_report_object('variables/lasttouchchannel'), dimensions + ['variables/page']) == {
+        'variables/lasttouchchannel': 20, 'variables/mobiledevicetype': 5}
+
+    with pytest.warns(UserWarning, match = 'Expensive report'):
+        catalog.check_report(_report_object('variables/lasttouchchannel'), dimensions + dimensions[1:])
+
+def test_client_records_and_configures(tmp_path, mocker):
+    mocker.patch("time.sleep")
+    catalog = stats_catalog(str(tmp_path / 'stats.sqlite'))
+    client = _client(catalog)
+    items = {'variables/lasttouchchannel': 3, 'variables/mobiledevicetype': 2}
+    client._get_request_headers = mocker.Mock(return_value = 'test headers')
+    # The first request is throttled
+    breakdown_mock = _breakdown_mock(items, [429])
+    mocker.patch.object(analytics_client, '_send_request', lambda client, headers, data: breakdown_mock(client, json.loads(data)))
+    client.get_report_multiple_breakdowns()
+
+    df = catalog.get_stats()
+    assert list(df['dimension']) == ['variables/lasttouchchannel', 'variables/mobiledevicetype']
+    assert list(df['level']) == [1, 2]
+    assert list(df['reports']) == [1, 3]
+    assert list(df['throttled']) == [1, 0]
+    assert list(df['avg_total_elements']) == [3, 2]
+
+    # A new client starts with the page sizes of the previous run
+    policy = adaptive_limit_policy(initial_limit = 1000, target_latency = 10.0)
+    client = _client(catalog)
+    client.set_limit(policy)
+    assert client.stats_catalog.configure(client) == {'requests': 4, 'seconds': 2.0}
+    assert policy.get_limit(1) == 50
+    assert policy.levels[2]['seconds_per_row'] == pytest.approx(0.25)
+
+    # The order optimizer uses the observed number of items instead of requesting it
+    requests_made = []
+    fact_mock = _breakdown_mock(items)
+    def get_page(client, report_object = None):
+        requests_made.append((report_object or client.report_object)['settings']['limit'])
+        return fact_mock(client, report_object)
+    mocker.patch.object(analytics_client, '_get_page', get_page)
+    catalog.record_page(_report_object('variables/mobiledevicetype'), 1, _page(0, 2, 2, 1), 100, 0.5)
+    client.set_order_optimizer(breakdown_order_optimizer())
+    client.get_report_multiple_breakdowns()
+    assert '1' not in requests_made
+    assert len(requests_made) == 1 + 2
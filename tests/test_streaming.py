@@ -0,0 +1,106 @@
+import json
+import pytest
+import pandas as pd
+from pandas._testing import assert_frame_equal
+from src.analytics.mayhem.adobe import _format_page
+from src.analytics.mayhem.adobe import _format_page_stream
+from src.analytics.mayhem.adobe_streaming import read_report_stream
+import io
+from src.analytics.mayhem.adobe_pipeline import report_pipeline
+from breakdown_mocks import breakdown_mock
+from breakdown_mocks import generate_breakdown_client
+from breakdown_mocks import sample_tree
+
+def _metric_names():
+    return pd.DataFrame(index = ['0', '1'], data = ['metrics/visits', 'metrics/orders'])
+
+def _page(rows, **kwargs):
+    page = {
+        'totalPages': 1, 'firstPage': True, 'lastPage': True, 'numberOfElements': len(rows), 'number': 0, 'totalElements': len(rows),
+        'columns': {'dimension': {'id': 'variables/page', 'type': 'string'}, 'columnIds': ['0', '1']},
+        'rows': rows,
+        'summaryData': {'totals': [15.0, 2.0]}
+    }
+    page.update(kwargs)
+    return page
+
+def _chunks(text, size):
+    body = text.encode('utf-8')
+    return [body[idx:idx + size] for idx in range(0, len(body), size)]
+
+ROWS = [
+    {'itemId': '1', 'value': 'Home ü', 'data': [10.0, 1.0]},
+    {'itemId': '2', 'value': 'Cart "€"', 'data': [123456.5, None]},
+    {'itemId': '3', 'value': 'Checkout', 'data': [1e-3, 1.0]}
+]
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 7, 65536])
+def test_read_report_stream(chunk_size):
+    text = json.dumps(_page(ROWS), indent = 2)
+    json_obj, item_ids, values, data, size = read_report_stream(_chunks(text, chunk_size))
+
+    assert 'rows' not in json_obj
+    assert json_obj['lastPage'] is True
+    assert json_obj['summaryData'] == {'totals': [15.0, 2.0]}
+    assert list(item_ids) == ['1', '2', '3']
+    assert list(values) == ['Home ü', 'Cart "€"', 'Checkout']
+    assert data.shape == (3, 2)
+    assert data[1, 0] == 123456.5 and pd.isna(data[1, 1])
+    assert size == len(text.encode('utf-8'))
+
+def test_read_report_stream_grows_buffers():
+    rows = [{'itemId': str(idx), 'value': 'v', 'data': [float(idx)]} for idx in range(3000)]
+    page = {'totalPages': 1, 'rows': rows, 'lastPage': True}
+    json_obj, item_ids, values, data, size = read_report_stream(_chunks(json.dumps(page), 1000))
+
+    assert json_obj['numberOfElements'] == 3000
+    assert list(data[:, 0]) == [float(idx) for idx in range(3000)]
+
+def test_format_page_stream():
+    page = _page(ROWS)
+    df, json_obj, size = _format_page_stream(_chunks(json.dumps(page), 5), _metric_names())
+
+    assert_frame_equal(df, _format_page(page, _metric_names()))
+    assert json_obj['totalPages'] == 1
+
+def test_format_page_stream_column_order():
+    # Metric values are matched to the metrics by column ID, not by position
+    page = _page(ROWS)
+    page['columns']['columnIds'] = ['1', '0']
+    df, json_obj, size = _format_page_stream(_chunks(json.dumps(page), 5), _metric_names())
+
+    assert list(df.columns) == ['itemId', 'value', 'metrics/orders', 'metrics/visits']
+    assert list(df['metrics/orders']) == [10.0, 123456.5, 1e-3]
+    assert_frame_equal(df, _format_page(page, _metric_names()))
+
+def test_format_page_stream_without_rows():
+    page = _page([], totalPages = 0)
+    df, json_obj, size = _format_page_stream(_chunks(json.dumps(page), 5), _metric_names())
+
+    assert_frame_equal(df, _format_page(page, _metric_names()))
+    assert list(df['value']) == ['Unspecified']
+
+def test_read_report_stream_truncated():
+    with pytest.raises(ValueError):
+        read_report_stream(_chunks(json.dumps(_page(ROWS))[:-40], 10))
+
+@pytest.mark.parametrize('pipelined', [False, True])
+def test_get_report_multiple_breakdowns_streaming(monkeypatch, pipelined):
+    client = generate_breakdown_client()
+    client.set_limit(1)
+    monkeypatch.setattr(client, "_get_page", breakdown_mock(client, sample_tree()))
+    expected_df = client.get_report_multiple_breakdowns()
+
+    get_page = breakdown_mock(client, sample_tree())
+    def streamed_get_page(report_object = None):
+        response = get_page(report_object)
+        response.raw = io.BytesIO(response._content)
+        response._content = False
+        return response
+    monkeypatch.setattr(client, "_get_page", streamed_get_page)
+    client.set_streaming()
+    if (pipelined):
+        client.set_pipeline(report_pipeline(fetch_workers = 2))
+    df = client.get_report_multiple_breakdowns()
+
+    assert_frame_equal(df, expected_df)
@@ -0,0 +1,136 @@
+import os
+import stat
+import json
+import time
+import threading
+import multiprocessing
+import requests
+import pytest
+from src.analytics.mayhem.adobe import analytics_client
+from src.analytics.mayhem.adobe_tokens import file_token_store
+from src.analytics.mayhem.adobe_tokens import sqlite_token_store
+from src.analytics.mayhem.adobe_tokens import is_token_record_valid
+
+def _token_response(access_token, expires_in = 86399995, refresh_token = None):
+    response_obj = {"token_type": "bearer", "access_token": access_token, "expires_in": expires_in}
+    if refresh_token is not None:
+        response_obj['refresh_token'] = refresh_token
+    response = requests.Response()
+    response.status_code = 200
+    response._content = json.dumps(response_obj).encode('utf-8')
+    return response
+
+def _generate_jwt_client(token_store):
+    client = analytics_client(
+        adobe_org_id = 'fake_org_id', 
+        subject_account = 'fake_subject_account', 
+        client_id = 'fake_client_id',
+        client_secret = 'fake_client_secret',
+        account_id = 'fake_account_id',
+        token_store = token_store)
+    client._read_private_key = lambda: 'test_key'
+    return client
+
+def _refresh_in_process(path, counter_path):
+    store = file_token_store(path)
+    with store.lock('key'):
+        if not is_token_record_valid(store.get('key')):
+            with open(counter_path, 'a') as counter:
+                counter.write('x')
+            time.sleep(0.1)
+            store.put('key', {'access_token': 'shared', 'expires_at': time.time() + 3600})
+
+@pytest.mark.parametrize('store_class', [file_token_store, sqlite_token_store])
+def test_token_store_round_trip(tmp_path, store_class):
+    store = store_class(str(tmp_path / 'tokens'))
+    assert store.get('key') is None
+
+    with store.lock('key'):
+        store.put('key', {'access_token': 'token', 'expires_at': 10, 'refresh_token': 'refresh'})
+        store.put('other_key', {'access_token': 'other'})
+
+    assert store.get('key') == {'access_token': 'token', 'expires_at': 10, 'refresh_token': 'refresh'}
+    assert store_class(str(tmp_path / 'tokens')).get('other_key') == {'access_token': 'other'}
+
+@pytest.mark.parametrize('store_class', [file_token_store, sqlite_token_store])
+def test_token_store_is_private(tmp_path, store_class):
+    store = store_class(str(tmp_path / 'tokens'))
+    with store.lock('key'):
+        store.put('key', {'access_token': 'token'})
+    assert stat.S_IMODE(os.stat(store.path).st_mode) == 0o600
+
+def test_is_token_record_valid():
+    assert not is_token_record_valid(None)
+    assert not is_token_record_valid({'access_token': None})
+    assert is_token_record_valid({'access_token': 'token'})
+    assert is_token_record_valid({'access_token': 'token', 'expires_at': time.time() + 3600})
+    assert not is_token_record_valid({'access_token': 'token', 'expires_at': time.time() + 60})
+
+def test_clients_share_jwt_token(tmp_path, mocker):
+    store = file_token_store(str(tmp_path / 'tokens.json'))
+    mocker.patch("jwt.encode", return_value = 'jwt_encoded')
+    post = mocker.patch("requests.post", return_value = _token_response('shared token'))
+
+    client_1 = _generate_jwt_client(store)
+    client_2 = _generate_jwt_client(store)
+
+    assert client_1._get_request_headers()['Authorization'] == 'Bearer shared token'
+    assert client_1._get_request_headers()['Authorization'] == 'Bearer shared token'
+    assert client_2._get_request_headers()['Authorization'] == 'Bearer shared token'
+    assert post.call_count == 1
+
+    # Expired tokens are renewed once and shared again
+    record = store.get('jwt:fake_org_id:fake_client_id')
+    record['expires_at'] = time.time()
+    with store.lock('key'):
+        store.put('jwt:fake_org_id:fake_client_id', record)
+    client_3 = _generate_jwt_client(store)
+    post.return_value = _token_response('new token')
+    assert client_3._get_request_headers()['Authorization'] == 'Bearer new token'
+    assert post.call_count == 2
+
+def test_oauth_refresh_token_is_reused(tmp_path, mocker):
+    store = sqlite_token_store(str(tmp_path / 'tokens.sqlite'))
+    key = 'oauth:fake_auth_client_id:fake_account_id'
+    with store.lock(key):
+        store.put(key, {'access_token': 'expired token', 'expires_at': time.time() - 10, 'refresh_token': 'stored refresh token'})
+
+    client = analytics_client(auth_client_id = 'fake_auth_client_id', client_secret = 'fake_client_secret', account_id = 'fake_account_id', token_store = store)
+    client._obtain_oauth_code = mocker.Mock(side_effect = AssertionError('Interactive login not expected'))
+    token_request = mocker.patch("requests.request", return_value = _token_response('refreshed token', refresh_token = 'new refresh token'))
+
+    assert client._get_request_headers()['Authorization'] == 'Bearer refreshed token'
+    assert token_request.call_args[1]['data']['grant_type'] == 'refresh_token'
+    assert token_request.call_args[1]['data']['refresh_token'] == 'stored refresh token'
+    assert store.get(key)['refresh_token'] == 'new refresh token'
+
+def test_threads_refresh_token_once(mocker):
+    mocker.patch("jwt.encode", return_value = 'jwt_encoded')
+    def slow_token_response(*args, **kwargs):
+        time.sleep(0.1)
+        return _token_response('single token')
+    post = mocker.patch("requests.post", side_effect = slow_token_response)
+    client = _generate_jwt_client(None)
+
+    headers = []
+    threads = [threading.Thread(target = lambda: headers.append(client._get_request_headers()['Authorization'])) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert headers == ['Bearer single token'] * 4
+    assert post.call_count == 1
+
+def test_file_lock_across_processes(tmp_path):
+    path = str(tmp_path / 'tokens.json')
+    counter_path = str(tmp_path / 'counter')
+    processes = [multiprocessing.Process(target = _refresh_in_process, args = (path, counter_path)) for i in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    with open(counter_path) as counter:
+        assert counter.read() == 'x'
+    assert file_token_store(path).get('key')['access_token'] == 'shared'
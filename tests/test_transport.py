@@ -0,0 +1,150 @@
+import json
+import time
+import datetime
+import threading
+import requests
+import pytest
+from src.analytics.mayhem.adobe import analytics_client
+from src.analytics.mayhem import adobe_transport
+from src.analytics.mayhem.adobe_transport import requests_transport
+from src.analytics.mayhem.adobe_transport import http2_transport
+from src.analytics.mayhem.adobe_transport import _to_requests_response
+from src.analytics.mayhem.adobe_resilience import retry_policy
+
+def _response(status_code, text):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = text.encode('utf-8')
+    return response
+
+def test_requests_transport(mocker):
+    post = mocker.patch("requests.post", return_value = _response(200, 'ok'))
+    transport = requests_transport()
+
+    assert transport.post('https://test.com', {'a': 'b'}, '{}', 30).text == 'ok'
+    post.assert_called_once_with('https://test.com', headers = {'a': 'b'}, data = '{}', timeout = 30)
+
+def test_requests_transport_session(mocker):
+    session = mocker.Mock()
+    session.post.return_value = _response(200, 'ok')
+    with requests_transport(session) as transport:
+        transport.post('https://test.com', {}, '{}', 30)
+
+    session.post.assert_called_once_with('https://test.com', headers = {}, data = '{}', timeout = 30)
+    session.close.assert_called_once_with()
+
+def test_client_uses_transport(mocker):
+    mocker.patch("time.sleep")
+    transport = mocker.Mock()
+    transport.post.return_value = _response(200, '{"rows": []}')
+    client = analytics_client(client_id = 'fake_client_id', account_id = 'fake_account_id')
+    client._get_request_headers = mocker.Mock(return_value = 'test headers')
+
+    assert client.set_transport(transport) is transport
+    assert client._get_page().text == '{"rows": []}'
+    transport.post.assert_called_once()
+    assert transport.post.call_args[0][0] == client.analytics_url
+    assert isinstance(client.set_transport(), requests_transport)
+
+def test_http2_transport_requires_httpx(monkeypatch):
+    monkeypatch.setattr(adobe_transport, 'httpx', None)
+    with pytest.raises(ImportError):
+        http2_transport()
+
+def test_to_requests_response(mocker):
+    response = mocker.Mock(
+        status_code = 404, content = b'{"error": "not found"}', headers = {'Content-Type': 'application/json'},
+        url = 'https://test.com', reason_phrase = 'Not Found', encoding = 'utf-8', elapsed = datetime.timedelta(seconds = 2)
+    )
+    result = _to_requests_response(response)
+
+    assert result.json() == {'error': 'not found'}
+    assert result.headers['content-type'] == 'application/json'
+    assert result.elapsed.total_seconds() == 2
+    with pytest.raises(requests.exceptions.HTTPError):
+        result.raise_for_status()
+
+def _http2_response(httpx, text):
+    # Responses of a streamed body, as received from a server (elapsed is set once the body is read)
+    return httpx.Response(200, stream = httpx.ByteStream(text.encode('utf-8')))
+
+def _mock_http2_transport(handler):
+    httpx = pytest.importorskip('httpx')
+    transport = http2_transport()
+    transport.client.close()
+    transport.client = httpx.Client(transport = httpx.MockTransport(handler))
+    return transport
+
+def _report_page():
+    return {
+        'totalPages': 1, 'firstPage': True, 'lastPage': True, 'numberOfElements': 1, 'number': 0, 'totalElements': 1,
+        'columns': {'dimension': {'id': 'variables/page', 'type': 'string'}, 'columnIds': ['0']},
+        'rows': [{'itemId': '1', 'value': 'Home', 'data': [10.0]}],
+        'summaryData': {'totals': [10.0]}
+    }
+
+def test_http2_transport_streaming(mocker):
+    httpx = pytest.importorskip('httpx')
+    mocker.patch("time.sleep")
+    transport = _mock_http2_transport(lambda request: _http2_response(httpx, json.dumps(_report_page())))
+    client = analytics_client(client_id = 'fake_client_id', account_id = 'fake_account_id')
+    client._get_request_headers = mocker.Mock(return_value = {'Authorization': 'Bearer token'})
+    client.set_report_suite('fake_rsid')
+    client.add_metric('metrics/visits')
+    client.add_dimension('variables/page')
+    client.set_transport(transport)
+    client.set_streaming()
+
+    df = client.get_report()
+
+    assert list(df['value']) == ['Home']
+    assert list(df['metrics/visits']) == [10.0]
+    response = transport.post(client.analytics_url, {}, '{}', 30, stream = True)
+    assert b''.join(response.iter_content(chunk_size = 16)) == response.content
+    response.close()
+    transport.close()
+
+def test_http2_transport_hedging(mocker, caplog):
+    httpx = pytest.importorskip('httpx')
+    release_slow_request = threading.Event()
+    calls = []
+    def handler(request):
+        calls.append(1)
+        if len(calls) == 1:
+            release_slow_request.wait(5)
+            return _http2_response(httpx, 'slow response')
+        return _http2_response(httpx, 'hedged response')
+    transport = _mock_http2_transport(handler)
+    client = analytics_client(client_id = 'fake_client_id', account_id = 'fake_account_id')
+    client._get_request_headers = mocker.Mock(return_value = {'Authorization': 'Bearer token'})
+    policy = retry_policy(min_hedge_samples = 1, hedge_percentile = 50)
+    policy.record_latency(0.05)
+    client.set_retry_policy(policy)
+    client.set_rate_limiter(None)
+    client.set_transport(transport)
+    close = mocker.spy(requests.Response, 'close')
+
+    assert client._get_page().text == 'hedged response'
+    release_slow_request.set()
+    # The slower copy is closed without errors when it completes
+    deadline = time.time() + 5
+    while (close.call_count == 0 and time.time() < deadline):
+        time.sleep(0.01)
+    assert close.call_count == 1
+    assert close.spy_exception is None
+    assert 'exception calling callback' not in caplog.text
+    transport.close()
+
+def test_streaming_requests(mocker):
+    mocker.patch("time.sleep")
+    post = mocker.patch("requests.post", return_value = _response(200, '{}'))
+    client = analytics_client(client_id = 'fake_client_id', account_id = 'fake_account_id')
+    client._get_request_headers = mocker.Mock(return_value = 'test headers')
+    client.set_request_coalescer()
+    client.set_streaming()
+
+    client._get_page()
+    client._get_page()
+
+    assert post.call_count == 2
+    assert post.call_args[1]['stream'] is True
@@ -0,0 +1,68 @@
+from src.analytics.mayhem.adobe_tuning import adaptive_limit_policy
+from breakdown_mocks import breakdown_mock
+from breakdown_mocks import generate_breakdown_client
+from breakdown_mocks import sample_tree
+
+def test_limit_grows_on_full_pages():
+    policy = adaptive_limit_policy(initial_limit = 100, growth_factor = 4, target_latency = 10)
+
+    # Full page with more rows available and fast response
+    policy.record(level = 1, limit = 100, rows = 100, total_elements = 10000, latency = 0.1, response_bytes = 1000)
+    assert policy.get_limit(1) == 400
+
+    # Latency target caps the growth (1 second per 100 rows -> 1000 rows for 10 seconds)
+    policy = adaptive_limit_policy(initial_limit = 500, growth_factor = 4, target_latency = 10, smoothing = 1)
+    policy.record(level = 1, limit = 500, rows = 500, total_elements = 10000, latency = 5, response_bytes = 1000)
+    assert policy.get_limit(1) == 1000
+
+def test_limit_is_kept_for_small_reports():
+    policy = adaptive_limit_policy(initial_limit = 100)
+    policy.record(level = 2, limit = 100, rows = 3, total_elements = 3, latency = 0.1, response_bytes = 100)
+
+    assert policy.get_limit(2) == 100
+    # Levels are tuned independently
+    assert policy.get_limit(1) == 100
+
+def test_limit_shrinks_on_slow_or_large_pages():
+    policy = adaptive_limit_policy(initial_limit = 10000, target_latency = 10, min_limit = 50, smoothing = 1)
+    policy.record(level = 1, limit = 10000, rows = 10000, total_elements = 50000, latency = 40, response_bytes = 1000)
+    assert policy.get_limit(1) == 2500
+
+    policy = adaptive_limit_policy(initial_limit = 10000, max_page_bytes = 1000000, smoothing = 1)
+    policy.record(level = 1, limit = 10000, rows = 10000, total_elements = 50000, latency = 1, response_bytes = 4000000)
+    assert policy.get_limit(1) == 2500
+
+    policy.record(level = 1, limit = 2500, rows = 2500, total_elements = 50000, latency = 1000, response_bytes = 1000)
+    assert policy.get_limit(1) == 50
+
+def test_timeout():
+    policy = adaptive_limit_policy(min_timeout = 30, max_timeout = 360, timeout_factor = 4)
+    assert policy.get_timeout() == 360
+
+    for latency in [1, 2, 3, 4, 5]:
+        policy.record(level = 1, limit = 100, rows = 0, total_elements = 0, latency = latency, response_bytes = 0)
+    assert policy.get_timeout() == 30
+
+    for latency in [20, 20, 20, 20, 20]:
+        policy.record(level = 1, limit = 100, rows = 0, total_elements = 0, latency = latency, response_bytes = 0)
+    assert policy.get_timeout() == 80
+
+def test_get_report_adaptive_limit(monkeypatch):
+    client = generate_breakdown_client(levels = 2)
+    client.set_limit(adaptive_limit_policy(initial_limit = 1, min_limit = 1, growth_factor = 2))
+    requests_made = []
+    monkeypatch.setattr(client, "_get_page", breakdown_mock(client, sample_tree(), requests_made))
+
+    df = client.get_report_multiple_breakdowns()
+
+    assert list(df['metrics/visits']) == [4.0, 6.0, 5.0, 15.0]
+    # The limit grows between streams; each stream keeps its initial limit
+    assert requests_made == [(), (), ('10',), ('10',), ('20',)]
+    assert client.limit_policy.get_limit(1) == 2
+    assert client.limit_policy.get_limit(2) == 2
+    assert client._get_timeout() == 30
+
+    client.set_limit(100)
+    assert client.limit_policy is None
+    assert client.report_object['settings']['limit'] == '100'
+    assert client._get_timeout() == 360